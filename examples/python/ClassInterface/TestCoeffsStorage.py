@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+"""
+This script tests the packed storage, the in-place and lazy arithmetic and
+the batched random realizations of the SHCoeffs and SHGrid classes.
+"""
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../.."))
+from pyshtools import shtools
+from pyshtools import spectralanalysis
+from pyshtools.shclasses import SHCoeffs, SHGrid
+
+lmax = 30
+
+
+# ==== MAIN FUNCTION ====
+
+def main():
+    TestPackedStorage()
+    TestLazyArithmetic()
+    TestRandom()
+
+
+# ==== HELPER FUNCTIONS ====
+
+def compare(name, x, y, rtol=1.e-12):
+    """
+    Raise an exception if the arrays x and y are different.
+    """
+    error = np.abs(x - y).max() / np.abs(y).max()
+    print('{:s}: maximum relative difference = {:.2e}'.format(name, error))
+    if not np.allclose(x, y, rtol=rtol, atol=rtol * np.abs(y).max()):
+        raise Exception('{:s} is different from the reference.'.format(name))
+
+
+def random_coeffs(seed, storage='full'):
+    """
+    Return random coefficients with a red power spectrum.
+    """
+    rng = np.random.RandomState(seed)
+    degrees = np.arange(lmax + 1)
+    cilm = rng.normal(size=(2, lmax + 1, lmax + 1)) / \
+        (1. + degrees[:, np.newaxis])**2
+    cilm[:, degrees[:, np.newaxis] < degrees[np.newaxis, :]] = 0.
+    cilm[1, :, 0] = 0.
+    return SHCoeffs.from_array(cilm, storage=storage)
+
+
+# ==== TEST FUNCTIONS ====
+
+def TestPackedStorage():
+    print('\n---- testing packed storage ----')
+    a = random_coeffs(1)
+    b = random_coeffs(2)
+    ap = a.convert(storage='packed')
+    bp = SHCoeffs.from_array(b.coeffs, storage='packed')
+    print('shape of the packed coefficients = {:s}'
+          .format(repr(ap.coeffs.shape)))
+
+    compare('packed coefficients', ap.coeffs, shtools.SHCilmToVector(a.coeffs))
+    compare('to_vector', a.to_vector(), shtools.SHCilmToVector(a.coeffs))
+    compare('to_vector, lmax = 10', ap.to_vector(lmax=10),
+            shtools.SHCilmToVector(a.coeffs, lmax=10))
+    compare('to_array', ap.to_array(), a.coeffs)
+    compare('spectrum', ap.spectrum(), spectralanalysis.spectrum(a.coeffs))
+
+    for name, x, y in (('a + b', ap + bp, a + b), ('a - b', ap - bp, a - b),
+                       ('a * b', ap * bp, a * b), ('a / b', ap / bp, a / b),
+                       ('2 - a', 2. - ap, 2. - a), ('a**2', ap**2, a**2),
+                       ('packed a + full b', ap + b, a + b)):
+        if x.storage != 'packed':
+            raise Exception('{:s} did not return packed coefficients.'
+                            .format(name))
+        compare(name, x.to_array(), y.coeffs)
+
+    compare('pad', ap.pad(lmax + 5).to_array(), a.pad(lmax + 5).coeffs)
+    compare('to_array, orthonormalized',
+            ap.to_array(normalization='ortho', csphase=-1),
+            a.to_array(normalization='ortho', csphase=-1))
+
+
+def TestLazyArithmetic():
+    print('\n---- testing in-place and lazy arithmetic ----')
+    for storage in ('full', 'packed'):
+        a = random_coeffs(3, storage=storage)
+        b = random_coeffs(4, storage=storage)
+        eager = 2. * a + 3. * b - 1.5
+
+        lazy = (2. * a.lazy() + 3. * b.lazy() - 1.5).evaluate()
+        compare('lazy expression, {:s} storage'.format(storage),
+                lazy.to_array(), eager.to_array())
+
+        c = a.copy()
+        address = id(c.coeffs)
+        out = (2. * c.lazy() + 3. * b.lazy() - 1.5).evaluate(out=c)
+        if out is not c or id(c.coeffs) != address:
+            raise Exception('evaluate did not write into out.')
+        compare('lazy expression with out, {:s} storage'.format(storage),
+                c.to_array(), eager.to_array())
+
+        c = a.copy()
+        address = id(c.coeffs)
+        c += b
+        c *= 2.
+        c -= 1.
+        c /= 4.
+        if id(c.coeffs) != address:
+            raise Exception('in-place operators created a new array.')
+        compare('in-place operators, {:s} storage'.format(storage),
+                c.to_array(), (((a + b) * 2. - 1.) / 4.).to_array())
+
+    nlat = 2 * lmax + 2
+    rng = np.random.RandomState(5)
+    g = SHGrid.from_array(rng.normal(size=(nlat, 2 * nlat)))
+    h = SHGrid.from_array(rng.normal(size=(nlat, 2 * nlat)))
+    eager = g * 2. - h / 3. + 1.
+    compare('lazy grid expression',
+            (g.lazy() * 2. - h.lazy() / 3. + 1.).evaluate().data, eager.data)
+    address = id(g.data)
+    g *= 2.
+    g -= h / 3.
+    g += 1.
+    if id(g.data) != address:
+        raise Exception('in-place grid operators created a new array.')
+    compare('in-place grid operators', g.data, eager.data)
+
+
+def TestRandom():
+    print('\n---- testing from_random ----')
+    power = 1. / (1. + np.arange(lmax + 1))**2
+    n = 5
+
+    clms = SHCoeffs.from_random(power, n=n, seed=10)
+    again = SHCoeffs.from_random(power, n=n, seed=10)
+    print('number of realizations = {:d}'.format(len(clms)))
+    for i in range(n):
+        if not np.array_equal(clms[i].coeffs, again[i].coeffs):
+            raise Exception('from_random is not reproducible for a seed.')
+
+    chunks = SHCoeffs.from_random(power, n=n, seed=10, chunksize=2)
+    chunked = [clm for chunk in chunks for clm in chunk]
+    for i in range(n):
+        compare('realization {:d}, chunksize = 2'.format(i),
+                chunked[i].coeffs, clms[i].coeffs, rtol=0.)
+
+    stream0 = SHCoeffs.from_random(power, seed=10, stream=0)
+    stream1 = SHCoeffs.from_random(power, seed=10, stream=1)
+    if np.array_equal(stream0.coeffs, stream1.coeffs):
+        raise Exception('The random streams are not independent.')
+
+    exact = SHCoeffs.from_random(power, n=n, seed=11, exact_power=True,
+                                 storage='packed')
+    for i in range(n):
+        compare('exact power of realization {:d}'.format(i),
+                spectralanalysis.spectrum(exact[i].to_array()), power)
+
+    # Without a seed, the coefficients are drawn degree by degree from the
+    # global random state.
+    np.random.seed(12)
+    clm = SHCoeffs.from_random(power)
+    np.random.seed(12)
+    cilm = np.zeros((2, lmax + 1, lmax + 1))
+    for degree in range(lmax + 1):
+        cilm[:, degree, :degree+1] = np.random.normal(size=(2, degree+1)) * \
+            np.sqrt(power[degree] / (2. * degree + 1.))
+    cilm[1, :, 0] = 0.
+    compare('global random state', clm.coeffs, cilm)
+
+
+# ==== EXECUTE SCRIPT ====
+if __name__ == "__main__":
+    main()
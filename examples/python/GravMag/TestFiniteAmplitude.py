@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""
+This script tests the batched finite-amplitude routines cilm_plus_dh,
+cilm_plus_layers_dh and ba_to_hilm_dh against the corresponding Fortran
+routines.
+"""
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../.."))
+from pyshtools import expand
+from pyshtools import gravmag
+
+mass = 6.4171e23
+r0 = 3390.e3
+rho_c = 2900.
+rho_m = 3500.
+nmax = 5
+lmax = 20
+
+
+# ==== MAIN FUNCTION ====
+
+def main():
+    TestCilmPlus()
+    TestCilmPlusLayers()
+    TestBAtoHilm()
+
+
+# ==== HELPER FUNCTIONS ====
+
+def random_relief(radius, amplitude, seed, lmax=lmax):
+    """
+    Return a Driscoll and Healy grid of random relief with a red spectrum
+    about the mean radius radius.
+    """
+    rng = np.random.RandomState(seed)
+    degrees = np.arange(lmax + 1)
+    hilm = rng.normal(size=(2, lmax + 1, lmax + 1)) * amplitude / \
+        (1. + degrees[:, np.newaxis])
+    hilm[:, degrees[:, np.newaxis] < degrees[np.newaxis, :]] = 0.
+    hilm[1, :, 0] = 0.
+    hilm[0, 0, 0] = radius
+    return expand.MakeGridDH(hilm, sampling=2)
+
+
+def compare(name, x, y, rtol=1.e-8):
+    """
+    Raise an exception if the arrays x and y are different.
+    """
+    error = np.abs(x - y).max() / np.abs(y).max()
+    print('{:s}: maximum relative difference = {:.2e}'.format(name, error))
+    if not np.allclose(x, y, rtol=rtol, atol=rtol * np.abs(y).max()):
+        raise Exception('{:s} is different from the Fortran routine.'
+                        .format(name))
+
+
+# ==== TEST FUNCTIONS ====
+
+def TestCilmPlus():
+    print('\n---- testing cilm_plus_dh ----')
+    grids = np.array([[random_relief(r0, 2.e3, 3 * i + j) for j in range(3)]
+                      for i in range(2)])
+    rho = np.array([[2700., 2800., 2900.], [3000., 3100., 3200.]])
+
+    cilm, d = gravmag.cilm_plus_dh(grids, nmax, mass, rho, lmax=lmax - 4,
+                                   nprocs=1)
+    print('shape of the coefficient stack = {:s}'.format(repr(cilm.shape)))
+    for i, j in np.ndindex(rho.shape):
+        fortran, dj = gravmag.CilmPlusDH(grids[i, j], nmax, mass, rho[i, j],
+                                         lmax=lmax - 4)
+        compare('cilm of model ({:d}, {:d})'.format(i, j), cilm[i, j],
+                fortran)
+        compare('d of model ({:d}, {:d})'.format(i, j), d[i, j], dj,
+                rtol=1.e-12)
+
+    cilm2, d2 = gravmag.cilm_plus_dh(grids, nmax, mass, rho, lmax=lmax - 4,
+                                     nprocs=2)
+    compare('cilm, nprocs = 2', cilm2, cilm, rtol=1.e-12)
+
+    # Densities that vary laterally.
+    nlat, nlon = grids.shape[-2:]
+    lons = 360. * np.arange(nlon) / nlon
+    rho_grid = np.ones((nlat, 1)) * (2800. + 100. * np.cos(np.radians(lons)))
+    cilm, d = gravmag.cilm_plus_dh(grids[0], nmax, mass, rho_grid, nprocs=1)
+    for j in range(grids.shape[1]):
+        fortran, dj = gravmag.CilmPlusRhoHDH(grids[0, j], rho_grid, nmax,
+                                             mass)
+        compare('cilm of model {:d}, lateral density'.format(j), cilm[j],
+                fortran)
+
+
+def TestCilmPlusLayers():
+    print('\n---- testing cilm_plus_layers_dh ----')
+    grids = np.array([random_relief(r0, 2.e3, 10),
+                      random_relief(r0 - 45.e3, 5.e3, 11)])
+    rho = [rho_c, rho_m - rho_c]
+
+    cilm, d = gravmag.cilm_plus_layers_dh(grids, nmax, mass, rho, r0,
+                                          nprocs=1)
+    fortran = np.zeros_like(cilm)
+    degrees = np.arange(cilm.shape[-1])
+    for grid, rho_k in zip(grids, rho):
+        cilm_k, d_k = gravmag.CilmPlusDH(grid, nmax, mass, rho_k)
+        fortran += cilm_k * ((d_k / r0)**degrees)[:, np.newaxis]
+    compare('cilm of the two interfaces', cilm, fortran)
+
+    # Several models of the interfaces.
+    stack = np.array([grids, grids * [[[1.0001]], [[0.9999]]]])
+    cilm2, d2 = gravmag.cilm_plus_layers_dh(stack, nmax, mass, rho, r0,
+                                            nprocs=2)
+    print('shape of d = {:s}'.format(repr(d2.shape)))
+    compare('cilm of the first model', cilm2[0], cilm, rtol=1.e-12)
+
+
+def TestBAtoHilm():
+    print('\n---- testing ba_to_hilm_dh ----')
+    d = r0 - 45.e3
+    moho = random_relief(d, 5.e3, 12)
+    cilm, dm = gravmag.CilmPlusDH(moho, nmax, mass, rho_m - rho_c)
+    ba = cilm * ((dm / r0)**np.arange(lmax + 1))[:, np.newaxis]
+    grid0 = np.full(moho.shape, dm)
+
+    for filter_type, lmax_calc in ((0, lmax), (1, lmax - 5)):
+        # Three iterations of BAtoHilmDH.
+        grid = grid0
+        fortran = []
+        for i in range(3):
+            hilm = gravmag.BAtoHilmDH(ba, grid, nmax, mass, r0,
+                                      rho_m - rho_c, filter_type=filter_type,
+                                      filter_deg=15, lmax_calc=lmax_calc)
+            grid = expand.MakeGridDH(hilm, lmax=lmax, sampling=2,
+                                     lmax_calc=lmax_calc)
+            fortran.append(hilm)
+
+        hilm, info = gravmag.ba_to_hilm_dh(ba, grid0, nmax, mass, r0,
+                                           rho_m - rho_c,
+                                           filter_type=filter_type,
+                                           filter_deg=15,
+                                           lmax_calc=lmax_calc, tol=0.,
+                                           maxiter=3)
+        print('niter = {:d}, rms = {:s}'.format(info['niter'],
+                                                repr(info['rms'])))
+        compare('hilm, filter_type = {:d}'.format(filter_type),
+                hilm[:, :lmax_calc+1, :lmax_calc+1], fortran[-1])
+
+        # Start from the solution of the first iteration.
+        hilm, info = gravmag.ba_to_hilm_dh(ba, fortran[0], nmax, mass, r0,
+                                           rho_m - rho_c,
+                                           filter_type=filter_type,
+                                           filter_deg=15,
+                                           lmax_calc=lmax_calc, lmax=lmax,
+                                           tol=0., maxiter=2)
+        compare('hilm from a previous solution, filter_type = {:d}'
+                .format(filter_type), hilm[:, :lmax_calc+1, :lmax_calc+1],
+                fortran[-1])
+
+    hilm, info = gravmag.ba_to_hilm_dh(ba, grid0, nmax, mass, r0,
+                                       rho_m - rho_c, tol=1.e-3)
+    print('converged = {:s} after {:d} iterations'
+          .format(repr(info['converged']), info['niter']))
+    compare('converged relief', expand.MakeGridDH(hilm, sampling=2), moho,
+            rtol=1.e-6)
+
+
+# ==== EXECUTE SCRIPT ====
+if __name__ == "__main__":
+    main()
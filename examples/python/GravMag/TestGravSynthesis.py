@@ -0,0 +1,425 @@
+#!/usr/bin/env python
+"""
+This script tests the vectorized gravity, magnetic field and geoid synthesis
+routines, the downward continuation filters and the normal gravity.
+"""
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../.."))
+from pyshtools import gravmag
+
+gm = 4.282837e13
+r0 = 3396.e3
+a = 3396.19e3
+f = 1. / 169.8
+omega = 7.088218e-5
+lmax = 24
+
+
+# ==== MAIN FUNCTION ====
+
+def main():
+    TestMakeGravGrid()
+    TestMakeGravGradGrid()
+    TestMakeMagGrid()
+    TestMakeMagGridSeries()
+    TestMakeGeoidGrid()
+    TestGeoidEngine()
+    TestPoints()
+    TestContinuation()
+    TestNormalGravity()
+
+
+# ==== HELPER FUNCTIONS ====
+
+def random_coeffs(lmax, seed, c00=1.):
+    """
+    Return random spherical harmonic coefficients with a red spectrum.
+    """
+    rng = np.random.RandomState(seed)
+    degrees = np.arange(lmax + 1)
+    cilm = rng.normal(size=(2, lmax + 1, lmax + 1)) * 1.e-4 / \
+        (1. + degrees[:, np.newaxis])**2
+    cilm[:, degrees[:, np.newaxis] < degrees[np.newaxis, :]] = 0.
+    cilm[1, :, 0] = 0.
+    cilm[0, 0, 0] = c00
+    return cilm
+
+
+def compare(name, x, y, rtol=1.e-8):
+    """
+    Raise an exception if the arrays x and y are different.
+    """
+    error = np.abs(x - y).max() / np.abs(y).max()
+    print('{:s}: maximum relative difference = {:.2e}'.format(name, error))
+    if not np.allclose(x, y, rtol=rtol, atol=rtol * np.abs(y).max()):
+        raise Exception('{:s} is different from the reference.'
+                        .format(name))
+
+
+# ==== TEST FUNCTIONS ====
+
+def TestMakeGravGrid():
+    print('\n---- testing make_grav_grid_dh ----')
+    cilm = random_coeffs(lmax, 1)
+    names = ('rad', 'theta', 'phi', 'total', 'pot')
+
+    # The components that do not depend on all three components of the
+    # gravity vector are not computed by MakeGravGridDH.
+    for label, kwargs in (('sampling = 2', {}),
+                          ('sampling = 1', {'sampling': 1,
+                                            'lmax_calc': lmax - 4,
+                                            'normal_gravity': 0})):
+        fortran = gravmag.MakeGravGridDH(cilm, gm, r0, a=a, f=f, lmax=lmax,
+                                         omega=omega, **kwargs)
+        for components in (('rad', 'theta', 'pot'), ('phi', ), names):
+            grids = gravmag.make_grav_grid_dh(cilm, gm, r0, a=a, f=f,
+                                              lmax=lmax, omega=omega,
+                                              components=components,
+                                              **kwargs)
+            for name, x in zip(components, grids):
+                compare('{:s}, {:d} components, {:s}'
+                        .format(name, len(components), label),
+                        x, fortran[names.index(name)])
+
+    # Selected components, stored in preallocated arrays.
+    fortran = gravmag.MakeGravGridDH(cilm, gm, r0, a=a, f=f, lmax=lmax,
+                                     omega=omega)
+    out = np.empty(fortran[4].shape)
+    pot, total = gravmag.make_grav_grid_dh(cilm, gm, r0, a=a, f=f,
+                                           lmax=lmax, omega=omega,
+                                           components=('pot', 'total'),
+                                           out=[out, None])
+    if pot is not out:
+        raise Exception('make_grav_grid_dh did not use the array out.')
+    compare('pot, out', pot, fortran[4])
+    compare('total, out', total, fortran[3])
+    out = np.empty(fortran[0].shape)
+    rad = gravmag.make_grav_grid_dh(cilm, gm, r0, a=a, f=f, lmax=lmax,
+                                    omega=omega, components='rad', out=out)
+    if rad is not out:
+        raise Exception('make_grav_grid_dh did not use the array out.')
+    compare('rad, components = \'rad\'', rad, fortran[0])
+
+    # Several semimajor axes.
+    axes = a + np.array([0., 20.e3, 150.e3])
+    for components in (('rad', 'theta', 'pot'), names):
+        grids = gravmag.make_grav_grid_dh(cilm, gm, r0, a=axes, f=f,
+                                          lmax=lmax, omega=omega,
+                                          components=components)
+        for i, ai in enumerate(axes):
+            fortran = gravmag.MakeGravGridDH(cilm, gm, r0, a=ai, f=f,
+                                             lmax=lmax, omega=omega)
+            for name, x in zip(components, grids):
+                compare('{:s}, {:d} components, a = {:.0f}'
+                        .format(name, len(components), ai),
+                        x[i], fortran[names.index(name)])
+
+
+def TestMakeGravGradGrid():
+    print('\n---- testing make_grav_grad_grid_dh ----')
+    cilm = random_coeffs(lmax, 2, c00=0.)
+    names = ('vxx', 'vyy', 'vzz', 'vxy', 'vxz', 'vyz')
+
+    # MakeGravGradGridDH returns incorrect values at the equator, so the
+    # tensor is compared with the radial derivatives of the gravity vector
+    # computed by MakeGravGridDH, with x pointing north, y west and z up.
+    # The tensor is set to zero at the north pole.
+    h = 10.
+    grids = gravmag.make_grav_grad_grid_dh(cilm, gm, r0, a=a, lmax=lmax)
+    upper = gravmag.MakeGravGridDH(cilm, gm, r0, a=a + h, lmax=lmax,
+                                   normal_gravity=0)
+    lower = gravmag.MakeGravGridDH(cilm, gm, r0, a=a - h, lmax=lmax,
+                                   normal_gravity=0)
+    for name, x, k, sign in (('vzz', grids[2], 0, 1.),
+                             ('vxz', grids[4], 1, -1.),
+                             ('vyz', grids[5], 2, -1.)):
+        compare(name + ', finite difference', x[1:],
+                sign * (upper[k][1:] - lower[k][1:]) / (2. * h), rtol=1.e-6)
+
+    # The potential satisfies Laplace's equation.
+    grids = gravmag.make_grav_grad_grid_dh(cilm, gm, r0, a=a, f=f,
+                                           lmax=lmax)
+    error = np.abs(grids[0] + grids[1] + grids[2])[1:].max() / \
+        np.abs(grids[2]).max()
+    print('vxx + vyy + vzz: maximum relative value = {:.2e}'.format(error))
+    if error > 1.e-10:
+        raise Exception('The trace of the gravity tensor is not zero.')
+
+    out = np.empty(grids[2].shape)
+    vzz, vxy = gravmag.make_grav_grad_grid_dh(cilm, gm, r0, a=a, f=f,
+                                              lmax=lmax,
+                                              components=('vzz', 'vxy'),
+                                              out=[out, None])
+    if vzz is not out:
+        raise Exception('make_grav_grad_grid_dh did not use the array out.')
+    compare('vzz, out', vzz, grids[2], rtol=1.e-12)
+    compare('vxy, out', vxy, grids[3], rtol=1.e-12)
+
+    # Equally sampled grids, with a lower maximum degree of the expansion.
+    grids = gravmag.make_grav_grad_grid_dh(cilm, gm, r0, a=a, f=f,
+                                           lmax=lmax, lmax_calc=lmax - 4)
+    sampled = gravmag.make_grav_grad_grid_dh(cilm, gm, r0, a=a, f=f,
+                                             lmax=lmax, lmax_calc=lmax - 4,
+                                             sampling=1)
+    for name, x, y in zip(names, sampled, grids):
+        compare(name + ', sampling = 1', x, y[:, ::2], rtol=1.e-12)
+
+    # Several semimajor axes.
+    axes = a + np.array([0., 100.e3])
+    grids = gravmag.make_grav_grad_grid_dh(cilm, gm, r0, a=axes, f=f,
+                                           lmax=lmax, sampling=1)
+    for i, ai in enumerate(axes):
+        single = gravmag.make_grav_grad_grid_dh(cilm, gm, r0, a=ai, f=f,
+                                                lmax=lmax, sampling=1)
+        for name, x, y in zip(names, grids, single):
+            compare(name + ', a = {:.0f}'.format(ai), x[i], y, rtol=1.e-12)
+
+
+def TestMakeMagGrid():
+    print('\n---- testing make_mag_grid_dh ----')
+    cilm = 1.e5 * random_coeffs(lmax, 3, c00=0.)
+    names = ('rad', 'theta', 'phi', 'total')
+
+    # The components that do not depend on all three components of the
+    # magnetic field are not computed by MakeMagGridDH.
+    fortran = gravmag.MakeMagGridDH(cilm, r0, a=a, f=f, lmax=lmax)
+    for components in (('rad', 'theta'), ('phi', ), names):
+        grids = gravmag.make_mag_grid_dh(cilm, r0, a=a, f=f, lmax=lmax,
+                                         components=components)
+        for name, x in zip(components, grids):
+            compare('{:s}, {:d} components'.format(name, len(components)),
+                    x, fortran[names.index(name)])
+
+    out = np.empty(fortran[3].shape)
+    total = gravmag.make_mag_grid_dh(cilm, r0, a=a, f=f, lmax=lmax,
+                                     components='total', out=out)
+    if total is not out:
+        raise Exception('make_mag_grid_dh did not use the array out.')
+    compare('total, out', total, fortran[3])
+
+    # Several semimajor axes.
+    axes = a + np.array([0., 400.e3])
+    for components in (('rad', 'theta'), names):
+        grids = gravmag.make_mag_grid_dh(cilm, r0, a=axes, f=f, lmax=lmax,
+                                         lmax_calc=lmax - 4,
+                                         components=components)
+        for i, ai in enumerate(axes):
+            fortran = gravmag.MakeMagGridDH(cilm, r0, a=ai, f=f, lmax=lmax,
+                                            lmax_calc=lmax - 4)
+            for name, x in zip(components, grids):
+                compare('{:s}, {:d} components, a = {:.0f}'
+                        .format(name, len(components), ai),
+                        x[i], fortran[names.index(name)])
+
+
+def TestMakeMagGridSeries():
+    print('\n---- testing make_mag_grid_series_dh ----')
+    times = np.array([2000., 2005., 2010.])
+    epochs = np.array([1998., 2003.5, 2010., 2012.])
+    cilm = np.array([1.e5 * random_coeffs(lmax, 4 + i, c00=0.)
+                     for i in range(len(times))])
+    sv = 1.e3 * random_coeffs(lmax, 7, c00=0.)
+    names = ('rad', 'theta', 'phi', 'total')
+
+    def coeffs_at(epoch, sv=None):
+        if sv is not None and epoch > times[-1]:
+            return cilm[-1] + (epoch - times[-1]) * sv
+        i = min(max(np.searchsorted(times, epoch, side='right') - 1, 0),
+                len(times) - 2)
+        alpha = (epoch - times[i]) / (times[i + 1] - times[i])
+        return (1. - alpha) * cilm[i] + alpha * cilm[i + 1]
+
+    for secular in (None, sv):
+        out = np.empty((len(epochs), 2 * lmax + 2, 4 * lmax + 4))
+        grids = gravmag.make_mag_grid_series_dh(cilm, times, epochs, r0,
+                                                sv=secular, a=a, f=f,
+                                                lmax=lmax,
+                                                out=[out, None, None, None])
+        if grids[0] is not out:
+            raise Exception('make_mag_grid_series_dh did not use the ' +
+                            'array out.')
+        for i, epoch in enumerate(epochs):
+            fortran = gravmag.MakeMagGridDH(coeffs_at(epoch, secular), r0,
+                                            a=a, f=f, lmax=lmax)
+            for name, x, y in zip(names, grids, fortran):
+                compare(name + ', epoch = {:.1f}'.format(epoch), x[i], y)
+
+
+def TestMakeGeoidGrid():
+    print('\n---- testing make_geoid_grid_dh ----')
+    cilm = random_coeffs(lmax, 8)
+    potref = gm / r0 + omega**2 * r0**2 / 3.
+    radii = r0 + np.array([0., 5.e3])
+
+    for order in (1, 2, 3):
+        fortran = gravmag.MakeGeoidGridDH(cilm, r0, gm, potref, lmax=lmax,
+                                          omega=omega, order=order, a=a,
+                                          f=f)
+        geoid = gravmag.make_geoid_grid_dh(cilm, r0, gm, potref, lmax=lmax,
+                                           omega=omega, order=order, a=a,
+                                           f=f)
+        compare('geoid, order = {:d}'.format(order), geoid, fortran)
+
+        geoid = gravmag.make_geoid_grid_dh(cilm, r0, gm, potref, lmax=lmax,
+                                           omega=omega, r=radii, order=order,
+                                           a=a, f=f)
+        for i, r in enumerate(radii):
+            fortran = gravmag.MakeGeoidGridDH(cilm, r0, gm, potref,
+                                              lmax=lmax, omega=omega, r=r,
+                                              order=order, a=a, f=f)
+            compare('geoid, order = {:d}, r = {:.0f}'.format(order, r),
+                    geoid[i], fortran)
+
+
+def TestGeoidEngine():
+    print('\n---- testing GeoidEngine ----')
+    potref = gm / r0 + omega**2 * r0**2 / 3.
+    cilm = np.array([[random_coeffs(lmax, 10 + 3 * i + j) for j in range(3)]
+                     for i in range(2)])
+
+    engine = gravmag.GeoidEngine(r0, gm, potref, lmax, omega=omega,
+                                 sampling=1, lmax_calc=lmax - 2, a=a, f=f)
+    geoid = engine.compute(cilm)
+    print('shape of the geoid stack = {:s}'.format(repr(geoid.shape)))
+    # MakeGeoidGridDH fails when sampling is 1, so the geoid is compared
+    # with every other column of the grid computed with sampling = 2.
+    for i, j in np.ndindex(cilm.shape[:2]):
+        fortran = gravmag.MakeGeoidGridDH(cilm[i, j], r0, gm, potref,
+                                          lmax=lmax, omega=omega,
+                                          lmax_calc=lmax - 2, a=a, f=f)
+        compare('geoid of model ({:d}, {:d})'.format(i, j), geoid[i, j],
+                fortran[:, ::2])
+
+    engine = gravmag.GeoidEngine(r0, gm, potref, lmax, omega=omega, a=a,
+                                 f=f, dtype=np.float32)
+    out = np.empty((2, 3) + engine.shape, dtype=np.float32)
+    geoid = engine.compute(cilm, out=out)
+    if geoid is not out:
+        raise Exception('GeoidEngine.compute did not use the array out.')
+    fortran = gravmag.MakeGeoidGridDH(cilm[1, 2], r0, gm, potref, lmax=lmax,
+                                      omega=omega, a=a, f=f)
+    compare('float32 geoid', geoid[1, 2], fortran, rtol=1.e-5)
+
+
+def TestPoints():
+    print('\n---- testing make_grav_points, make_grav_grad_points and ' +
+          'make_mag_points ----')
+    cilm = random_coeffs(lmax, 14)
+    mag = 1.e5 * random_coeffs(lmax, 15, c00=0.)
+    r = r0 + 50.e3
+    nlat = 2 * lmax + 2
+    lats = 90. - 180. * np.arange(nlat) / nlat
+    lons = 180. * np.arange(2 * nlat) / nlat
+
+    # Random nodes of the Driscoll and Healy grid, excluding the north pole.
+    rng = np.random.RandomState(16)
+    i = rng.randint(1, nlat, size=300)
+    j = rng.randint(0, 2 * nlat, size=300)
+
+    fortran = gravmag.MakeGravGridDH(cilm, gm, r0, a=r, f=0., lmax=lmax,
+                                     omega=omega, normal_gravity=0)
+    points = gravmag.make_grav_points(cilm, gm, r0, lats[i], lons[j], r,
+                                      omega=omega)
+    for name, x, y in zip(('rad', 'theta', 'phi', 'total', 'pot'), points,
+                          fortran):
+        compare(name, x, y[i, j])
+    threads = gravmag.make_grav_points(cilm, gm, r0, lats[i], lons[j], r,
+                                       omega=omega, chunksize=17, nthreads=2)
+    for x, y in zip(points, threads):
+        if not np.allclose(x, y, rtol=1.e-12, atol=0.):
+            raise Exception('make_grav_points depends on chunksize and ' +
+                            'nthreads.')
+
+    # MakeGravGradGridDH is not used as the reference, as it returns
+    # incorrect values at the equator.
+    grids = gravmag.make_grav_grad_grid_dh(cilm, gm, r0, a=r, f=0.,
+                                           lmax=lmax)
+    out = np.empty(len(i))
+    points = gravmag.make_grav_grad_points(cilm, gm, r0, lats[i], lons[j], r,
+                                           components=('vzz', 'vxz'),
+                                           out=[out, None])
+    if points[0] is not out:
+        raise Exception('make_grav_grad_points did not use the array out.')
+    compare('vzz', points[0], grids[2][i, j])
+    compare('vxz', points[1], grids[4][i, j])
+
+    fortran = gravmag.MakeMagGridDH(mag, r0, a=r, f=0., lmax=lmax)
+    points = gravmag.make_mag_points(mag, r0, lats[i], lons[j], r)
+    for name, x, y in zip(('rad', 'theta', 'phi', 'total'), points, fortran):
+        compare(name, x, y[i, j])
+
+
+def TestContinuation():
+    print('\n---- testing down_cont_filter_ma, down_cont_filter_mc and ' +
+          'continue_coeffs ----')
+    half = 20
+    d = r0 - 50.e3
+    wl_ma = gravmag.down_cont_filter_ma(lmax, half, r0, d)
+    wl_mc = gravmag.down_cont_filter_mc(lmax, half, r0, d)
+    compare('down_cont_filter_ma', wl_ma,
+            np.array([gravmag.DownContFilterMA(l, half, r0, d)
+                      for l in range(lmax + 1)]), rtol=1.e-12)
+    compare('down_cont_filter_mc', wl_mc,
+            np.array([gravmag.DownContFilterMC(l, half, r0, d)
+                      for l in range(lmax + 1)]), rtol=1.e-12)
+
+    cilm = np.array([random_coeffs(lmax, 20 + i, c00=0.) for i in range(4)])
+    factors = wl_mc * (r0 / d)**np.arange(lmax + 1)
+    down = gravmag.continue_coeffs(cilm, r0, d, filter='mc', half=half)
+    for i in range(len(cilm)):
+        compare('continue_coeffs, model {:d}'.format(i), down[i],
+                cilm[i] * factors[:, np.newaxis], rtol=1.e-12)
+
+    up = gravmag.continue_coeffs(down, d, r0, out=down)
+    if up is not down:
+        raise Exception('continue_coeffs did not use the array out.')
+    compare('continue_coeffs, upward', up,
+            cilm * wl_mc[:, np.newaxis], rtol=1.e-12)
+
+
+def TestNormalGravity():
+    print('\n---- testing normal_gravity, normal_field and ' +
+          'normal_field_grid ----')
+    b = a * (1. - f)
+    lats = np.linspace(-90., 90., 37)
+    gamma = gravmag.normal_gravity(lats, gm, omega, a, b)
+    compare('normal_gravity', gamma,
+            np.array([gravmag.NormalGravity(lat, gm, omega, a, b)
+                      for lat in lats]), rtol=1.e-12)
+
+    # On the ellipsoid, the normal field is that of Somigliana.
+    phi = np.radians(lats)
+    r = a * b / np.sqrt(b**2 * np.cos(phi)**2 + a**2 * np.sin(phi)**2)
+    field, pot = gravmag.normal_field(lats, r, gm, omega, a, b)
+    compare('normal_field on the ellipsoid', field, gamma, rtol=1.e-10)
+    compare('normal potential on the ellipsoid', pot,
+            np.full_like(pot, pot.mean()), rtol=1.e-10)
+
+    grid, pot = gravmag.normal_field_grid(gm, omega, a, b, lmax)
+    nlat = 2 * lmax + 2
+    compare('normal_field_grid', grid[:, 5],
+            np.array([gravmag.NormalGravity(90. - 180. * i / nlat, gm, omega,
+                                            a, b) for i in range(nlat)]),
+            rtol=1.e-12)
+    if gravmag.normal_field_grid(gm, omega, a, b, lmax)[0] is not grid:
+        raise Exception('normal_field_grid did not return the cached grid.')
+
+    # The normal gravity removed by make_grav_grid_dh.
+    cilm = random_coeffs(lmax, 30)
+    total = gravmag.make_grav_grid_dh(cilm, gm, r0, a=a, f=f, lmax=lmax,
+                                      omega=omega, components='total')
+    total0 = gravmag.make_grav_grid_dh(cilm, gm, r0, a=a, f=f, lmax=lmax,
+                                       omega=omega, normal_gravity=0,
+                                       components='total')
+    compare('normal gravity of make_grav_grid_dh', total0 - total, grid,
+            rtol=1.e-10)
+
+
+# ==== EXECUTE SCRIPT ====
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+"""
+This script tests the localized spectral analyses of the SHWindow classes
+against the corresponding Fortran routines.
+"""
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import shutil
+import tempfile
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../.."))
+from pyshtools import shtools
+from pyshtools import spectralanalysis
+from pyshtools.shclasses import SHCoeffs, SHWindow
+
+
+# ==== MAIN FUNCTION ====
+
+def main():
+    test_Wigner3j000()
+    test_CouplingMatrix()
+    test_Spectra()
+    test_DMap()
+    test_TapersMap()
+    test_MultitaperSpectrum()
+    test_SpectrumMap()
+    test_AdmitCorrMap()
+
+
+# ==== HELPER FUNCTIONS ====
+
+def compare(name, x, y, rtol=1.e-8):
+    """
+    Raise an exception if the arrays x and y are different.
+    """
+    error = np.abs(x - y).max() / np.abs(y).max()
+    print('{:s}: maximum relative difference = {:.2e}'.format(name, error))
+    if not np.allclose(x, y, rtol=rtol, atol=rtol * np.abs(y).max()):
+        raise Exception('{:s} is different from the Fortran routine.'
+                        .format(name))
+
+
+def region_mask(lmax):
+    """
+    Return a Driscoll and Healy grid of an irregular region.
+    """
+    nlat = 2 * lmax + 2
+    lats = 90. - 180. * np.arange(nlat) / nlat
+    lons = 180. * np.arange(2 * nlat) / nlat
+    lat, lon = np.meshgrid(lats, lons, indexing='ij')
+    mask = ((lat > 10.) & (lat < 60.) & (lon > 20.) & (lon < 110.)) | \
+        ((lat > -30.) & (lat <= 10.) & (lon > 60.) & (lon < 90.))
+    return mask.astype(int)
+
+
+def random_coeffs(lmax, seed, n=None):
+    """
+    Return random coefficients with a red power spectrum.
+    """
+    power = 1. / (1. + np.arange(lmax + 1))**2
+    return SHCoeffs.from_random(power, n=n, seed=seed)
+
+
+# ==== TEST FUNCTIONS ====
+
+def test_Wigner3j000():
+    print('\n---- testing w3j000_table ----')
+    lmax = 30
+    lwin = 10
+    table = spectralanalysis.w3j000_table(lmax, lwin)
+    print('shape of the table = {:s}'.format(repr(table.shape)))
+    for i in range(lmax + 1):
+        for l in range(lwin + 1):
+            w3j, jmin, jmax = shtools.Wigner3j(i, l, 0, 0, 0)
+            jmax = min(jmax, lmax)
+            j = np.arange(jmin, jmax + 1)
+            if not np.allclose(table[l, i, j - i + lwin],
+                               w3j[:jmax - jmin + 1]**2, rtol=1.e-10,
+                               atol=1.e-14):
+                raise Exception('w3j000_table and Wigner3j are different ' +
+                                'for i = {:d} and l = {:d}.'.format(i, l))
+
+
+def test_CouplingMatrix():
+    print('\n---- testing coupling_matrix and biased_spectrum ----')
+    lmax = 40
+    lwin = 10
+    k = 4
+    window = SHWindow.from_cap(25., lwin, nwin=10)
+    power = np.mean(window.tapers[:, :k]**2, axis=1)
+
+    fortran = shtools.SHMTCouplingMatrix(lmax, window.tapers**2, k=k)
+    compare('mt_coupling_matrix',
+            spectralanalysis.mt_coupling_matrix(power, lmax,
+                                                lmax_out=lmax + lwin),
+            fortran)
+    compare('coupling_matrix', window.coupling_matrix(lmax, nwin=k),
+            fortran)
+
+    weights = np.array([0.4, 0.3, 0.2, 0.1])
+    fortran = shtools.SHMTCouplingMatrix(lmax,
+                                         window.tapers[:, :k]**2, k=k,
+                                         taper_wt=weights)
+    compare('coupling_matrix with weights',
+            window.coupling_matrix(lmax, nwin=k, weights=weights), fortran)
+
+    # Repeated calls return the stored matrix.
+    mmt1 = window.coupling_matrix(lmax, nwin=k, copy=False)
+    mmt2 = window.coupling_matrix(lmax, nwin=k, copy=False)
+    if mmt1.flags.writeable or not np.shares_memory(mmt1, mmt2):
+        raise Exception('coupling_matrix did not return the stored matrix.')
+
+    globalpower = 1. / (1. + np.arange(lmax + 1))**2
+    compare('bias_spectrum', spectralanalysis.bias_spectrum(power,
+                                                            globalpower),
+            shtools.SHBias(power, globalpower))
+    compare('biased_spectrum', window.biased_spectrum(globalpower, k),
+            shtools.SHBiasK(window.tapers, globalpower, k=k))
+
+
+def test_Spectra():
+    print('\n---- testing spectra ----')
+    lwin = 10
+    window = SHWindow.from_cap(25., lwin, nwin=6)
+    # The power spectra of the spherical-cap tapers are the squares of the
+    # coefficients returned by SHReturnTapers.
+    tapers = shtools.SHReturnTapers(np.radians(25.), lwin)[0]
+    compare('spectra', window.spectra(), tapers[:, :6]**2, rtol=1.e-10)
+    compare('spectra of taper 3', window.spectra(itaper=3),
+            window.spectra()[:, 3], rtol=1.e-14)
+
+
+def test_DMap():
+    print('\n---- testing compute_dmap ----')
+    for lmax, lwin in ((30, 10), (11, 8)):
+        mask = region_mask(lmax)
+        compare('compute_dmap for nlat = {:d} and lwin = {:d}'
+                .format(mask.shape[0], lwin),
+                spectralanalysis.compute_dmap(mask, lwin),
+                shtools.ComputeDMap(mask, lwin), rtol=1.e-10)
+
+
+def test_TapersMap():
+    print('\n---- testing return_tapers_map and from_mask ----')
+    lmax = 30
+    lwin = 10
+    ntapers = 5
+    mask = region_mask(lmax)
+    tapers, eigenvalues = shtools.SHReturnTapersMap(mask, lwin,
+                                                    ntapers=ntapers)
+    print('concentration factors = {:s}'.format(repr(eigenvalues)))
+
+    for method in ('lanczos', 'lobpcg', 'gaunt'):
+        tapers_m, eigenvalues_m = spectralanalysis.return_tapers_map(
+            mask, lwin, ntapers, method=method, tol=1.e-10, seed=0)
+        compare('eigenvalues, method = {:s}'.format(method), eigenvalues_m,
+                eigenvalues, rtol=1.e-6)
+        # The windows span the same space as those of SHReturnTapersMap.
+        overlap = np.linalg.svd(np.dot(tapers_m.T, tapers), compute_uv=False)
+        if not np.allclose(overlap, 1., atol=1.e-5):
+            raise Exception('return_tapers_map and SHReturnTapersMap are ' +
+                            'different for method = {:s}.'.format(method))
+
+    cache = tempfile.mkdtemp()
+    try:
+        window = SHWindow.from_mask(mask, lwin, nwin=ntapers,
+                                    method='lanczos', cache=cache)
+        cached = SHWindow.from_mask(mask, lwin, nwin=ntapers,
+                                    method='lanczos', cache=cache)
+        print('cache files = {:s}'.format(repr(os.listdir(cache))))
+    finally:
+        shutil.rmtree(cache)
+    compare('from_mask', window.eigenvalues, eigenvalues, rtol=1.e-6)
+    if not np.array_equal(window.tapers, cached.tapers):
+        raise Exception('from_mask did not return the cached windows.')
+
+
+def test_MultitaperSpectrum():
+    print('\n---- testing multitaper_spectrum for a list of functions ----')
+    lmax = 40
+    k = 4
+    clms = random_coeffs(lmax, 1, n=3)
+    window = SHWindow.from_mask(region_mask(lmax), 10, nwin=k)
+
+    mtse, sd = window.multitaper_spectrum(clms, k)
+    print('shape of the spectra = {:s}'.format(repr(mtse.shape)))
+    for i, clm in enumerate(clms):
+        fortran = shtools.SHMultiTaperMaskSE(
+            clm.to_array(normalization='4pi', csphase=1), window.tapers,
+            lmax=lmax, k=k)
+        compare('mtse of function {:d}'.format(i), mtse[i], fortran[0])
+        compare('sd of function {:d}'.format(i), sd[i], fortran[1])
+
+    weights = np.array([0.4, 0.3, 0.2, 0.1])
+    array = np.array([clm.to_array() for clm in clms])
+    mtse, sd = window.multitaper_spectrum(array, k, taper_wt=weights)
+    fortran = shtools.SHMultiTaperMaskSE(array[2], window.tapers, lmax=lmax,
+                                         k=k, taper_wt=weights)
+    compare('mtse of an array with weights', mtse[2], fortran[0])
+
+    cap = SHWindow.from_cap(25., 10, nwin=k)
+    mtse, sd = cap.multitaper_spectrum(clms, k, clat=30., clon=45.)
+    for i, clm in enumerate(clms):
+        single = cap.multitaper_spectrum(clm, k, clat=30., clon=45.)
+        compare('mtse of function {:d}, spherical cap'.format(i), mtse[i],
+                single[0])
+
+
+def test_SpectrumMap():
+    print('\n---- testing spectrum_map ----')
+    lmax = 40
+    k = 4
+    clm = random_coeffs(lmax, 2)
+    window = SHWindow.from_cap(25., 10, nwin=k)
+    centers = np.array([[-60., 0.], [-20., 45.], [0., 120.], [35., 200.],
+                        [70., 330.]])
+
+    mtse, sd = window.spectrum_map(clm, centers, k, nprocs=2)
+    for lat, lon, mtse_i, sd_i in zip(centers[:, 0], centers[:, 1], mtse,
+                                      sd):
+        single = window.multitaper_spectrum(clm, k, clat=lat, clon=lon)
+        compare('mtse at ({:.0f}, {:.0f})'.format(lat, lon), mtse_i,
+                single[0])
+        compare('sd at ({:.0f}, {:.0f})'.format(lat, lon), sd_i, single[1])
+
+
+def test_AdmitCorrMap():
+    print('\n---- testing admitcorr_map ----')
+    lmax = 40
+    k = 4
+    gclm = random_coeffs(lmax, 3)
+    tclm = 0.5 * (gclm + random_coeffs(lmax, 4))
+    window = SHWindow.from_cap(25., 10, nwin=k)
+    lat, lon = np.meshgrid([-40., 10., 50.], [0., 90.], indexing='ij')
+    centers = np.stack((lat, lon), axis=-1)
+
+    admitcorr = window.admitcorr_map(gclm, tclm, centers, k, nprocs=2)
+    print('shape of the admittance = {:s}'.format(repr(admitcorr[0].shape)))
+    for i, j in np.ndindex(lat.shape):
+        fortran = shtools.SHLocalizedAdmitCorr(
+            gclm.to_array(normalization='4pi', csphase=1),
+            tclm.to_array(normalization='4pi', csphase=1), window.tapers,
+            window.orders, lat[i, j], lon[i, j], k=k)
+        for name, x, y in zip(('admit', 'corr', 'admit_error',
+                               'corr_error'), admitcorr, fortran):
+            compare('{:s} at ({:.0f}, {:.0f})'.format(name, lat[i, j],
+                                                      lon[i, j]),
+                    x[i, j], y)
+
+
+# ==== EXECUTE SCRIPT ====
+if __name__ == "__main__":
+    main()
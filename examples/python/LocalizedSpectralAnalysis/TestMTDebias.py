@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+This script tests the mt_debias routine against SHMTDebias and a dense
+least-squares solution.
+"""
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../.."))
+from pyshtools import shtools
+from pyshtools import spectralanalysis
+
+
+def main():
+    test_MTDebias()
+
+
+def dense_debias(mtspectra, sd, mmt, nl):
+    """
+    Solve the least-squares problem of SHMTDebias with a dense design matrix.
+    """
+    m, nglobal = mmt.shape
+    n = -(-m // nl)
+    mmt = mmt / sd[:, np.newaxis]
+    a = np.zeros((m, n))
+    for j in range(n):
+        stop = nglobal if j == n - 1 else (j + 1) * nl
+        a[:, j] = mmt[:, j * nl:stop].sum(axis=1)
+
+    x = np.linalg.lstsq(a, mtspectra / sd, rcond=None)[0]
+    u, s, vt = np.linalg.svd(a, full_matrices=False)
+    return x, np.sqrt(np.sum((vt / s[:, np.newaxis])**2, axis=0)), \
+        np.linalg.cond(a)
+
+
+def test_MTDebias():
+    print('\n---- testing mt_debias ----')
+    lmax = 60
+    lwin = 8
+    k = 4
+    theta = 20.
+    tapers = shtools.SHReturnTapers(np.radians(theta), lwin)[0][:, :k]
+    power = np.mean(tapers**2, axis=1)
+    mmt = spectralanalysis.mt_coupling_matrix(power, lmax + lwin,
+                                              lmax_out=lmax)
+
+    np.random.seed(0)
+    globalpower = 1. / (1. + np.arange(lmax + lwin + 1))**2
+    localpower = np.dot(mmt, globalpower)
+    mtspectra = localpower * (1. + 0.01 * np.random.randn(3, lmax + 1))
+    sd = 0.01 * localpower
+
+    for nl in (1, 3):
+        mtdebias, mtdebias_sd, lmid = spectralanalysis.mt_debias(
+            mtspectra, nl, power=power, sd=sd)
+        print('nl = {:d}, lmid[:3] = {:s}'.format(nl, repr(lmid[:3])))
+
+        for i in range(len(mtspectra)):
+            x, xsd, cond = dense_debias(mtspectra[i], sd, mmt, nl)
+            print('condition number = {:.2e}, max relative error = {:.2e}, '
+                  'sd = {:.2e}'
+                  .format(cond, np.abs(mtdebias[i] - x).max() /
+                          np.abs(x).max(),
+                          np.abs(mtdebias_sd / xsd - 1.).max()))
+            if not np.allclose(mtdebias[i], x, rtol=1.e-6,
+                               atol=1.e-6 * np.abs(x).max()) or \
+                    not np.allclose(mtdebias_sd, xsd, rtol=1.e-6):
+                raise Exception('mt_debias and the dense least-squares ' +
+                                'solution are different for nl = ' +
+                                '{:d}.'.format(nl))
+
+        # SHMTDebias crashes with a double free when nl > 1, so it is only
+        # used as a reference for nl = 1.
+        if nl == 1:
+            fortran, flmid = shtools.SHMTDebias(
+                np.array([mtspectra[0], sd]), tapers, nl)
+            if not np.allclose(mtdebias[0], fortran[0], rtol=1.e-6,
+                               atol=1.e-6 * np.abs(fortran[0]).max()) or \
+                    not np.allclose(mtdebias_sd, fortran[1], rtol=1.e-6):
+                raise Exception('mt_debias and SHMTDebias are different ' +
+                                'for nl = {:d}.'.format(nl))
+
+        # The solution is linear in the localized spectra.
+        mtdebias3 = spectralanalysis.mt_debias(3. * mtspectra, nl,
+                                               power=power, sd=sd)[0]
+        if not np.allclose(mtdebias3, 3. * mtdebias, rtol=1.e-10,
+                           atol=1.e-10 * np.abs(mtdebias).max()):
+            raise Exception('mt_debias is not linear for nl = ' +
+                            '{:d}.'.format(nl))
+
+        # Uncertainties that differ for each spectrum.
+        sds = sd * np.array([[1.], [2.], [0.5]])
+        mtdebias2, mtdebias_sd2 = spectralanalysis.mt_debias(
+            mtspectra, nl, mmt=mmt, sd=sds)[:2]
+        for i in range(len(mtspectra)):
+            x, xsd, cond = dense_debias(mtspectra[i], sds[i], mmt, nl)
+            if not np.allclose(mtdebias2[i], x, rtol=1.e-6,
+                               atol=1.e-6 * np.abs(x).max()) or \
+                    not np.allclose(mtdebias_sd2[i], xsd, rtol=1.e-6):
+                raise Exception('mt_debias and the dense least-squares ' +
+                                'solution are different for nl = ' +
+                                '{:d} and a stack of sd.'.format(nl))
+
+# ==== EXECUTE SCRIPT ====
+if __name__ == "__main__":
+    main()
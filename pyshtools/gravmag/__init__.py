@@ -41,6 +41,50 @@ DownContFilterMC    Calculate a minimum-curvature downward continuation filter
                     for a given spherical harmonic degree.
 NormalGravity       Calculate the normal gravity on a flattened ellipsoid
                     using the formula of Somigliana.
+cilm_plus_dh        Calculate the gravitational potential exterior to relief
+                    for a stack of relief models, with constant or laterally
+                    varying density, using the finite-amplitude algorithm of
+                    Wieczorek and Phillips (1998).
+cilm_plus_layers_dh Calculate the gravitational potential exterior to a model
+                    composed of several density interfaces, referenced to a
+                    common radius.
+ba_to_hilm_dh       Iteratively calculate the relief along an interface with
+                    constant or laterally varying density contrast that
+                    corresponds to a given Bouguer anomaly until the relief
+                    converges.
+make_grav_grid_dh   Create 2D cylindrical maps on one or more flattened and
+                    rotating ellipsoids of selected components of the
+                    gravity field, the gravity disturbance, and the
+                    gravitational potential.
+make_grav_grad_grid_dh
+                    Calculate selected components of the gravity "gradient"
+                    tensor on one or more flattened ellipsoids.
+make_geoid_grid_dh  Create a global map of the geoid for one or more
+                    reference radii.
+GeoidEngine         Class for computing the geoid of batches of models that
+                    share the same reference parameters.
+make_grav_points    Evaluate selected components of the gravity field and
+                    the gravitational potential at a set of points.
+make_grav_grad_points
+                    Evaluate selected components of the gravity "gradient"
+                    tensor at a set of points.
+down_cont_filter_ma Compute the minimum-amplitude downward continuation filter
+                    for all degrees from 0 to lmax.
+down_cont_filter_mc Compute the minimum-curvature downward continuation filter
+                    for all degrees from 0 to lmax.
+continuation_factors
+                    Return the cached per-degree factors that continue
+                    potential coefficients to a different reference radius.
+continue_coeffs     Upward or downward continue a stack of potential
+                    coefficients, with optional downward continuation
+                    filters.
+normal_gravity      Calculate the normal gravity on a flattened ellipsoid
+                    for an array of geocentric latitudes.
+normal_field        Calculate the normal gravity and the normal potential of
+                    a rotating ellipsoid at a set of points.
+normal_field_grid   Return cached grids of the normal gravity and the normal
+                    potential on Driscoll and Healy or Gauss-Legendre
+                    quadrature latitudes.
 
 Magnetics routines
 ------------------
@@ -48,6 +92,15 @@ MakeMagGridDH       Create 2D cylindrical maps on a flattened ellipsoid of
                     all three vector components of the magnetic field, the
                     magnitude of the magnetic field, and the magnetic
                     potential.
+make_mag_grid_dh    Create 2D cylindrical maps on one or more flattened
+                    ellipsoids of selected components of the magnetic field,
+                    the magnitude of the magnetic field, and the magnetic
+                    potential.
+make_mag_grid_series_dh
+                    Create 2D cylindrical maps of selected components of a
+                    time-varying magnetic field for a series of epochs.
+make_mag_points     Evaluate selected components of the magnetic field and
+                    the magnetic potential at a set of points.
 mag_spectrum        Compute the spectrum of either the magnetic potential
                     or magnetic field strength.
 """
@@ -71,3 +124,22 @@ from ..shtools import NormalGravity
 from ..shtools import MakeMagGridDH
 
 from .mag_spectrum import mag_spectrum
+from .cilm_plus import cilm_plus_dh
+from .cilm_plus import cilm_plus_layers_dh
+from .ba_to_hilm import ba_to_hilm_dh
+from .synthesis import make_grav_grid_dh
+from .synthesis import make_grav_grad_grid_dh
+from .synthesis import make_geoid_grid_dh
+from .synthesis import make_mag_grid_dh
+from .synthesis import make_grav_points
+from .synthesis import make_grav_grad_points
+from .synthesis import make_mag_points
+from .synthesis import make_mag_grid_series_dh
+from .synthesis import GeoidEngine
+from .continuation import down_cont_filter_ma
+from .continuation import down_cont_filter_mc
+from .continuation import continuation_factors
+from .continuation import continue_coeffs
+from .normal import normal_gravity
+from .normal import normal_field
+from .normal import normal_field_grid
@@ -0,0 +1,231 @@
+"""
+    Functions for iteratively inverting a Bouguer anomaly for the relief along
+    an interface.
+"""
+from __future__ import absolute_import as _absolute_import
+from __future__ import division as _division
+from __future__ import print_function as _print_function
+
+import time as _time
+import numpy as _np
+
+from .. import shtools as _shtools
+from .continuation import down_cont_filter_ma as _down_cont_filter_ma
+from .continuation import down_cont_filter_mc as _down_cont_filter_mc
+
+
+def ba_to_hilm_dh(ba, hilm0, nmax, mass, r0, rho, lmax=None, sampling=2,
+                  filter_type=0, filter_deg=0, lmax_calc=None, tol=1.,
+                  maxiter=50, relax=1.):
+    """
+    Iteratively calculate the relief along an interface that corresponds to
+    a given Bouguer anomaly until the relief converges.
+
+    Usage
+    -----
+    hilm, info = ba_to_hilm_dh(ba, hilm0, nmax, mass, r0, rho, [lmax,
+                               sampling, filter_type, filter_deg, lmax_calc,
+                               tol, maxiter, relax])
+
+    Returns
+    -------
+    hilm : ndarray, shape (2, lmax+1, lmax+1)
+        The 4pi-normalized spherical harmonic coefficients of the relief.
+        The degree-0 term is the mean radius d of the initial relief.
+    info : dict
+        A dictionary with the following entries. 'niter': the number of
+        iterations that were performed. 'converged': True if the RMS change
+        of the relief in the last iteration was less than tol. 'rms': an
+        array of the RMS change of the relief for each iteration. 'time': an
+        array of the time in seconds taken by each iteration. 'ntransforms':
+        the total number of spherical harmonic transforms.
+
+    Parameters
+    ----------
+    ba : ndarray, shape (2, lmaxin+1, lmaxin+1)
+        The spherical harmonic coefficients of the Bouguer anomaly referenced
+        to a spherical interface of radius r0.
+    hilm0 : ndarray, shape (nlat, nlon) or (2, lmaxin+1, lmaxin+1)
+        The initial estimate of the relief, either as a Driscoll and Healy
+        grid or as 4pi-normalized spherical harmonic coefficients, such as
+        the solution of a previous inversion. The degree-0 term of the
+        relief must be included.
+    nmax : int
+        The order of the Taylor series used in the finite-amplitude
+        expansion.
+    mass : float
+        The mass of the planet in kg.
+    r0 : float
+        The reference radius of the Bouguer anomaly ba.
+    rho : float or ndarray, shape (nlat, nlon)
+        The density contrast of the relief in kg/m^3. If rho is a Driscoll
+        and Healy grid, the density varies laterally, as in BAtoHilmRhoHDH.
+    lmax : int, optional, default = nlat/2 - 1 or lmaxin
+        The maximum spherical harmonic degree of the output coefficients, and
+        the bandwidth of the grids used in the expansions. By default, this
+        is determined by the dimensions of hilm0.
+    sampling : int, optional, default = 2
+        The sampling of the Driscoll and Healy grids when hilm0 is an array
+        of spherical harmonic coefficients: 1 for equally sampled grids
+        (nlon = nlat) and 2 for equally spaced grids (nlon = 2*nlat).
+    filter_type : int, optional, default = 0
+        Apply a filter when downward continuing the gravity coefficients: 0
+        for no filter, 1 for the minimum amplitude filter, and 2 for the
+        minimum curvature filter.
+    filter_deg : int, optional, default = 0
+        The spherical harmonic degree where the filter is equal to 0.5.
+    lmax_calc : int, optional, default = lmax
+        The maximum spherical harmonic degree used in the expansions.
+    tol : float, optional, default = 1.
+        The iterations stop when the RMS change of the relief over the
+        sphere is less than tol, in the units of the relief.
+    maxiter : int, optional, default = 50
+        The maximum number of iterations.
+    relax : float, optional, default = 1.
+        The relaxation factor: each iteration updates the relief by relax
+        times the difference between the output of BAtoHilmDH and the
+        current relief. Values less than 1 damp the oscillations of the
+        iterations.
+
+    Description
+    -----------
+    Each iteration performs the same calculation as BAtoHilmDH, or
+    BAtoHilmRhoHDH when rho is a grid, using the relief grid of the previous
+    iteration (equation 18 of Wieczorek and Phillips 1998, and equation 30
+    of Wieczorek 2007). In contrast to calling these functions in a loop,
+    the mean radius d of the relief, the downward continuation filter and
+    the downward-continued Bouguer anomaly are computed only once, the RMS
+    change of the relief is computed from the spherical harmonic
+    coefficients, and only the grid of the new relief and the expansions of
+    the powers of the relief are computed in each iteration.
+
+    The mean radius of the relief does not change during the iterations.
+    When hilm0 is the solution of a previous inversion, the iterations start
+    from this solution, which reduces the number of iterations that are
+    required when the Bouguer anomaly or the density have changed only
+    slightly.
+    """
+    hilm0 = _np.asarray(hilm0, dtype=_np.float64)
+    ntransforms = 0
+    if hilm0.ndim == 2:
+        nlat, nlon = hilm0.shape
+        if nlon not in (nlat, 2 * nlat):
+            raise ValueError('hilm0 must be a Driscoll and Healy grid ' +
+                             'with nlon = nlat or nlon = 2*nlat. ' +
+                             'Input shape is {:s}.'.format(repr(hilm0.shape)))
+        sampling = nlon // nlat
+        if lmax is None:
+            lmax = nlat // 2 - 1
+        grid = hilm0
+        hilm = _shtools.SHExpandDH(grid, norm=1, sampling=sampling,
+                                   csphase=1, lmax_calc=lmax)
+        ntransforms += 1
+    elif hilm0.ndim == 3 and hilm0.shape[0] == 2:
+        if lmax is None:
+            lmax = hilm0.shape[1] - 1
+        hilm = _np.zeros((2, lmax + 1, lmax + 1))
+        lmaxin = min(lmax, hilm0.shape[1] - 1)
+        hilm[:, :lmaxin+1, :lmaxin+1] = hilm0[:, :lmaxin+1, :lmaxin+1]
+        grid = None
+    else:
+        raise ValueError('hilm0 must be dimensioned as (nlat, nlon) or ' +
+                         '(2, lmax+1, lmax+1). Input shape is {:s}.'
+                         .format(repr(hilm0.shape)))
+
+    if lmax_calc is None:
+        lmax_calc = lmax
+    elif lmax_calc > lmax:
+        raise ValueError('lmax_calc must be less than or equal to lmax. ' +
+                         'lmax_calc = {:d} and lmax = {:d}.'
+                         .format(lmax_calc, lmax))
+
+    ba = _np.asarray(ba, dtype=_np.float64)
+    if ba.shape[1] < lmax_calc + 1:
+        raise ValueError('ba must be dimensioned as (2, lmax_calc+1, ' +
+                         'lmax_calc+1), where lmax_calc = {:d}. '
+                         .format(lmax_calc) +
+                         'Input shape is {:s}.'.format(repr(ba.shape)))
+
+    rho = _np.asarray(rho, dtype=_np.float64)
+    lateral = rho.ndim == 2
+
+    def _make_grid(cilm):
+        return _shtools.MakeGridDH(cilm, lmax=lmax, norm=1, sampling=sampling,
+                                   csphase=1, lmax_calc=lmax_calc)
+
+    def _expand(grid, lmax_out=lmax_calc):
+        return _shtools.SHExpandDH(grid, norm=1, sampling=sampling, csphase=1,
+                                   lmax_calc=lmax_out)
+
+    # The mean radius of the relief, the filter and the downward-continued
+    # Bouguer anomaly do not change during the iterations.
+    d = hilm[0, 0, 0]
+    degrees = _np.arange(lmax_calc + 1)
+    filter_l = _np.ones(lmax_calc + 1)
+    if filter_type == 1:
+        filter_l[1:] = _down_cont_filter_ma(lmax_calc, filter_deg, r0, d)[1:]
+    elif filter_type == 2:
+        filter_l[1:] = _down_cont_filter_mc(lmax_calc, filter_deg, r0, d)[1:]
+    elif filter_type != 0:
+        raise ValueError('filter_type must be 0, 1 or 2. ' +
+                         'Input value was {:s}.'.format(repr(filter_type)))
+
+    bterm = _np.zeros((2, lmax_calc + 1, lmax_calc + 1))
+    bterm[:, 1:, :] = ba[:, 1:lmax_calc+1, :lmax_calc+1] * \
+        (filter_l * mass * (2. * degrees + 1.) * (r0 / d)**degrees /
+         (4. * _np.pi * d**2))[1:, _np.newaxis]
+    if not lateral:
+        bterm /= rho
+
+    # prod_{j=1}^{n} (l+4-j) / ((l+3) n!) for n = 2 to nmax.
+    factors = []
+    prod = _np.ones(lmax_calc + 1)
+    for n in range(1, nmax + 1):
+        prod = prod * (degrees + 4. - n) / n
+        if n > 1:
+            factors.append(d * filter_l * prod / (degrees + 3.))
+
+    rms = []
+    times = []
+    converged = False
+    for niter in range(1, maxiter + 1):
+        start = _time.time()
+        if grid is None:
+            grid = _make_grid(hilm)
+            ntransforms += 1
+
+        cilm = bterm.copy()
+        if lateral:
+            cilm[0, 0, 0] = _expand((grid - d) * rho, lmax_out=0)[0, 0, 0]
+            ntransforms += 1
+        for n in range(2, nmax + 1):
+            power = ((grid - d) / d)**n
+            if lateral:
+                power *= rho
+            cilmn = _expand(power)
+            ntransforms += 1
+            cilm[:, 1:, :] -= cilmn[:, 1:, :] * \
+                factors[n-2][1:, _np.newaxis]
+
+        if lateral:
+            cilm = _expand(_make_grid(cilm) / rho)
+            ntransforms += 2
+        cilm[0, 0, 0] = d
+        cilm[1, 0, 0] = 0.
+
+        update = _np.zeros_like(hilm)
+        update[:, :lmax_calc+1, :lmax_calc+1] = cilm
+        update -= hilm
+        hilm = hilm + relax * update
+        grid = None
+
+        rms.append(relax * _np.sqrt((update**2).sum()))
+        times.append(_time.time() - start)
+        if rms[-1] < tol:
+            converged = True
+            break
+
+    info = {'niter': niter, 'converged': converged, 'rms': _np.array(rms),
+            'time': _np.array(times), 'ntransforms': ntransforms}
+
+    return hilm, info
@@ -0,0 +1,264 @@
+"""
+    Functions for computing the gravitational potential of stacks of relief
+    models using the finite-amplitude algorithm.
+"""
+from __future__ import absolute_import as _absolute_import
+from __future__ import division as _division
+from __future__ import print_function as _print_function
+
+import numpy as _np
+import multiprocessing as _multiprocessing
+
+from .. import shtools as _shtools
+
+
+# Data shared by the workers of cilm_plus_dh().
+_cilm_plus_state = {}
+
+
+def _cilm_plus_init(state):
+    """Initialize a worker of cilm_plus_dh()."""
+    _cilm_plus_state.clear()
+    _cilm_plus_state.update(state)
+
+
+def _cilm_plus_power(task, state=None):
+    """
+    Return the power k, the model index i, and the spherical harmonic
+    coefficients of rho * ((h-d)/scalef)**k for model i of the stack.
+    """
+    if state is None:
+        state = _cilm_plus_state
+
+    k, i = task
+    grid = state['rho'][i] * ((state['gridin'][i] - state['d'][i]) /
+                              state['scalef'][i])**k
+    return k, i, _shtools.SHExpandDH(grid, norm=1,
+                                     sampling=state['sampling'], csphase=1,
+                                     lmax_calc=state['lmax'])
+
+
+def cilm_plus_dh(gridin, nmax, mass, rho, lmax=None, nprocs=None):
+    """
+    Calculate the gravitational potential exterior to relief along a
+    spherical interface for a stack of relief models using the
+    finite-amplitude algorithm of Wieczorek and Phillips (1998).
+
+    Usage
+    -----
+    cilm, d = cilm_plus_dh(gridin, nmax, mass, rho, [lmax, nprocs])
+
+    Returns
+    -------
+    cilm : ndarray, shape (..., 2, lmax+1, lmax+1)
+        The 4pi-normalized potential coefficients of each model, where the
+        leading dimensions are those of gridin. The coefficients are
+        referenced to the mean radius d of the corresponding relief.
+    d : ndarray, shape (...)
+        The mean radius of each relief model, in meters.
+
+    Parameters
+    ----------
+    gridin : ndarray, shape (..., nlat, nlon)
+        A stack of Driscoll and Healy (1994) grids of the radius of the
+        relief, in meters, where the leading dimensions are arbitrary. All
+        grids must have the same sampling, with nlon = nlat or nlon = 2*nlat.
+    nmax : int
+        The maximum order used in the Taylor-series expansion when
+        calculating the potential coefficients.
+    mass : float
+        The total mass of the planet, in kg.
+    rho : float or ndarray
+        The density contrast of the relief, in kg/m^3. This can be a float,
+        an array of densities with the leading dimensions of gridin, or an
+        array of grids with the same shape as gridin for densities that vary
+        laterally, as in CilmPlusRhoHDH.
+    lmax : int, optional, default = nlat/2 - 1
+        The maximum spherical harmonic degree of the output coefficients.
+    nprocs : int, optional, default = None
+        The number of worker processes. If None, the number of CPUs is used.
+        If 1, all expansions are computed in the calling process.
+
+    Description
+    -----------
+    This function computes the same potential coefficients as CilmPlusDH
+    and CilmPlusRhoHDH for each relief model of the stack. For a relief h
+    with mean radius d, the expansion is
+
+        Clm = 4 pi d**3 / (M (2l+1)) sum_{n=1}^{nmax}
+              hlm(rho (h-d)**n) / (d**n n!) prod_{j=1}^{n} (l+4-j) / (l+3),
+
+    where hlm(f) denotes the spherical harmonic coefficients of f. The
+    Fortran routines compute the powers of each relief grid sequentially.
+    Here, the expansion of each power n of each model is an independent
+    task that is computed by one of a pool of worker processes that receive
+    the stack of grids only once, and all expansions use the same grid
+    dimensions and output bandwidth. Each power grid is discarded as soon as
+    it has been expanded, and the coefficients are accumulated as they are
+    returned. As in CilmPlusDH, the relief grids are scaled by their
+    maximum deviation from d before they are raised to a power, in order to
+    avoid overflows.
+    """
+    gridin = _np.asarray(gridin, dtype=_np.float64)
+    if gridin.ndim < 2:
+        raise ValueError('gridin must be dimensioned as (..., nlat, nlon). ' +
+                         'Input shape is {:s}.'.format(repr(gridin.shape)))
+
+    nlat, nlon = gridin.shape[-2:]
+    if nlat % 2 != 0 or nlon not in (nlat, 2 * nlat):
+        raise ValueError('gridin must be a Driscoll and Healy grid with ' +
+                         'nlon = nlat or nlon = 2*nlat, and nlat even. ' +
+                         'Input shape is {:s}.'.format(repr(gridin.shape)))
+
+    if lmax is None:
+        lmax = nlat // 2 - 1
+    elif lmax > nlat // 2 - 1:
+        raise ValueError('lmax must be less than or equal to nlat/2 - 1. ' +
+                         'lmax = {:s} and nlat = {:d}.'
+                         .format(repr(lmax), nlat))
+
+    if nmax < 1:
+        raise ValueError('nmax must be greater than or equal to 1. ' +
+                         'Input value was {:s}.'.format(repr(nmax)))
+
+    shape = gridin.shape[:-2]
+    gridin = gridin.reshape((-1, nlat, nlon))
+    rho = _np.asarray(rho, dtype=_np.float64)
+    if rho.ndim >= 2 and rho.shape[-2:] == (nlat, nlon):
+        rho = _np.broadcast_to(rho, shape + (nlat, nlon))
+        rho = rho.reshape((-1, nlat, nlon))
+    else:
+        rho = _np.broadcast_to(rho, shape).reshape((-1, 1, 1))
+
+    sampling = nlon // nlat
+    d = _np.array([_shtools.SHExpandDH(grid, norm=1, sampling=sampling,
+                                       csphase=1, lmax_calc=0)[0, 0, 0]
+                   for grid in gridin])
+    scalef = _np.abs(gridin - d[:, _np.newaxis, _np.newaxis]).max(axis=(1, 2))
+    # A relief that is equal to d everywhere has no contribution for n > 0.
+    scalef[scalef == 0.] = 1.
+
+    state = {'gridin': gridin, 'rho': rho, 'sampling': sampling,
+             'lmax': lmax, 'd': d[:, _np.newaxis, _np.newaxis],
+             'scalef': scalef[:, _np.newaxis, _np.newaxis]}
+
+    degrees = _np.arange(lmax + 1)
+    factors = _np.empty((nmax, len(gridin), lmax + 1))
+    prod = _np.ones(lmax + 1)
+    for k in range(1, nmax + 1):
+        prod = prod * (degrees + 4. - k) / k
+        factors[k-1] = (4. * _np.pi * d**3 / mass)[:, _np.newaxis] * \
+            ((scalef / d)**k)[:, _np.newaxis] * \
+            (prod / (degrees + 3.) / (2. * degrees + 1.))
+
+    # Each task is the expansion of one power of one model. The results are
+    # accumulated as they are returned, so that only one power grid per
+    # worker and one set of coefficients per model are held in memory.
+    tasks = [(k, i) for k in range(1, nmax + 1) for i in range(len(gridin))]
+    cilm = _np.zeros((len(gridin), 2, lmax + 1, lmax + 1))
+    if nprocs == 1 or len(tasks) == 1:
+        for task in tasks:
+            k, i, coeffs = _cilm_plus_power(task, state)
+            cilm[i] += coeffs * factors[k-1, i, _np.newaxis, :, _np.newaxis]
+    else:
+        if nprocs is None:
+            nprocs = _multiprocessing.cpu_count()
+        nprocs = min(nprocs, len(tasks))
+        pool = _multiprocessing.Pool(processes=nprocs,
+                                     initializer=_cilm_plus_init,
+                                     initargs=(state, ))
+        try:
+            for k, i, coeffs in pool.imap(
+                    _cilm_plus_power, tasks,
+                    chunksize=max(1, len(tasks) // (4 * nprocs))):
+                cilm[i] += coeffs * \
+                    factors[k-1, i, _np.newaxis, :, _np.newaxis]
+        finally:
+            pool.close()
+            pool.join()
+
+    return cilm.reshape(shape + cilm.shape[1:]), d.reshape(shape)
+
+
+def cilm_plus_layers_dh(gridin, nmax, mass, rho, r0, lmax=None, nprocs=None):
+    """
+    Calculate the gravitational potential exterior to a model composed of
+    several density interfaces using the finite-amplitude algorithm of
+    Wieczorek and Phillips (1998).
+
+    Usage
+    -----
+    cilm, d = cilm_plus_layers_dh(gridin, nmax, mass, rho, r0, [lmax,
+                                  nprocs])
+
+    Returns
+    -------
+    cilm : ndarray, shape (..., 2, lmax+1, lmax+1)
+        The 4pi-normalized potential coefficients of the sum of all
+        interfaces, referenced to the radius r0.
+    d : ndarray, shape (..., nlayers)
+        The mean radius of each interface, in meters.
+
+    Parameters
+    ----------
+    gridin : ndarray or list of ndarrays, shape (..., nlayers, nlat, nlon)
+        The Driscoll and Healy (1994) grids of the radius of each interface,
+        in meters, such as the surface, the base of the sediments and the
+        crust-mantle interface. Additional leading dimensions correspond to
+        independent models. All grids must have the same sampling.
+    nmax : int
+        The maximum order used in the Taylor-series expansion when
+        calculating the potential coefficients.
+    mass : float
+        The total mass of the planet, in kg.
+    rho : list or ndarray
+        The density contrast across each interface, in kg/m^3, given as the
+        density below the interface minus the density above. This can be a
+        list with one float or one Driscoll and Healy grid for each
+        interface, or an array that is accepted by cilm_plus_dh.
+    r0 : float
+        The reference radius of the output coefficients.
+    lmax : int, optional, default = nlat/2 - 1
+        The maximum spherical harmonic degree of the output coefficients.
+    nprocs : int, optional, default = None
+        The number of worker processes. If None, the number of CPUs is used.
+        If 1, all expansions are computed in the calling process.
+
+    Description
+    -----------
+    The potential coefficients of each interface are computed by
+    cilm_plus_dh, as for CilmPlusDH and CilmPlusRhoHDH, and are referenced
+    to the mean radius d of the interface. The coefficients of all
+    interfaces are then referenced to r0 by multiplying them by (d/r0)**l,
+    and summed. All interfaces and all powers of the Taylor-series
+    expansion are independent tasks that are computed by a single pool of
+    worker processes, with the same grid dimensions and output bandwidth,
+    and each power grid is discarded as soon as it has been expanded.
+    """
+    gridin = _np.asarray(gridin, dtype=_np.float64)
+    if gridin.ndim < 3:
+        raise ValueError('gridin must be dimensioned as (..., nlayers, ' +
+                         'nlat, nlon). Input shape is {:s}.'
+                         .format(repr(gridin.shape)))
+
+    nlayers = gridin.shape[-3]
+    if isinstance(rho, (list, tuple)):
+        if len(rho) != nlayers:
+            raise ValueError('rho must contain one density for each ' +
+                             'interface. len(rho) = {:d} and nlayers = {:d}.'
+                             .format(len(rho), nlayers))
+        rho = [_np.asarray(value, dtype=_np.float64) for value in rho]
+        if any(value.ndim > 0 for value in rho):
+            rho = _np.array([_np.broadcast_to(value, gridin.shape[-2:])
+                             for value in rho])
+        else:
+            rho = _np.array(rho)
+
+    cilm, d = cilm_plus_dh(gridin, nmax, mass, rho, lmax=lmax,
+                           nprocs=nprocs)
+
+    degrees = _np.arange(cilm.shape[-1])
+    scale = _np.exp(degrees * _np.log(d / r0)[..., _np.newaxis])
+    cilm = (cilm * scale[..., _np.newaxis, :, _np.newaxis]).sum(axis=-4)
+
+    return cilm, d
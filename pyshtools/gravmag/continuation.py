@@ -0,0 +1,247 @@
+"""
+    Functions for upward and downward continuing spherical harmonic
+    coefficients of the potential, with optional downward continuation
+    filters.
+"""
+from __future__ import absolute_import as _absolute_import
+from __future__ import division as _division
+from __future__ import print_function as _print_function
+
+import numpy as _np
+from collections import OrderedDict as _OrderedDict
+
+
+# Process-wide cache of the continuation factors, keyed by (lmax, r0, r,
+# filter, half). The arrays are read-only and are shared by all callers.
+_factors_cache = _OrderedDict()
+_factors_cache_size = 32
+
+
+def _log_filter(lmax, half, r, d, kind):
+    """
+    Return the logarithm of the minimum-amplitude ('ma') or
+    minimum-curvature ('mc') downward continuation filter for degrees 0 to
+    lmax.
+    """
+    if lmax < 0:
+        raise ValueError('lmax must be greater or equal to zero. ' +
+                         'Input value was {:s}.'.format(repr(lmax)))
+
+    if half == 0:
+        return _np.zeros(lmax + 1)
+
+    degrees = _np.arange(lmax + 1, dtype=_np.float64)
+    # log((2l+1) (r/d)**l / ((2half+1) (r/d)**half)), which is evaluated in
+    # logarithms as (r/d)**l overflows for large l when r > d.
+    x = _np.log(2. * degrees + 1.) + degrees * _np.log(r / d) - \
+        _np.log(2. * half + 1.) - half * _np.log(r / d)
+    if kind == 'mc':
+        x[1:] += 0.5 * _np.log(degrees[1:] * (degrees[1:] + 1.) /
+                               (half * (half + 1.)))
+        x[0] = -_np.inf
+    return -_np.logaddexp(0., 2. * x)
+
+
+def down_cont_filter_ma(lmax, half, r, d):
+    """
+    Compute the minimum-amplitude downward continuation filter for all
+    degrees from 0 to lmax.
+
+    Usage
+    -----
+    wl = down_cont_filter_ma(lmax, half, r, d)
+
+    Returns
+    -------
+    wl : ndarray, shape (lmax+1)
+        The values of the filter for degrees 0 to lmax.
+
+    Parameters
+    ----------
+    lmax : int
+        The maximum spherical harmonic degree.
+    half : int
+        The spherical harmonic degree where the filter is equal to 0.5. If
+        half is 0, the filter is equal to 1 for all degrees.
+    r : float
+        The reference radius of the gravitational field.
+    d : float
+        The radius of the surface to downward continue to.
+
+    Description
+    -----------
+    This function returns the same values as calling DownContFilterMA for
+    each degree l from 0 to lmax. The filter is
+
+        wl = 1 / (1 + (Wl / Whalf)**2),  Wl = (2l+1) (r/d)**l,
+
+    see Wieczorek and Phillips (1998) for details. The terms are computed in
+    logarithms, so that the filter is defined for large degrees when (r/d)**l
+    would overflow.
+    """
+    return _np.exp(_log_filter(lmax, half, r, d, 'ma'))
+
+
+def down_cont_filter_mc(lmax, half, r, d):
+    """
+    Compute the minimum-curvature downward continuation filter for all
+    degrees from 0 to lmax.
+
+    Usage
+    -----
+    wl = down_cont_filter_mc(lmax, half, r, d)
+
+    Returns
+    -------
+    wl : ndarray, shape (lmax+1)
+        The values of the filter for degrees 0 to lmax.
+
+    Parameters
+    ----------
+    lmax : int
+        The maximum spherical harmonic degree.
+    half : int
+        The spherical harmonic degree where the filter is equal to 0.5. If
+        half is 0, the filter is equal to 1 for all degrees.
+    r : float
+        The reference radius of the gravitational field.
+    d : float
+        The radius of the surface to downward continue to.
+
+    Description
+    -----------
+    This function returns the same values as calling DownContFilterMC for
+    each degree l from 0 to lmax. The filter is
+
+        wl = 1 / (1 + l(l+1) Wl**2 / (half(half+1) Whalf**2)),
+        Wl = (2l+1) (r/d)**l,
+
+    see Phillips et al. (2001) for details. The terms are computed in
+    logarithms, so that the filter is defined for large degrees when (r/d)**l
+    would overflow.
+    """
+    return _np.exp(_log_filter(lmax, half, r, d, 'mc'))
+
+
+def continuation_factors(lmax, r0, r, filter=None, half=0):
+    """
+    Return the per-degree factors that continue potential coefficients from
+    the reference radius r0 to the radius r.
+
+    Usage
+    -----
+    factors = continuation_factors(lmax, r0, r, [filter, half])
+
+    Returns
+    -------
+    factors : ndarray, shape (lmax+1)
+        A read-only array of the factors (r0/r)**l multiplied by the filter
+        for degrees 0 to lmax.
+
+    Parameters
+    ----------
+    lmax : int
+        The maximum spherical harmonic degree.
+    r0 : float
+        The reference radius of the input coefficients.
+    r : float
+        The reference radius of the output coefficients.
+    filter : str, optional, default = None
+        The filter that is applied when r is less than r0: None for no
+        filter, 'ma' for the minimum-amplitude filter, and 'mc' for the
+        minimum-curvature filter. No filter is applied when r is greater
+        than or equal to r0.
+    half : int, optional, default = 0
+        The spherical harmonic degree where the filter is equal to 0.5.
+
+    Description
+    -----------
+    The factors are cached, keyed by (lmax, r0, r, filter, half), so that
+    repeated continuations of many coefficient sets with the same
+    parameters compute the factors only once. The returned array is shared
+    between callers and must not be modified.
+    """
+    if filter not in (None, 'ma', 'mc'):
+        raise ValueError("filter must be None, 'ma' or 'mc'. " +
+                         'Input value was {:s}.'.format(repr(filter)))
+
+    if r0 <= 0. or r <= 0.:
+        raise ValueError('r0 and r must be positive. ' +
+                         'r0 = {:s} and r = {:s}.'.format(repr(r0), repr(r)))
+
+    if filter is None or r >= r0:
+        half = 0
+
+    key = (int(lmax), float(r0), float(r), filter if half else None,
+           int(half))
+    factors = _factors_cache.get(key)
+    if factors is not None:
+        return factors
+
+    # The product is formed in logarithms, as (r0/r)**l overflows for large
+    # l when the filter is small.
+    factors = _np.exp(_np.arange(lmax + 1) * _np.log(r0 / r) +
+                      _log_filter(lmax, half, r0, r, filter))
+    factors.setflags(write=False)
+
+    _factors_cache[key] = factors
+    while len(_factors_cache) > _factors_cache_size:
+        _factors_cache.popitem(last=False)
+    return factors
+
+
+def continue_coeffs(cilm, r0, r, filter=None, half=0, out=None):
+    """
+    Upward or downward continue a stack of potential coefficients from the
+    reference radius r0 to the radius r.
+
+    Usage
+    -----
+    cilm_r = continue_coeffs(cilm, r0, r, [filter, half, out])
+
+    Returns
+    -------
+    cilm_r : ndarray, shape (..., 2, lmax+1, lmax+1)
+        The coefficients referenced to the radius r.
+
+    Parameters
+    ----------
+    cilm : ndarray, shape (..., 2, lmax+1, lmax+1)
+        A stack of real or complex spherical harmonic coefficients of the
+        potential, where the leading dimensions are arbitrary.
+    r0 : float
+        The reference radius of the input coefficients.
+    r : float
+        The reference radius of the output coefficients.
+    filter : str, optional, default = None
+        The filter that is applied when downward continuing: None for no
+        filter, 'ma' for the minimum-amplitude filter, and 'mc' for the
+        minimum-curvature filter.
+    half : int, optional, default = 0
+        The spherical harmonic degree where the filter is equal to 0.5.
+    out : ndarray, optional, default = None
+        An array with the shape of cilm in which the output is stored. This
+        can be cilm itself.
+
+    Description
+    -----------
+    For a potential of the form
+
+        V = GM/r sum_l (r0/r)**l sum_m Clm Ylm,
+
+    the coefficients referenced to the radius r are Clm (r0/r)**l. When r is
+    less than r0, the amplification of the short wavelengths can be damped
+    by the filters of DownContFilterMA and DownContFilterMC. The factors are
+    obtained from continuation_factors, and are applied to the entire stack
+    with a single multiplication.
+    """
+    cilm = _np.asarray(cilm)
+    if cilm.ndim < 3 or cilm.shape[-3] != 2 or \
+            cilm.shape[-2] != cilm.shape[-1]:
+        raise ValueError('cilm must be dimensioned as (..., 2, lmax+1, ' +
+                         'lmax+1). Input shape is {:s}.'
+                         .format(repr(cilm.shape)))
+
+    factors = continuation_factors(cilm.shape[-1] - 1, r0, r, filter=filter,
+                                   half=half)
+    return _np.multiply(cilm, factors[:, _np.newaxis], out=out)
@@ -0,0 +1,301 @@
+"""
+    Functions for computing the normal gravity and the normal potential of a
+    rotating ellipsoid.
+"""
+from __future__ import absolute_import as _absolute_import
+from __future__ import division as _division
+from __future__ import print_function as _print_function
+
+import warnings as _warnings
+import numpy as _np
+from collections import OrderedDict as _OrderedDict
+
+
+# Process-wide cache of the normal field grids, keyed by (gm, omega, a, b,
+# grid, lmax, r). The grids are read-only and are shared by all callers.
+_grid_cache = _OrderedDict()
+_grid_cache_size = 16
+
+
+def _check_ellipsoid(omega, a, b):
+    """
+    Check the semimajor and semiminor axes and return the angular rotation
+    rate that is used, following the conventions of NormalGravity.
+    """
+    if a < b:
+        _warnings.warn('The semimajor axis a should be greater than the ' +
+                       'semiminor axis b. a = {:s} and b = {:s}.'
+                       .format(repr(a), repr(b)), RuntimeWarning)
+    if a == b and omega != 0.:
+        _warnings.warn('a can not be equal to b when omega is non zero. ' +
+                       'Setting omega equal to zero.', RuntimeWarning)
+        omega = 0.
+    return omega
+
+
+def _ellipsoid_constants(gm, omega, a, b):
+    """
+    Return the linear eccentricity E, q0, q0' and the gravity at the equator
+    and at the poles of a rotating ellipsoid.
+    """
+    bigE = _np.sqrt(a**2 - b**2)
+    m = omega**2 * a**2 * b / gm
+    ep = bigE / b
+    q0 = 0.5 * ((1. + 3. * (b / bigE)**2) * _np.arctan(bigE / b) -
+                3. * b / bigE)
+    q0p = 3. * (1. + (b / bigE)**2) * \
+        (1. - b / bigE * _np.arctan(bigE / b)) - 1.
+    ga = gm / (a * b) * (1. - m - m * ep * q0p / 6. / q0)
+    gb = gm / a**2 * (1. + m * ep * q0p / 3. / q0)
+    return bigE, q0, q0p, ga, gb
+
+
+def normal_gravity(lat, gm, omega, a, b, degrees=True):
+    """
+    Calculate the normal gravity on a flattened ellipsoid using the formula
+    of Somigliana for an array of geocentric latitudes.
+
+    Usage
+    -----
+    gamma = normal_gravity(lat, gm, omega, a, b, [degrees])
+
+    Returns
+    -------
+    gamma : float or ndarray
+        The normal gravity on the ellipsoid at the geocentric latitudes lat,
+        with the shape of lat.
+
+    Parameters
+    ----------
+    lat : float or ndarray
+        The geocentric latitudes.
+    gm : float
+        The gravitational constant multiplied by the mass of the ellipsoid.
+    omega : float
+        The angular rotation rate of the ellipsoid.
+    a : float
+        The semimajor axis of the ellipsoid.
+    b : float
+        The semiminor axis of the ellipsoid.
+    degrees : bool, optional, default = True
+        True if lat is in degrees, False if in radians.
+
+    Description
+    -----------
+    This function returns the same values as calling NormalGravity for each
+    latitude. The normal gravity on the surface of the ellipsoid is given
+    by the formula of Somigliana,
+
+        gamma = (a ga cos(phi)**2 + b gb sin(phi)**2) /
+                sqrt(a**2 cos(phi)**2 + b**2 sin(phi)**2),
+
+    where ga and gb are the gravity at the equator and at the poles, and
+    phi is the geodetic latitude (see Physical Geodesy, Hofmann-Wellenhof
+    and Moritz, 2006). When a is equal to b, the normal gravity is gm/a**2
+    and omega is ignored.
+    """
+    omega = _check_ellipsoid(omega, a, b)
+    lat = _np.asarray(lat, dtype=_np.float64)
+    if degrees:
+        lat = _np.radians(lat)
+
+    if a == b:
+        return _np.full(lat.shape, gm / a**2)[()]
+
+    bigE, q0, q0p, ga, gb = _ellipsoid_constants(gm, omega, a, b)
+    geodetic_lat = _np.arctan((a / b)**2 * _np.tan(lat))
+    cos2 = _np.cos(geodetic_lat)**2
+    sin2 = _np.sin(geodetic_lat)**2
+    return ((a * ga * cos2 + b * gb * sin2) /
+            _np.sqrt(a**2 * cos2 + b**2 * sin2))[()]
+
+
+def normal_field(lat, r, gm, omega, a, b, degrees=True):
+    """
+    Calculate the magnitude of the normal gravity and the normal potential
+    of a rotating ellipsoid at a set of points.
+
+    Usage
+    -----
+    gamma, u = normal_field(lat, r, gm, omega, a, b, [degrees])
+
+    Returns
+    -------
+    gamma : float or ndarray
+        The magnitude of the normal gravity, including the centrifugal
+        acceleration, with the broadcast shape of lat and r.
+    u : float or ndarray
+        The normal gravity potential, including the centrifugal potential,
+        with the broadcast shape of lat and r.
+
+    Parameters
+    ----------
+    lat : float or ndarray
+        The geocentric latitudes of the points.
+    r : float or ndarray
+        The radii of the points, which must be exterior to the ellipsoid.
+    gm : float
+        The gravitational constant multiplied by the mass of the ellipsoid.
+    omega : float
+        The angular rotation rate of the ellipsoid.
+    a : float
+        The semimajor axis of the ellipsoid.
+    b : float
+        The semiminor axis of the ellipsoid.
+    degrees : bool, optional, default = True
+        True if lat is in degrees, False if in radians.
+
+    Description
+    -----------
+    The normal potential and gravity are computed in ellipsoidal-harmonic
+    coordinates (u, beta) using the closed formulas of Heiskanen and Moritz
+    (1967),
+
+        U = gm/E atan(E/u) + omega**2 a**2 q/(2 q0) (sin(beta)**2 - 1/3)
+            + omega**2 (u**2+E**2) cos(beta)**2 / 2,
+
+    where E is the linear eccentricity, u is the semiminor axis of the
+    confocal ellipsoid that passes through the point, and beta is the
+    reduced latitude. On the surface of the ellipsoid, the potential is
+    constant and the gravity is equal to the value given by NormalGravity.
+    When a is equal to b, the potential is gm/r and omega is ignored.
+    """
+    omega = _check_ellipsoid(omega, a, b)
+    lat = _np.asarray(lat, dtype=_np.float64)
+    r = _np.asarray(r, dtype=_np.float64)
+    if degrees:
+        lat = _np.radians(lat)
+    lat, r = _np.broadcast_arrays(lat, r)
+
+    if a == b:
+        return (gm / r**2)[()], (gm / r)[()]
+
+    bigE, q0, q0p, ga, gb = _ellipsoid_constants(gm, omega, a, b)
+    x = r * _np.cos(lat)
+    z = r * _np.sin(lat)
+    e2 = bigE**2
+    s = r**2 - e2
+    u2 = 0.5 * s * (1. + _np.sqrt(1. + 4. * e2 * z**2 / s**2))
+    u = _np.sqrt(u2)
+    v = _np.sqrt(u2 + e2)
+    beta = _np.arctan2(z * v, u * x)
+    sinb2 = _np.sin(beta)**2
+    cosb2 = _np.cos(beta)**2
+
+    atn = _np.arctan(bigE / u)
+    q = 0.5 * ((1. + 3. * u2 / e2) * atn - 3. * u / bigE)
+    qp = 3. * (1. + u2 / e2) * (1. - u / bigE * atn) - 1.
+    w = _np.sqrt((u2 + e2 * sinb2) / (u2 + e2))
+
+    pot = gm / bigE * atn + 0.5 * omega**2 * a**2 * q / q0 * \
+        (sinb2 - 1. / 3.) + 0.5 * omega**2 * (u2 + e2) * cosb2
+    gu = -(gm / (u2 + e2) + omega**2 * a**2 * bigE / (u2 + e2) * qp / q0 *
+           (0.5 * sinb2 - 1. / 6.) - omega**2 * u * cosb2) / w
+    gbeta = (-omega**2 * a**2 / v * q / q0 + omega**2 * v) * \
+        _np.sin(beta) * _np.cos(beta) / w
+
+    return _np.sqrt(gu**2 + gbeta**2)[()], pot[()]
+
+
+def _grid_lats(lmax, grid):
+    """
+    Return the geocentric latitudes in radians and the number of longitudes
+    of a Driscoll and Healy or Gauss-Legendre quadrature grid.
+    """
+    if grid.upper() in ('DH', 'DH1', 'DH2'):
+        nlat = 2 * (lmax + 1)
+        lats = _np.pi / 2. - _np.pi * _np.arange(nlat) / nlat
+        nlon = 2 * nlat if grid.upper() == 'DH2' else nlat
+    elif grid.upper() == 'GLQ':
+        zeros = _np.polynomial.legendre.leggauss(lmax + 1)[0][::-1]
+        lats = _np.pi / 2. - _np.arccos(zeros)
+        nlon = 2 * lmax + 1
+    else:
+        raise ValueError("grid must be 'DH', 'DH1', 'DH2', or 'GLQ'. " +
+                         'Input value was {:s}.'.format(repr(grid)))
+    return lats, nlon
+
+
+def normal_field_grid(gm, omega, a, b, lmax, grid='DH2', r=None):
+    """
+    Return grids of the normal gravity and the normal potential of a
+    rotating ellipsoid on the latitudes of a Driscoll and Healy or
+    Gauss-Legendre quadrature grid.
+
+    Usage
+    -----
+    gamma, u = normal_field_grid(gm, omega, a, b, lmax, [grid, r])
+
+    Returns
+    -------
+    gamma : ndarray, shape (nlat, nlon)
+        A read-only grid of the magnitude of the normal gravity.
+    u : ndarray, shape (nlat, nlon)
+        A read-only grid of the normal gravity potential.
+
+    Parameters
+    ----------
+    gm : float
+        The gravitational constant multiplied by the mass of the ellipsoid.
+    omega : float
+        The angular rotation rate of the ellipsoid.
+    a : float
+        The semimajor axis of the ellipsoid.
+    b : float
+        The semiminor axis of the ellipsoid.
+    lmax : int
+        The maximum spherical harmonic degree of the grid, which determines
+        the grid dimensions.
+    grid : str, optional, default = 'DH2'
+        'DH' or 'DH1' for an equisampled lat/lon grid with nlat=nlon, 'DH2'
+        for an equidistant lat/lon grid with nlon=2*nlat, or 'GLQ' for a
+        Gauss-Legendre quadrature grid.
+    r : float, optional, default = None
+        The radius of the sphere on which the normal field is computed. If
+        None, the normal field is computed on the surface of the ellipsoid,
+        where the gravity is given by the formula of Somigliana.
+
+    Description
+    -----------
+    The normal field depends only on latitude, and the grids are read-only
+    views of a single column of values. The grids are cached, keyed by
+    (gm, omega, a, b, grid, lmax, r), so that pipelines that compute the
+    gravity disturbance of many models can subtract the normal gravity with
+    a single array operation. The grids must not be modified; use
+    numpy.array(gamma) to obtain a writeable copy.
+
+    The Gauss-Legendre quadrature latitudes are the nodes returned by
+    SHGLQ, ordered from north to south.
+    """
+    if not isinstance(grid, str):
+        raise ValueError('grid must be a string. ' +
+                         'Input type was {:s}'.format(str(type(grid))))
+
+    key = (float(gm), float(omega), float(a), float(b), grid.upper(),
+           int(lmax), None if r is None else float(r))
+    if key[4] == 'DH':
+        key = key[:4] + ('DH1', ) + key[5:]
+    grids = _grid_cache.get(key)
+    if grids is not None:
+        return grids
+
+    lats, nlon = _grid_lats(lmax, grid)
+    if r is None:
+        gamma = normal_gravity(lats, gm, omega, a, b, degrees=False)
+        if a == b:
+            pot = _np.full(lats.shape, gm / a)
+        else:
+            bigE = _np.sqrt(a**2 - b**2)
+            pot = _np.full(lats.shape, gm / bigE * _np.arctan(bigE / b) +
+                           omega**2 * a**2 / 3.)
+    else:
+        gamma, pot = normal_field(lats, r, gm, omega, a, b, degrees=False)
+
+    grids = tuple(_np.broadcast_to(_np.reshape(values, (-1, 1)),
+                                   (len(lats), nlon))
+                  for values in (gamma, pot))
+
+    _grid_cache[key] = grids
+    while len(_grid_cache) > _grid_cache_size:
+        _grid_cache.popitem(last=False)
+    return grids
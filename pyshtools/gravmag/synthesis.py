@@ -0,0 +1,1707 @@
+"""
+    Functions and classes for synthesizing selected components of the
+    gravity and magnetic fields and the geoid on Driscoll and Healy (1994)
+    grids and at sets of points.
+"""
+from __future__ import absolute_import as _absolute_import
+from __future__ import division as _division
+from __future__ import print_function as _print_function
+
+import numpy as _np
+from multiprocessing.pool import ThreadPool as _ThreadPool
+
+from .. import shtools as _shtools
+from .normal import normal_gravity as _normal_gravity
+
+
+_GRAV_COMPONENTS = ('rad', 'theta', 'phi', 'total', 'pot')
+_GRAVGRAD_COMPONENTS = ('vxx', 'vyy', 'vzz', 'vxy', 'vxz', 'vyz')
+_MAG_COMPONENTS = ('rad', 'theta', 'phi', 'total')
+
+# The number of elements of the tables of Legendre functions that are
+# computed at once.
+_TABLE_SIZE = 2**23
+
+_ORDER_INDEX = {}
+
+
+def _order_index(lmax):
+    """
+    Return the permutation that sorts the Legendre functions returned by
+    PlmBar by order and then by degree, and the offsets of the first function
+    of each order.
+    """
+    if lmax not in _ORDER_INDEX:
+        counts = _np.arange(lmax + 1, 0, -1)
+        offsets = _np.concatenate(([0], _np.cumsum(counts)))
+        orders = _np.repeat(_np.arange(lmax + 1), counts)
+        degrees = _np.arange(offsets[-1]) - offsets[orders] + orders
+        _ORDER_INDEX[lmax] = (degrees * (degrees + 1) // 2 + orders, offsets)
+    return _ORDER_INDEX[lmax]
+
+
+def _derivative_factors(lmax):
+    """
+    Return the factors alpha and beta, indexed by degree and order, of the
+    colatitudinal derivative of the 4pi-normalized Legendre functions
+    dPlm/dtheta = alpha_lm P(l,m-1) - beta_lm P(l,m+1).
+    """
+    degrees = _np.arange(lmax + 1)[:, _np.newaxis]
+    orders = _np.arange(lmax + 1)[_np.newaxis, :]
+    valid = orders <= degrees
+    alpha = _np.where(valid, 0.5 * _np.sqrt(_np.maximum(
+        (degrees + orders) * (degrees - orders + 1.), 0.)), 0.)
+    beta = _np.where(valid, 0.5 * _np.sqrt(_np.maximum(
+        (degrees + orders + 1.) * (degrees - orders), 0.)), 0.)
+    alpha[:, 0] = 0.
+    alpha[:, 1] *= _np.sqrt(2.)
+    beta[:, 0] *= _np.sqrt(2.)
+    return alpha, beta
+
+
+def _legendre_sums(ccoef, theta, q, terms):
+    """
+    Return, for each order m and colatitude, the sums over degree l of
+    factor_l * q**l * (C_lm - i S_lm) * d^k Plm / dtheta^k.
+
+    ccoef is the complex array C_lm - i S_lm of shape (..., lmax+1, lmax+1)
+    of 4pi-normalized coefficients, theta are the colatitudes in radians,
+    and q is the ratio r0/r with shape (..., ntheta). terms is a dict whose
+    values are tuples (factor, k), where factor is None or an array of
+    degree factors and k (0, 1 or 2) is the order of the colatitudinal
+    derivative. The sums are returned in a dict with the same keys as arrays
+    of shape ccoef.shape[:-2] + q.shape + (lmax+1, ).
+
+    The Legendre functions are computed by PlmBar only once for each
+    distinct value of |cos(theta)| and q, as the functions of colatitudes
+    that are symmetric about the equator differ only by the signs (-1)**(l+m)
+    of their terms. The first derivatives are expressed with the Legendre
+    functions of orders m-1 and m+1, and the second derivatives with the
+    Legendre equation, so that for each order the sums over degree of all
+    terms, for all colatitudes and sets of coefficients, are computed at once
+    as a single matrix product.
+    """
+    lmax = ccoef.shape[-1] - 1
+    perm, offsets = _order_index(lmax)
+    cshape = ccoef.shape[:-2]
+    ccoef = ccoef.reshape((-1, lmax + 1, lmax + 1))
+    nc = len(ccoef)
+    q = _np.asarray(q, dtype=_np.float64)
+    qshape = q.shape
+    q = q.reshape((-1, qshape[-1]))
+    nq, nrows = q.shape
+    z = _np.cos(theta)
+    degrees = _np.arange(lmax + 1)
+
+    # Colatitudes are merged when they differ by less than a few units of
+    # the last place, as for the symmetric rows of a Driscoll and Healy grid.
+    scale = 2.**46
+    keys = _np.column_stack((_np.rint(_np.abs(z) * scale),
+                             _np.rint(q.T / abs(q).max() * scale)))
+    first, inverse = _np.unique(keys, axis=0, return_index=True,
+                                return_inverse=True)[1:]
+    inverse = inverse.ravel()
+    zu = _np.abs(z[first])
+    qu = q[:, first]
+    nu = len(zu)
+
+    # When q is the same for all colatitudes, the powers of q are included
+    # in the coefficients, otherwise in the Legendre functions.
+    fold = (qu == qu[:, :1]).all()
+    qpow = qu[..., _np.newaxis]**degrees
+    nqc = nq if fold else 1
+
+    # The sums with k = 2 are the combinations of sums with k = 0 and 1
+    # given by the Legendre equation.
+    base = []
+    for key, (factor, k) in terms.items():
+        factor = _np.ones(lmax + 1) if factor is None else factor
+        if k < 2:
+            base.append((factor, k))
+        else:
+            base += [(-degrees * (degrees + 1.) * factor, 0), (factor, 0),
+                     (factor, 1)]
+
+    # The coefficients of the sums, indexed by degree and by the order of
+    # the Legendre functions, with the terms of even and odd l+m separated
+    # and split into their real and imaginary parts.
+    alpha, beta = _derivative_factors(lmax)
+    coef = ccoef[:, _np.newaxis]
+    if fold:
+        coef = coef * qpow[:, 0, :, _np.newaxis]
+    parity = (degrees[:, _np.newaxis] + degrees) % 2
+    columns = []
+    for factor, k in base:
+        weight = coef * factor[:, _np.newaxis]
+        if k == 0:
+            columns.append(weight * (parity == 0))
+            columns.append(weight * (parity == 1))
+        else:
+            shifted = _np.zeros_like(weight)
+            shifted[..., :-1] = weight[..., 1:] * alpha[:, 1:]
+            columns += [shifted * (parity == 1), shifted * (parity == 0)]
+            shifted = _np.zeros_like(weight)
+            shifted[..., 1:] = weight[..., :-1] * beta[:, :-1]
+            columns += [shifted * (parity == 1), shifted * (parity == 0)]
+    columns = _np.stack(columns, axis=2)
+    columns = _np.stack((columns.real, columns.imag), axis=3)
+    ncols = columns[..., 0, 0].size
+    columns = columns.reshape((ncols, lmax + 1, lmax + 1))
+    weights = [_np.ascontiguousarray(columns[:, m:, m].T)
+               for m in range(lmax + 1)]
+
+    sums = _np.empty((lmax + 1, nq // nqc, nu, ncols))
+    block = max(1, _TABLE_SIZE // len(perm))
+    table = _np.empty((min(block, nu), len(perm)))
+    for start in range(0, nu, block):
+        ublk = slice(start, min(start + block, nu))
+        n = ublk.stop - start
+        for i in range(n):
+            table[i] = _shtools.PlmBar(lmax, zu[start + i])[perm]
+        for m in range(lmax + 1):
+            # The Legendre functions of order m, sorted by degree.
+            plm = table[:n, offsets[m]:offsets[m+1]]
+            for j in range(nq // nqc):
+                if fold:
+                    sums[m, j, ublk] = _np.dot(plm, weights[m])
+                else:
+                    sums[m, j, ublk] = _np.dot(plm * qpow[j, ublk, m:],
+                                               weights[m])
+
+    sums = sums.reshape((lmax + 1, nq // nqc, nu, nc, nqc, -1, 2, 2))
+    sums = sums[..., 0] + 1j * sums[..., 1]
+    sums = sums.transpose((1, 4, 3, 2, 0, 5, 6)).reshape(
+        (nq, nc, nu, lmax + 1, -1, 2))
+
+    # The sums of the colatitudes in the southern hemisphere follow from
+    # the symmetry Plm(-z) = (-1)**(l+m) Plm(z).
+    sign = _np.where(z < 0., -1., 1.)[:, _np.newaxis]
+    values = []
+    i = 0
+    for factor, k in base:
+        if k == 0:
+            value = sums[..., i, :]
+            i += 1
+        else:
+            value = _np.zeros_like(sums[..., i, :])
+            value[..., 1:, :] = sums[..., :-1, i, :]
+            value[..., :-1, :] -= sums[..., 1:, i + 1, :]
+            i += 2
+        value = value[:, :, inverse]
+        values.append((value[..., 0] + sign * value[..., 1]) * sign**k)
+
+    u = _np.sqrt((1. - z) * (1. + z))[:, _np.newaxis]
+    result = {}
+    i = 0
+    for key, (factor, k) in terms.items():
+        if k < 2:
+            value = values[i]
+            i += 1
+        else:
+            with _np.errstate(divide='ignore', invalid='ignore'):
+                value = values[i] + (degrees / u)**2 * values[i + 1] - \
+                    z[:, _np.newaxis] / u * values[i + 2]
+            value[..., u[:, 0] == 0., :] = 0.
+            i += 3
+        # The axes of value are (nq, nc, nrows, lmax+1).
+        result[key] = value.swapaxes(0, 1).reshape(cshape + qshape +
+                                                   (lmax + 1, ))
+
+    return result
+
+
+def _degree_factors(lmax, kr):
+    """
+    Return the degree factors (-1)**kr (l+1) (l+2) ... (l+kr) of the kr-th
+    radial derivative of (r0/r)**(l+1), or None when kr is 0.
+    """
+    if kr == 0:
+        return None
+    degrees = _np.arange(lmax + 1, dtype=_np.float64)
+    factors = _np.ones(lmax + 1)
+    for j in range(1, kr + 1):
+        factors *= -(degrees + j)
+    return factors
+
+
+def _fourier_to_grid(coef, nlon):
+    """
+    Return the grid of shape (..., nlon) that corresponds to the sums
+    coef_m exp(i m phi) over the orders m of the complex Fourier coefficients
+    coef of shape (..., lmax+1).
+    """
+    coef = coef.copy()
+    coef[..., 1:] *= 0.5
+    return _np.fft.irfft(coef, n=nlon, axis=-1) * nlon
+
+
+def _ellipsoid_radius(theta, a, f):
+    """
+    Return the radius of a flattened ellipsoid with semimajor axis a and
+    flattening f at the geocentric colatitudes theta.
+    """
+    b = 1. - f
+    return a * b / _np.sqrt((b * _np.sin(theta))**2 + _np.cos(theta)**2)
+
+
+def _chunk_size(lmax, nstack=1):
+    """
+    Return the number of latitudes that are synthesized at once for a stack
+    of nstack grids.
+    """
+    return max(2, 2**20 // ((lmax + 1) * nstack))
+
+
+def _row_blocks(theta, chunk):
+    """
+    Yield the indices of blocks of at most chunk latitudes, where the
+    latitudes that are symmetric about the equator are in the same block so
+    that their Legendre functions are computed only once.
+    """
+    order = _np.argsort(_np.abs(_np.cos(theta)), kind='mergesort')
+    for start in range(0, len(order), chunk):
+        yield order[start:start + chunk]
+
+
+def _stack_radii(theta, a, f, name='a'):
+    """
+    Return the semimajor axes a as an array with at most one dimension, and
+    the radii of the corresponding ellipsoids at the colatitudes theta, with
+    shape a.shape + (ntheta, ).
+    """
+    a = _np.asarray(a, dtype=_np.float64)
+    if a.ndim > 1:
+        raise ValueError('{:s} must be a float or a one-dimensional '
+                         .format(name) +
+                         'array. Input shape is {:s}.'.format(repr(a.shape)))
+    return a, _ellipsoid_radius(theta, a[..., _np.newaxis], f)
+
+
+def _grav_terms(names, lmax):
+    """
+    Return the set of gravity components that must be computed for the
+    requested components, and the corresponding Legendre sums.
+    """
+    needed = set(names)
+    if 'total' in needed:
+        needed.update(('rad', 'theta', 'phi'))
+    terms = {}
+    if 'rad' in needed:
+        terms[(1, 0)] = (_degree_factors(lmax, 1), 0)
+    if 'theta' in needed:
+        terms[(0, 1)] = (None, 1)
+    if 'phi' in needed or 'pot' in needed:
+        terms[(0, 0)] = (None, 0)
+    return needed, terms
+
+
+def _grav_fields(sums, synth, needed, gm, omega, r, theta):
+    """
+    Return a dict of the gravity components, where synth evaluates a set of
+    Fourier coefficients, r are the radii and theta the colatitudes. The
+    total field does not include the normal gravity.
+    """
+    z = _np.cos(theta)[:, _np.newaxis]
+    u = _np.sqrt((1. - z) * (1. + z))
+    im = 1j * _np.arange(sums[next(iter(sums))].shape[-1])
+    pole = u[:, 0] == 0.
+
+    fields = {}
+    if 'rad' in needed:
+        fields['rad'] = synth(sums[(1, 0)]) * gm / r**2 + r * (u * omega)**2
+    if 'theta' in needed:
+        fields['theta'] = synth(sums[(0, 1)]) * gm / r**2 + \
+            u * z * r * omega**2
+        fields['theta'][..., pole, :] = 0.
+    if 'phi' in needed:
+        with _np.errstate(divide='ignore', invalid='ignore'):
+            fields['phi'] = synth(im * sums[(0, 0)] / u) * gm / r**2
+        fields['phi'][..., pole, :] = 0.
+    if 'pot' in needed:
+        fields['pot'] = synth(sums[(0, 0)]) * gm / r + \
+            0.5 * (r * u * omega)**2
+    if 'total' in needed:
+        fields['total'] = _np.sqrt(fields['rad']**2 + fields['theta']**2 +
+                                   fields['phi']**2)
+    return fields
+
+
+def _gravgrad_terms(names, lmax):
+    """
+    Return the Legendre sums required by the requested components of the
+    gravity tensor.
+    """
+    required = {'vxx': ((1, 0), (0, 2)),
+                'vyy': ((1, 0), (0, 1), (0, 0)),
+                'vzz': ((2, 0), ),
+                'vxy': ((0, 1), (0, 0)),
+                'vxz': ((0, 1), (1, 1)),
+                'vyz': ((0, 0), (1, 0))}
+    terms = {}
+    for name in names:
+        for kr, kt in required[name]:
+            terms[(kr, kt)] = (_degree_factors(lmax, kr), kt)
+    return terms
+
+
+def _gravgrad_fields(sums, synth, names, gm, r, theta):
+    """
+    Return a dict of the requested components of the gravity tensor, where
+    synth evaluates a set of Fourier coefficients, r are the radii and theta
+    the colatitudes.
+    """
+    z = _np.cos(theta)[:, _np.newaxis]
+    u = _np.sqrt((1. - z) * (1. + z))
+    m = _np.arange(sums[next(iter(sums))].shape[-1])
+    pole = u[:, 0] == 0.
+
+    fields = {}
+    with _np.errstate(divide='ignore', invalid='ignore'):
+        for name in names:
+            if name == 'vxx':
+                coef = sums[(1, 0)] + sums[(0, 2)]
+            elif name == 'vyy':
+                coef = sums[(1, 0)] + z / u * sums[(0, 1)] - \
+                    m**2 / u**2 * sums[(0, 0)]
+            elif name == 'vzz':
+                coef = sums[(2, 0)]
+            elif name == 'vxy':
+                coef = 1j * m / u * (sums[(0, 1)] - z / u * sums[(0, 0)])
+            elif name == 'vxz':
+                coef = sums[(0, 1)] - sums[(1, 1)]
+            else:
+                coef = 1j * m / u * (sums[(0, 0)] - sums[(1, 0)])
+            coef[..., pole, :] = 0.
+            fields[name] = synth(coef) * gm / r**3
+    return fields
+
+
+def _mag_fields(sums, synth, needed, r0, r, theta):
+    """
+    Return a dict of the magnetic field components, where synth evaluates a
+    set of Fourier coefficients, r are the radii and theta the colatitudes.
+    """
+    z = _np.cos(theta)[:, _np.newaxis]
+    u = _np.sqrt((1. - z) * (1. + z))
+    im = 1j * _np.arange(sums[next(iter(sums))].shape[-1])
+    pole = u[:, 0] == 0.
+    q2 = (r0 / r)**2
+
+    fields = {}
+    if 'rad' in needed:
+        fields['rad'] = -synth(sums[(1, 0)]) * q2
+    if 'theta' in needed:
+        fields['theta'] = -synth(sums[(0, 1)]) * q2
+        fields['theta'][..., pole, :] = 0.
+    if 'phi' in needed:
+        with _np.errstate(divide='ignore', invalid='ignore'):
+            fields['phi'] = -synth(im * sums[(0, 0)] / u) * q2
+        fields['phi'][..., pole, :] = 0.
+    if 'pot' in needed:
+        fields['pot'] = synth(sums[(0, 0)]) * r0**2 / r
+    if 'total' in needed:
+        fields['total'] = _np.sqrt(fields['rad']**2 + fields['theta']**2 +
+                                   fields['phi']**2)
+    return fields
+
+
+def _mag_coefficients(ccoef):
+    """
+    Convert the complex Schmidt semi-normalized magnetic coefficients to
+    4pi normalization, without the degree-0 term.
+    """
+    degrees = _np.arange(ccoef.shape[0])
+    ccoef = ccoef / _np.sqrt(2. * degrees + 1.)[:, _np.newaxis]
+    ccoef[0, 0] = 0.
+    return ccoef
+
+
+def _complex_coefficients(cilm, lmax_calc):
+    """
+    Return the complex array C_lm - i S_lm of the coefficients cilm, zero
+    padded or truncated to degree lmax_calc.
+    """
+    cilm = _np.asarray(cilm, dtype=_np.float64)
+    if cilm.ndim != 3 or cilm.shape[0] != 2:
+        raise ValueError('cilm must be dimensioned as (2, lmaxin+1, ' +
+                         'lmaxin+1). Input shape is {:s}.'
+                         .format(repr(cilm.shape)))
+    if lmax_calc is None:
+        lmax_calc = cilm.shape[1] - 1
+
+    lmaxin = min(lmax_calc, cilm.shape[1] - 1)
+    ccoef = _np.zeros((lmax_calc + 1, lmax_calc + 1), dtype=_np.complex128)
+    ccoef[:lmaxin+1, :lmaxin+1] = cilm[0, :lmaxin+1, :lmaxin+1] - \
+        1j * cilm[1, :lmaxin+1, :lmaxin+1]
+    return ccoef
+
+
+def _grid_setup(cilm, lmax, lmax_calc, sampling):
+    """
+    Return the complex coefficients and the dimensions and colatitudes of a
+    Driscoll and Healy grid.
+    """
+    if lmax is None:
+        lmax = _np.shape(cilm)[1] - 1
+    if lmax_calc is None:
+        lmax_calc = lmax
+    elif lmax_calc > lmax:
+        raise ValueError('lmax_calc must be less than or equal to lmax. ' +
+                         'lmax_calc = {:d} and lmax = {:d}.'
+                         .format(lmax_calc, lmax))
+    if sampling not in (1, 2):
+        raise ValueError('sampling must be either 1 or 2. ' +
+                         'Input value was {:s}.'.format(repr(sampling)))
+
+    ccoef = _complex_coefficients(cilm, lmax_calc)
+    nlat = 2 * (lmax + 1)
+    theta = _np.pi * _np.arange(nlat) / nlat
+    return ccoef, (nlat, sampling * nlat), theta
+
+
+def _output_grids(components, valid, out, shape, dtype=_np.float64):
+    """
+    Return the list of requested component names, the list of output arrays
+    and whether a single array is returned. Arrays that are allocated have
+    the data type dtype.
+    """
+    single = isinstance(components, str)
+    names = [components] if single else list(components)
+    for name in names:
+        if name not in valid:
+            raise ValueError('components must be one or more of ' +
+                             '{:s}. Input value was {:s}.'
+                             .format(repr(valid), repr(name)))
+    if len(set(names)) != len(names):
+        raise ValueError('components must not contain duplicates. ' +
+                         'Input value was {:s}.'.format(repr(components)))
+
+    if out is None:
+        out = [None] * len(names)
+    elif single:
+        out = [out]
+    elif len(out) != len(names):
+        raise ValueError('out must contain one array for each component. ' +
+                         'len(out) = {:d} and len(components) = {:d}.'
+                         .format(len(out), len(names)))
+
+    grids = []
+    for name, grid in zip(names, out):
+        if grid is None:
+            grid = _np.empty(shape, dtype=dtype)
+        elif grid.shape != shape:
+            raise ValueError('The output array for {:s} must be '
+                             .format(repr(name)) +
+                             'dimensioned as {:s}. Input shape is {:s}.'
+                             .format(repr(shape), repr(grid.shape)))
+        grids.append(grid)
+
+    return names, grids, single
+
+
+def _fortran_grids(routine, fortran_names, names, grids, a, *args,
+                   **kwargs):
+    """
+    Compute the grids of all components with the Fortran routine for each
+    semimajor axis in a, and store the components names in the arrays grids.
+    """
+    for index, ak in _np.ndenumerate(a):
+        fields = dict(zip(fortran_names, routine(*args, a=ak, **kwargs)))
+        for name, grid in zip(names, grids):
+            grid[index] = fields[name]
+
+
+def _points_setup(lat, lon, r, degrees):
+    """
+    Return the flattened colatitudes, longitudes in radians and radii of a
+    set of points, and the broadcast shape of lat, lon and r.
+    """
+    lat, lon, r = _np.broadcast_arrays(_np.asarray(lat, dtype=_np.float64),
+                                       _np.asarray(lon, dtype=_np.float64),
+                                       _np.asarray(r, dtype=_np.float64))
+    if degrees:
+        lat = _np.radians(lat)
+        lon = _np.radians(lon)
+    return (_np.pi / 2. - lat).ravel(), lon.ravel(), r.ravel(), lat.shape
+
+
+def _map_points(evaluate, theta, phi, r, names, outputs, lmax, chunksize,
+                nthreads):
+    """
+    Evaluate the components names at the points (theta, phi, r) and store
+    them in the arrays outputs. The points are sorted by |cos(theta)| and are
+    evaluated in chunks, which are distributed over a pool of threads.
+    """
+    if chunksize is None:
+        chunksize = max(1, 2**20 // (lmax + 1))
+    order = _np.argsort(_np.abs(_np.cos(theta)), kind='mergesort')
+    chunks = [order[i:i+chunksize] for i in range(0, len(order), chunksize)]
+
+    def work(index):
+        fields = evaluate(theta[index], phi[index], r[index])
+        for name, output in zip(names, outputs):
+            output.flat[index] = fields[name][:, 0]
+
+    if nthreads == 1 or len(chunks) < 2:
+        for index in chunks:
+            work(index)
+    else:
+        pool = _ThreadPool(nthreads)
+        try:
+            pool.map(work, chunks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+
+def _point_sums(ccoef, r0, theta, phi, r, terms):
+    """
+    Return the Legendre sums for a chunk of points, computing the Legendre
+    functions only once for each distinct colatitude, and a function that
+    sums Fourier coefficients over the orders at the longitudes phi.
+    """
+    sums = _legendre_sums(ccoef, theta, r0 / r, terms)
+    eim = _np.exp(1j * _np.outer(phi, _np.arange(ccoef.shape[0])))
+
+    def synth(coef):
+        return _np.einsum('ij,ij->i', coef, eim).real[:, _np.newaxis]
+
+    return sums, synth
+
+
+def _geoid_terms(lmax, order):
+    """
+    Return the terms of _legendre_sums for the potential and its radial
+    derivatives up to the order of the Taylor series of the geoid.
+    """
+    if order not in (1, 2, 3):
+        raise ValueError('order must be 1, 2 or 3. ' +
+                         'Input value was {:s}.'.format(repr(order)))
+    terms = {}
+    for kr in range(order + 1):
+        terms[(kr, 0)] = (_degree_factors(lmax, kr), 0)
+    return terms
+
+
+def _geoid_reference(gm, omega, potref, r, theta, order):
+    """
+    Return the factors and the rotational terms of the potential and of its
+    radial derivatives divided by n! at the radii r and colatitudes theta,
+    which depend only on the reference parameters.
+    """
+    u = _np.sin(theta)[:, _np.newaxis]
+    scale = [gm / r, gm / r**2, gm / (2. * r**3), gm / (6. * r**4)]
+    rot = [0.5 * (omega * r * u)**2 - potref, r * (omega * u)**2,
+           0.5 * (omega * u)**2, 0.]
+    return scale[:order+1], rot[:order+1]
+
+
+def _geoid_heights(sums, synth, reference, order):
+    """
+    Return the roots of the Taylor series of the potential about the
+    reference radius that are equal to the reference potential.
+    """
+    scale, rot = reference
+    grids = [synth(sums[(kr, 0)]) * scale[kr] + rot[kr]
+             for kr in range(order + 1)]
+    if order == 1:
+        grida, gridb = grids
+        return -grida / gridb
+    elif order == 2:
+        grida, gridb, gridc = grids
+        return (-gridb - _np.sqrt(gridb**2 - 4. * gridc * grida)) / \
+            (2. * gridc)
+    else:
+        grida, gridb, gridc, gridd = grids
+        pp = gridb / gridd - (gridc / gridd)**2 / 3.
+        qq = grida / gridd + 2. * (gridc / gridd)**3 / 27. - \
+            9. * gridc * gridb / gridd**2 / 27.
+        uu = _np.cbrt(qq / 2. + _np.sqrt(qq**2 / 4. + pp**3 / 27.))
+        return pp / 3. / uu - uu - gridc / gridd / 3.
+
+
+def make_grav_grid_dh(cilm, gm, r0, a=None, f=0., lmax=None, sampling=2,
+                      lmax_calc=None, omega=0., normal_gravity=1,
+                      components=_GRAV_COMPONENTS, out=None):
+    """
+    Create 2D cylindrical maps on a flattened and rotating ellipsoid of
+    selected components of the gravity field, the gravity disturbance, and
+    the gravitational potential, optionally for several ellipsoids at once.
+
+    Usage
+    -----
+    rad, theta, phi, total, pot = make_grav_grid_dh(cilm, gm, r0, [a, f,
+                                                    lmax, sampling, lmax_calc,
+                                                    omega, normal_gravity])
+    grids = make_grav_grid_dh(cilm, gm, r0, components=('rad', 'pot'),
+                              [out, ...])
+    grid = make_grav_grid_dh(cilm, gm, r0, components='rad', [out, ...])
+
+    Returns
+    -------
+    grids : tuple of ndarrays, shape (nlat, nlon) or (na, nlat, nlon)
+        The grids of the requested components, in the order given by
+        components: 'rad' the radial component of the gravity vector,
+        'theta' the theta component, 'phi' the phi component, 'total' the
+        magnitude of the gravity vector (minus the normal gravity when
+        normal_gravity is 1), and 'pot' the gravitational potential. When a
+        is an array, the grids of each ellipsoid are stacked along the first
+        axis. When components is a string, a single array is returned.
+
+    Parameters
+    ----------
+    cilm : ndarray, shape (2, lmaxin+1, lmaxin+1)
+        The 4pi-normalized gravitational potential spherical harmonic
+        coefficients.
+    gm : float
+        The gravitational constant multiplied by the mass of the planet.
+    r0 : float
+        The reference radius of the spherical harmonic coefficients.
+    a : float or ndarray, shape (na), optional, default = r0
+        The semimajor axis of the flattened ellipsoid on which the field is
+        computed, or an array of semimajor axes, such as r0 plus a list of
+        satellite altitudes.
+    f : float, optional, default = 0
+        The flattening of the ellipsoids.
+    lmax : int, optional, default = lmaxin
+        The maximum spherical harmonic degree, which determines the number
+        of samples of the output grids, nlat = 2*lmax+2 and nlon =
+        sampling*nlat.
+    sampling : int, optional, default = 2
+        1 for equally sampled grids (nlon = nlat) and 2 for equally spaced
+        grids (nlon = 2*nlat).
+    lmax_calc : int, optional, default = lmax
+        The maximum spherical harmonic degree used in evaluating the
+        functions.
+    omega : float, optional, default = 0
+        The angular rotation rate of the planet.
+    normal_gravity : int, optional, default = 1
+        If 1, the normal gravity is removed from the total gravitational
+        acceleration, yielding the gravity disturbance.
+    components : str or sequence of str, optional
+        default = ('rad', 'theta', 'phi', 'total', 'pot')
+        The components to compute.
+    out : ndarray or sequence of ndarrays, optional, default = None
+        Arrays with the shape of the output grids, such as memory-mapped
+        arrays, in which the requested components are stored, in the order
+        given by components. Entries that are None are allocated.
+
+    Description
+    -----------
+    This function computes the same grids as MakeGravGridDH, but only for
+    the requested components. The Legendre functions and their derivatives
+    are computed only when a requested component depends on them, a Fourier
+    transform is performed only for each requested component, and no memory
+    is allocated for the components that are not requested. The grids are
+    synthesized in blocks of latitudes and written directly to the output
+    arrays, so that the temporary memory does not scale with the size of
+    the grids. When the requested components depend on all three components
+    of the gravity vector, such as the total gravity, the grids are instead
+    computed by MakeGravGridDH for each ellipsoid, as this routine evaluates
+    all of the components in a single pass over the Legendre functions.
+
+    The gravitational potential is given by
+
+        V = GM/r Sum_{l=0}^lmax (r0/r)^l Sum_{m=-l}^l C_{lm} Y_{lm},
+
+    and the gravity vector is its gradient. The radial component is
+    positive upwards, and the theta and phi components are undefined at the
+    north pole and are set to zero. The field is computed on a flattened
+    ellipsoid with semimajor axis a and flattening f, using geocentric
+    coordinates, and the effects of rotation are included when omega is
+    non-zero.
+
+    When a is an array, the Legendre functions and their derivatives are
+    computed only once, and the additional cost for each ellipsoid is the
+    scaling of the coefficients by the powers of r0/r and the Fourier
+    transforms of the requested components.
+    """
+    ccoef, shape, theta = _grid_setup(cilm, lmax, lmax_calc, sampling)
+    a, r = _stack_radii(theta, r0 if a is None else a, f)
+    names, grids, single = _output_grids(components, _GRAV_COMPONENTS, out,
+                                         a.shape + shape)
+    lmax_calc = ccoef.shape[0] - 1
+
+    needed, terms = _grav_terms(names, lmax_calc)
+    if needed.issuperset(('rad', 'theta', 'phi')):
+        _fortran_grids(_shtools.MakeGravGridDH, _GRAV_COMPONENTS, names,
+                       grids, a, cilm, gm, r0, f=f, lmax=shape[0] // 2 - 1,
+                       sampling=sampling, lmax_calc=lmax_calc, omega=omega,
+                       normal_gravity=normal_gravity)
+        return grids[0] if single else tuple(grids)
+
+    if 'total' in needed and normal_gravity == 1:
+        lat = 90. - _np.degrees(theta)
+        normal = _np.array([_normal_gravity(lat, gm, omega, ak,
+                                            ak * (1. - f))
+                            for ak in a.ravel()])
+        normal = normal.reshape(r.shape)
+
+    def synth(coef):
+        return _fourier_to_grid(coef, shape[1])
+
+    chunk = _chunk_size(lmax_calc, a.size)
+    for rows in _row_blocks(theta, chunk):
+        sums = _legendre_sums(ccoef, theta[rows], r0 / r[..., rows], terms)
+        fields = _grav_fields(sums, synth, needed, gm, omega,
+                              r[..., rows, _np.newaxis], theta[rows])
+        if 'total' in needed and normal_gravity == 1:
+            fields['total'] -= normal[..., rows, _np.newaxis]
+
+        for name, grid in zip(names, grids):
+            grid[..., rows, :] = fields[name]
+
+    if single:
+        return grids[0]
+    else:
+        return tuple(grids)
+
+
+def make_grav_grad_grid_dh(cilm, gm, r0, a=None, f=0., lmax=None,
+                           sampling=2, lmax_calc=None,
+                           components=_GRAVGRAD_COMPONENTS, out=None):
+    """
+    Calculate selected components of the gravity "gradient" tensor on a
+    flattened ellipsoid, optionally for several ellipsoids at once.
+
+    Usage
+    -----
+    vxx, vyy, vzz, vxy, vxz, vyz = make_grav_grad_grid_dh(cilm, gm, r0, [a,
+                                                          f, lmax, sampling,
+                                                          lmax_calc])
+    grids = make_grav_grad_grid_dh(cilm, gm, r0, components=('vzz', 'vxz'),
+                                   [out, ...])
+    grid = make_grav_grad_grid_dh(cilm, gm, r0, components='vzz', [out, ...])
+
+    Returns
+    -------
+    grids : tuple of ndarrays, shape (nlat, nlon) or (na, nlat, nlon)
+        The grids of the requested components of the gravity tensor, in
+        units of 1/s, in the order given by components. When a is an array,
+        the grids of each ellipsoid are stacked along the first axis. When
+        components is a string, a single array is returned.
+
+    Parameters
+    ----------
+    cilm : ndarray, shape (2, lmaxin+1, lmaxin+1)
+        The 4pi-normalized gravitational potential spherical harmonic
+        coefficients.
+    gm : float
+        The gravitational constant multiplied by the mass of the planet.
+    r0 : float
+        The reference radius of the spherical harmonic coefficients.
+    a : float or ndarray, shape (na), optional, default = r0
+        The semimajor axis of the flattened ellipsoid on which the field is
+        computed, or an array of semimajor axes, such as r0 plus a list of
+        satellite altitudes.
+    f : float, optional, default = 0
+        The flattening of the ellipsoids.
+    lmax : int, optional, default = lmaxin
+        The maximum spherical harmonic degree, which determines the number
+        of samples of the output grids, nlat = 2*lmax+2 and nlon =
+        sampling*nlat.
+    sampling : int, optional, default = 2
+        1 for equally sampled grids (nlon = nlat) and 2 for equally spaced
+        grids (nlon = 2*nlat).
+    lmax_calc : int, optional, default = lmax
+        The maximum spherical harmonic degree used in evaluating the
+        functions.
+    components : str or sequence of str, optional
+        default = ('vxx', 'vyy', 'vzz', 'vxy', 'vxz', 'vyz')
+        The components to compute.
+    out : ndarray or sequence of ndarrays, optional, default = None
+        Arrays with the shape of the output grids, such as memory-mapped
+        arrays, in which the requested components are stored, in the order
+        given by components. Entries that are None are allocated.
+
+    Description
+    -----------
+    This function computes the same grids as MakeGravGradGridDH, but only
+    for the requested components. The Legendre functions and their first
+    and second derivatives are computed only when a requested component
+    depends on them, and a Fourier transform is performed only for each
+    requested component. For example, Vzz requires only the Legendre
+    functions and a single Fourier transform per latitude. The grids are
+    synthesized in blocks of latitudes and written directly to the output
+    arrays.
+
+    The components are calculated according to eq. 1 in Petrovskaya and
+    Vershkov (2006), in a local north-oriented reference frame with the x
+    axis pointing north, the y axis pointing east and the z axis pointing
+    upwards. As in MakeGravGradGridDH, the components at the north pole are
+    set to zero.
+
+    When a is an array, the Legendre functions and their derivatives are
+    computed only once, and the additional cost for each ellipsoid is the
+    scaling of the coefficients by the powers of r0/r and the Fourier
+    transforms of the requested components.
+    """
+    ccoef, shape, theta = _grid_setup(cilm, lmax, lmax_calc, sampling)
+    a, r = _stack_radii(theta, r0 if a is None else a, f)
+    names, grids, single = _output_grids(components, _GRAVGRAD_COMPONENTS,
+                                         out, a.shape + shape)
+    lmax_calc = ccoef.shape[0] - 1
+
+    terms = _gravgrad_terms(names, lmax_calc)
+
+    def synth(coef):
+        return _fourier_to_grid(coef, shape[1])
+
+    chunk = _chunk_size(lmax_calc, a.size)
+    for rows in _row_blocks(theta, chunk):
+        sums = _legendre_sums(ccoef, theta[rows], r0 / r[..., rows], terms)
+        fields = _gravgrad_fields(sums, synth, names, gm,
+                                  r[..., rows, _np.newaxis], theta[rows])
+        for name, grid in zip(names, grids):
+            grid[..., rows, :] = fields[name]
+
+    if single:
+        return grids[0]
+    else:
+        return tuple(grids)
+
+
+def make_mag_grid_dh(cilm, r0, a=None, f=0., lmax=None, sampling=2,
+                     lmax_calc=None, components=_MAG_COMPONENTS, out=None):
+    """
+    Create 2D cylindrical maps on a flattened ellipsoid of selected
+    components of the magnetic field, the magnitude of the magnetic field,
+    and the magnetic potential, optionally for several ellipsoids at once.
+
+    Usage
+    -----
+    rad, theta, phi, total = make_mag_grid_dh(cilm, r0, [a, f, lmax,
+                                              sampling, lmax_calc])
+    grids = make_mag_grid_dh(cilm, r0, components=('rad', 'pot'),
+                             [out, ...])
+    grid = make_mag_grid_dh(cilm, r0, components='rad', [out, ...])
+
+    Returns
+    -------
+    grids : tuple of ndarrays, shape (nlat, nlon) or (na, nlat, nlon)
+        The grids of the requested components, in the order given by
+        components: 'rad' the radial component of the magnetic field,
+        'theta' the theta component, 'phi' the phi component, 'total' the
+        magnitude of the magnetic field, and 'pot' the magnetic potential.
+        When a is an array, the grids of each ellipsoid are stacked along
+        the first axis. When components is a string, a single array is
+        returned.
+
+    Parameters
+    ----------
+    cilm : ndarray, shape (2, lmaxin+1, lmaxin+1)
+        The Schmidt semi-normalized magnetic potential spherical harmonic
+        coefficients, in nT.
+    r0 : float
+        The reference radius of the spherical harmonic coefficients.
+    a : float or ndarray, shape (na), optional, default = r0
+        The semimajor axis of the flattened ellipsoid on which the field is
+        computed, or an array of semimajor axes, such as r0 plus a list of
+        satellite altitudes.
+    f : float, optional, default = 0
+        The flattening of the ellipsoids.
+    lmax : int, optional, default = lmaxin
+        The maximum spherical harmonic degree, which determines the number
+        of samples of the output grids, nlat = 2*lmax+2 and nlon =
+        sampling*nlat.
+    sampling : int, optional, default = 2
+        1 for equally sampled grids (nlon = nlat) and 2 for equally spaced
+        grids (nlon = 2*nlat).
+    lmax_calc : int, optional, default = lmax
+        The maximum spherical harmonic degree used in evaluating the
+        functions.
+    components : str or sequence of str, optional
+        default = ('rad', 'theta', 'phi', 'total')
+        The components to compute.
+    out : ndarray or sequence of ndarrays, optional, default = None
+        Arrays with the shape of the output grids, such as memory-mapped
+        arrays, in which the requested components are stored, in the order
+        given by components. Entries that are None are allocated.
+
+    Description
+    -----------
+    This function computes the same grids as MakeMagGridDH, but only for
+    the requested components, and for one or more ellipsoids. When the
+    requested components depend on all three components of the magnetic
+    field and do not include the potential, the grids are computed by
+    MakeMagGridDH for each ellipsoid. The magnetic potential is given by
+
+        V = r0 Sum_{l=1}^lmax (r0/r)^{l+1} Sum_{m=-l}^l g_{lm} Y_{lm},
+
+    and the magnetic field is B = - Grad V. The degree-0 term of cilm is
+    ignored. The theta and phi components are undefined at the north pole
+    and are set to zero.
+
+    When a is an array, the Legendre functions and their derivatives are
+    computed only once, and the additional cost for each ellipsoid is the
+    scaling of the coefficients by the powers of r0/r and the Fourier
+    transforms of the requested components.
+
+    The Schmidt semi-normalized coefficients are converted internally to
+    4pi-normalized coefficients by multiplying them by 1/sqrt(2l+1).
+    """
+    ccoef, shape, theta = _grid_setup(cilm, lmax, lmax_calc, sampling)
+    a, r = _stack_radii(theta, r0 if a is None else a, f)
+    names, grids, single = _output_grids(components,
+                                         _MAG_COMPONENTS + ('pot', ), out,
+                                         a.shape + shape)
+    lmax_calc = ccoef.shape[0] - 1
+    ccoef = _mag_coefficients(ccoef)
+    needed, terms = _grav_terms(names, lmax_calc)
+    if needed.issuperset(('rad', 'theta', 'phi')) and 'pot' not in needed:
+        _fortran_grids(_shtools.MakeMagGridDH, _MAG_COMPONENTS, names, grids,
+                       a, cilm, r0, f=f, lmax=shape[0] // 2 - 1,
+                       sampling=sampling, lmax_calc=lmax_calc)
+        return grids[0] if single else tuple(grids)
+
+    def synth(coef):
+        return _fourier_to_grid(coef, shape[1])
+
+    chunk = _chunk_size(lmax_calc, a.size)
+    for rows in _row_blocks(theta, chunk):
+        sums = _legendre_sums(ccoef, theta[rows], r0 / r[..., rows], terms)
+        fields = _mag_fields(sums, synth, needed, r0,
+                             r[..., rows, _np.newaxis], theta[rows])
+        for name, grid in zip(names, grids):
+            grid[..., rows, :] = fields[name]
+
+    if single:
+        return grids[0]
+    else:
+        return tuple(grids)
+
+
+def _time_weights(times, epochs, nknots, sv):
+    """
+    Return the indices and weights of the two coefficient sets whose linear
+    combination gives the coefficients at each epoch. The coefficient sets
+    are the knots, followed by the secular variation when sv is True.
+    """
+    times = _np.atleast_1d(_np.asarray(times, dtype=_np.float64))
+    if times.shape != (nknots, ):
+        raise ValueError('times must contain one epoch for each set of ' +
+                         'coefficients. len(times) = {:d} and nknots = {:d}.'
+                         .format(times.size, nknots))
+    if nknots > 1 and (_np.diff(times) <= 0.).any():
+        raise ValueError('times must be strictly increasing. ' +
+                         'Input value was {:s}.'.format(repr(times)))
+
+    epochs = _np.atleast_1d(_np.asarray(epochs, dtype=_np.float64))
+    if epochs.ndim != 1:
+        raise ValueError('epochs must be a float or a one-dimensional ' +
+                         'array. Input shape is {:s}.'
+                         .format(repr(epochs.shape)))
+
+    index = _np.zeros((len(epochs), 2), dtype=_np.int64)
+    weights = _np.zeros((len(epochs), 2))
+    if nknots > 1:
+        k = _np.clip(_np.searchsorted(times, epochs, side='right') - 1, 0,
+                     nknots - 2)
+        alpha = (epochs - times[k]) / (times[k+1] - times[k])
+        index[:, 0] = k
+        index[:, 1] = k + 1
+        weights[:, 0] = 1. - alpha
+        weights[:, 1] = alpha
+    else:
+        weights[:, 0] = 1.
+
+    if sv:
+        after = epochs > times[-1]
+        index[after, 0] = nknots - 1
+        index[after, 1] = nknots
+        weights[after, 0] = 1.
+        weights[after, 1] = epochs[after] - times[-1]
+
+    return index, weights
+
+
+def make_mag_grid_series_dh(cilm, times, epochs, r0, sv=None, a=None, f=0.,
+                            lmax=None, sampling=2, lmax_calc=None,
+                            components=_MAG_COMPONENTS, out=None):
+    """
+    Create 2D cylindrical maps on a flattened ellipsoid of selected
+    components of a time-varying magnetic field for a series of epochs.
+
+    Usage
+    -----
+    rad, theta, phi, total = make_mag_grid_series_dh(cilm, times, epochs, r0,
+                                                     [sv, a, f, lmax,
+                                                     sampling, lmax_calc])
+    grids = make_mag_grid_series_dh(cilm, times, epochs, r0,
+                                    components=('rad', 'pot'), [out, ...])
+    grid = make_mag_grid_series_dh(cilm, times, epochs, r0,
+                                   components='rad', [out, ...])
+
+    Returns
+    -------
+    grids : tuple of ndarrays, shape (nepochs, nlat, nlon)
+        The grids of the requested components for each epoch, in the order
+        given by components: 'rad' the radial component of the magnetic
+        field, 'theta' the theta component, 'phi' the phi component,
+        'total' the magnitude of the magnetic field, and 'pot' the magnetic
+        potential. When components is a string, a single array is returned.
+
+    Parameters
+    ----------
+    cilm : ndarray, shape (nknots, 2, lmaxin+1, lmaxin+1)
+        The Schmidt semi-normalized magnetic potential spherical harmonic
+        coefficients, in nT, at each of the epochs times. A single set of
+        coefficients of shape (2, lmaxin+1, lmaxin+1) can be given together
+        with sv.
+    times : float or ndarray, shape (nknots)
+        The strictly increasing epochs of the coefficients cilm.
+    epochs : float or ndarray, shape (nepochs)
+        The epochs at which the field is computed, in the same units as
+        times.
+    r0 : float
+        The reference radius of the spherical harmonic coefficients.
+    sv : ndarray, shape (2, lmaxin+1, lmaxin+1), optional, default = None
+        The Schmidt semi-normalized secular variation coefficients, in nT
+        per unit of time, that are used for epochs after the last knot.
+    a : float, optional, default = r0
+        The semimajor axis of the flattened ellipsoid on which the field is
+        computed.
+    f : float, optional, default = 0
+        The flattening of the ellipsoid.
+    lmax : int, optional, default = lmaxin
+        The maximum spherical harmonic degree, which determines the number
+        of samples of the output grids, nlat = 2*lmax+2 and nlon =
+        sampling*nlat.
+    sampling : int, optional, default = 2
+        1 for equally sampled grids (nlon = nlat) and 2 for equally spaced
+        grids (nlon = 2*nlat).
+    lmax_calc : int, optional, default = lmax
+        The maximum spherical harmonic degree used in evaluating the
+        functions.
+    components : str or sequence of str, optional
+        default = ('rad', 'theta', 'phi', 'total')
+        The components to compute.
+    out : ndarray or sequence of ndarrays, optional, default = None
+        Arrays of shape (nepochs, nlat, nlon), such as memory-mapped arrays,
+        in which the requested components are stored, in the order given by
+        components. Entries that are None are allocated.
+
+    Description
+    -----------
+    The coefficients are linear functions of time between the knots, as in
+    the IGRF and other core field models. Epochs before the first knot and
+    after the last knot are extrapolated using the first and last segments,
+    or, for epochs after the last knot, the secular variation sv when this
+    is specified. A single set of coefficients with sv corresponds to a
+    model given by its main field at the epoch times and its secular
+    variation.
+
+    As the field is a linear function of the coefficients, the grids of
+    each epoch are linear combinations of those of two sets of
+    coefficients. The Legendre functions and the sums over degree are
+    computed only once for each set of coefficients, and the cost of each
+    epoch is the linear combination of the sums and the Fourier transforms
+    of the requested components. The grids are computed in bands of
+    latitude for all epochs, so that the output arrays can be memory-mapped
+    arrays that are larger than the available memory.
+
+    The field components are computed with the same conventions as
+    make_mag_grid_dh.
+    """
+    cilm = _np.asarray(cilm, dtype=_np.float64)
+    if cilm.ndim == 3:
+        cilm = cilm[_np.newaxis]
+    if cilm.ndim != 4 or cilm.shape[1] != 2:
+        raise ValueError('cilm must be dimensioned as (nknots, 2, ' +
+                         'lmaxin+1, lmaxin+1). Input shape is {:s}.'
+                         .format(repr(cilm.shape)))
+
+    nknots = cilm.shape[0]
+    index, weights = _time_weights(times, epochs, nknots, sv is not None)
+    basis = list(cilm) if sv is None else list(cilm) + [sv]
+
+    ccoef, shape, theta = _grid_setup(cilm[0], lmax, lmax_calc, sampling)
+    lmax_calc = ccoef.shape[0] - 1
+    ccoef = _np.array([_mag_coefficients(_complex_coefficients(coeffs,
+                                                               lmax_calc))
+                       for coeffs in basis])
+    a = r0 if a is None else float(a)
+    r = _ellipsoid_radius(theta, a, f)
+    names, grids, single = _output_grids(components,
+                                         _MAG_COMPONENTS + ('pot', ), out,
+                                         (len(index), ) + shape)
+    needed, terms = _grav_terms(names, lmax_calc)
+
+    def synth(coef):
+        return _fourier_to_grid(coef, shape[1])
+
+    chunk = _chunk_size(lmax_calc, max(len(index), len(basis)))
+    for rows in _row_blocks(theta, chunk):
+        sums = _legendre_sums(ccoef, theta[rows], r0 / r[rows], terms)
+        for key in sums:
+            sums[key] = sums[key][index[:, 0]] * \
+                weights[:, 0, _np.newaxis, _np.newaxis] + \
+                sums[key][index[:, 1]] * \
+                weights[:, 1, _np.newaxis, _np.newaxis]
+        fields = _mag_fields(sums, synth, needed, r0,
+                             r[rows, _np.newaxis], theta[rows])
+        for name, grid in zip(names, grids):
+            grid[:, rows, :] = fields[name]
+
+    if single:
+        return grids[0]
+    else:
+        return tuple(grids)
+
+
+def make_geoid_grid_dh(cilm, r0pot, gm, potref, lmax=None, omega=0., r=None,
+                       sampling=2, order=2, lmax_calc=None, a=None, f=0.,
+                       out=None):
+    """
+    Create a global map of the geoid, optionally for several reference radii
+    at once.
+
+    Usage
+    -----
+    geoid = make_geoid_grid_dh(cilm, r0pot, gm, potref, [lmax, omega, r,
+                               sampling, order, lmax_calc, a, f, out])
+
+    Returns
+    -------
+    geoid : ndarray, shape (nlat, nlon) or (nr, nlat, nlon)
+        A global grid of the height to the potential potref above a sphere
+        of radius r, or above a flattened ellipsoid when a and f are
+        specified. When r is an array, the grids of each reference radius
+        are stacked along the first axis.
+
+    Parameters
+    ----------
+    cilm : ndarray, shape (2, lmaxin+1, lmaxin+1)
+        The 4pi-normalized gravitational potential spherical harmonic
+        coefficients. The degree-0 term is set to 1.
+    r0pot : float
+        The reference radius of the spherical harmonic coefficients.
+    gm : float
+        The gravitational constant multiplied by the mass of the planet.
+    potref : float
+        The value of the potential on the chosen geoid, in m2 / s2.
+    lmax : int, optional, default = lmaxin
+        The maximum spherical harmonic degree, which determines the number
+        of samples of the output grids, nlat = 2*lmax+2 and nlon =
+        sampling*nlat.
+    omega : float, optional, default = 0
+        The angular rotation rate of the planet.
+    r : float or ndarray, shape (nr), optional, default = r0pot
+        The radius of the reference sphere that the Taylor expansion of the
+        potential is performed on, or an array of radii.
+    sampling : int, optional, default = 2
+        1 for equally sampled grids (nlon = nlat) and 2 for equally spaced
+        grids (nlon = 2*nlat).
+    order : int, optional, default = 2
+        The order of the Taylor series expansion of the potential about the
+        reference radius r: 1, 2 or 3.
+    lmax_calc : int, optional, default = lmax
+        The maximum spherical harmonic degree used in evaluating the
+        functions.
+    a : float, optional, default = r
+        The semimajor axis of the flattened ellipsoid that the output grid
+        is referenced to. The default is to reference the geoid to the
+        sphere of radius r.
+    f : float, optional, default = 0
+        The flattening of the reference ellipsoid.
+    out : ndarray, optional, default = None
+        An array with the shape of the output grid, such as a memory-mapped
+        array, in which the geoid is stored.
+
+    Description
+    -----------
+    This function computes the same grid as MakeGeoidGridDH, for one or
+    more reference radii r. The potential and its first, second and third
+    radial derivatives at the radius r are computed from a single pass of
+    the Legendre recursions, instead of from separate spherical harmonic
+    transforms of filtered coefficients, and only the derivatives required
+    by the requested order of the Taylor series are computed. When r is an
+    array, the Legendre functions are shared by all radii, and the
+    additional cost for each radius is the scaling of the coefficients by
+    the powers of r0pot/r and the Fourier transforms.
+
+    The geoid height is the root of the Taylor series expansion of the
+    potential (including the rotational potential) about r that is equal
+    to potref. When a is specified, the difference between r and the
+    radius of the ellipsoid is added to the geoid.
+    """
+    ccoef, shape, theta = _grid_setup(cilm, lmax, lmax_calc, sampling)
+    r, _ = _stack_radii(theta, r0pot if r is None else r, 0., name='r')
+    names, grids, single = _output_grids('geoid', ('geoid', ), out,
+                                         r.shape + shape)
+    lmax_calc = ccoef.shape[0] - 1
+    ccoef[0, 0] = 1.
+    terms = _geoid_terms(lmax_calc, order)
+
+    def synth(coef):
+        return _fourier_to_grid(coef, shape[1])
+
+    if a is not None:
+        r_ex = _ellipsoid_radius(theta, a, f)
+    rr = r[..., _np.newaxis, _np.newaxis]
+    chunk = _chunk_size(lmax_calc, r.size)
+    for rows in _row_blocks(theta, chunk):
+        q = _np.broadcast_to(r0pot / r[..., _np.newaxis],
+                             r.shape + (len(theta[rows]), ))
+        sums = _legendre_sums(ccoef, theta[rows], q, terms)
+        reference = _geoid_reference(gm, omega, potref, rr, theta[rows],
+                                     order)
+        geoid = _geoid_heights(sums, synth, reference, order)
+
+        if a is not None:
+            geoid += rr - r_ex[rows, _np.newaxis]
+
+        grids[0][..., rows, :] = geoid
+
+    return grids[0]
+
+
+class GeoidEngine(object):
+    """
+    Geoid synthesis for batches of gravitational potential models that share
+    the same reference parameters.
+
+    An engine is initialized with the reference parameters and the grid
+    dimensions, which are those of make_geoid_grid_dh:
+
+        engine = GeoidEngine(r0pot, gm, potref, lmax, [omega, r, sampling,
+                             order, lmax_calc, a, f, dtype])
+
+    The geoid of one or more models is then computed by
+
+        geoid = engine.compute(cilm, [out])
+
+    where cilm is an array of 4pi-normalized potential coefficients of
+    shape (2, lmaxin+1, lmaxin+1), or a stack of shape (..., 2, lmaxin+1,
+    lmaxin+1), and geoid has the shape (nlat, nlon) or (..., nlat, nlon).
+
+    The grid colatitudes, the degree factors of the radial derivatives of
+    the potential, the factors gm/r**(n+1)/n! and the rotational terms of
+    the Taylor series of the potential about r, and the difference between
+    r and the radius of the reference ellipsoid are computed once when the
+    engine is initialized. For a stack of models, the Legendre functions
+    are computed once for the entire stack, and the additional cost of each
+    model is the sums over degree and the Fourier transforms.
+
+    Each class instance defines the following class attributes:
+
+    lmax      : The maximum spherical harmonic degree of the grids.
+    lmax_calc : The maximum spherical harmonic degree used in the synthesis.
+    shape     : The dimensions (nlat, nlon) of the grids.
+    order     : The order of the Taylor series of the potential.
+    dtype     : The data type of the output grids that are allocated.
+
+    Each class instance provides the following methods:
+
+    compute() : Compute the geoid of one or more sets of coefficients.
+    """
+
+    def __init__(self, r0pot, gm, potref, lmax, omega=0., r=None,
+                 sampling=2, order=2, lmax_calc=None, a=None, f=0.,
+                 dtype=_np.float64):
+        """
+        Initialize the engine.
+
+        Parameters
+        ----------
+        r0pot : float
+            The reference radius of the spherical harmonic coefficients.
+        gm : float
+            The gravitational constant multiplied by the mass of the planet.
+        potref : float
+            The value of the potential on the chosen geoid, in m2 / s2.
+        lmax : int
+            The maximum spherical harmonic degree, which determines the
+            number of samples of the output grids, nlat = 2*lmax+2 and nlon =
+            sampling*nlat.
+        omega : float, optional, default = 0
+            The angular rotation rate of the planet.
+        r : float, optional, default = r0pot
+            The radius of the reference sphere that the Taylor expansion of
+            the potential is performed on.
+        sampling : int, optional, default = 2
+            1 for equally sampled grids (nlon = nlat) and 2 for equally
+            spaced grids (nlon = 2*nlat).
+        order : int, optional, default = 2
+            The order of the Taylor series expansion of the potential about
+            the reference radius r: 1, 2 or 3.
+        lmax_calc : int, optional, default = lmax
+            The maximum spherical harmonic degree used in evaluating the
+            functions.
+        a : float, optional, default = r
+            The semimajor axis of the flattened ellipsoid that the output
+            grids are referenced to.
+        f : float, optional, default = 0
+            The flattening of the reference ellipsoid.
+        dtype : data-type, optional, default = numpy.float64
+            The data type of the output grids, such as numpy.float32. The
+            calculations are always performed in double precision.
+        """
+        if lmax_calc is None:
+            lmax_calc = lmax
+        elif lmax_calc > lmax:
+            raise ValueError('lmax_calc must be less than or equal to ' +
+                             'lmax. lmax_calc = {:d} and lmax = {:d}.'
+                             .format(lmax_calc, lmax))
+        if sampling not in (1, 2):
+            raise ValueError('sampling must be either 1 or 2. ' +
+                             'Input value was {:s}.'.format(repr(sampling)))
+
+        self.lmax = lmax
+        self.lmax_calc = lmax_calc
+        self.order = order
+        self.dtype = _np.dtype(dtype)
+        nlat = 2 * (lmax + 1)
+        self.shape = (nlat, sampling * nlat)
+
+        r = r0pot if r is None else float(r)
+        self._theta = _np.pi * _np.arange(nlat) / nlat
+        self._q = r0pot / r
+        self._terms = _geoid_terms(lmax_calc, order)
+        scale, rot = _geoid_reference(gm, omega, potref, r, self._theta,
+                                      order)
+        self._scale = scale
+        self._rot = [_np.broadcast_to(term, (nlat, 1)) for term in rot]
+        if a is None:
+            self._offset = None
+        else:
+            self._offset = r - _ellipsoid_radius(self._theta, a,
+                                                 f)[:, _np.newaxis]
+
+    def _coefficients(self, cilm):
+        """
+        Return the complex coefficients C_lm - i S_lm of a stack of models
+        as an array of shape (nmodels, lmax_calc+1, lmax_calc+1), with the
+        degree-0 term set to 1.
+        """
+        cilm = _np.asarray(cilm, dtype=_np.float64)
+        if cilm.ndim < 3 or cilm.shape[-3] != 2 or \
+                cilm.shape[-2] != cilm.shape[-1]:
+            raise ValueError('cilm must be dimensioned as (..., 2, ' +
+                             'lmaxin+1, lmaxin+1). Input shape is {:s}.'
+                             .format(repr(cilm.shape)))
+        cilm = cilm.reshape((-1, ) + cilm.shape[-3:])
+        lmaxin = min(self.lmax_calc, cilm.shape[-1] - 1)
+        ccoef = _np.zeros((len(cilm), self.lmax_calc + 1,
+                           self.lmax_calc + 1), dtype=_np.complex128)
+        ccoef[:, :lmaxin+1, :lmaxin+1] = \
+            cilm[:, 0, :lmaxin+1, :lmaxin+1] - \
+            1j * cilm[:, 1, :lmaxin+1, :lmaxin+1]
+        ccoef[:, 0, 0] = 1.
+        return ccoef
+
+    def compute(self, cilm, out=None):
+        """
+        Compute the geoid of one or more sets of potential coefficients.
+
+        Usage
+        -----
+        geoid = engine.compute(cilm, [out])
+
+        Returns
+        -------
+        geoid : ndarray, shape (nlat, nlon) or (..., nlat, nlon)
+            The height to the potential potref above the sphere of radius r,
+            or above the reference ellipsoid when a was specified, for each
+            set of coefficients.
+
+        Parameters
+        ----------
+        cilm : ndarray, shape (2, lmaxin+1, lmaxin+1) or (..., 2, lmaxin+1,
+                lmaxin+1)
+            The 4pi-normalized gravitational potential spherical harmonic
+            coefficients of one model, or a stack of models. The degree-0
+            term is set to 1.
+        out : ndarray, optional, default = None
+            An array with the shape of the output grids, such as a
+            single-precision or memory-mapped array, in which the geoid is
+            stored.
+        """
+        batch = _np.shape(cilm)[:-3]
+        ccoef = self._coefficients(cilm)
+        names, grids, single = _output_grids('geoid', ('geoid', ), out,
+                                             batch + self.shape,
+                                             dtype=self.dtype)
+
+        def synth(coef):
+            return _fourier_to_grid(coef, self.shape[1])
+
+        chunk = _chunk_size(self.lmax_calc, len(ccoef))
+        for rows in _row_blocks(self._theta, chunk):
+            q = _np.full(len(rows), self._q)
+            sums = _legendre_sums(ccoef, self._theta[rows], q, self._terms)
+            reference = (self._scale, [term[rows] for term in self._rot])
+            geoid = _geoid_heights(sums, synth, reference, self.order)
+            if self._offset is not None:
+                geoid += self._offset[rows]
+            grids[0][..., rows, :] = geoid.reshape(batch + geoid.shape[1:])
+
+        return grids[0]
+
+
+def make_grav_points(cilm, gm, r0, lat, lon, r, lmax_calc=None, omega=0.,
+                     degrees=True, components=_GRAV_COMPONENTS, out=None,
+                     chunksize=None, nthreads=None):
+    """
+    Evaluate selected components of the gravity field and the gravitational
+    potential at a set of points.
+
+    Usage
+    -----
+    rad, theta, phi, total, pot = make_grav_points(cilm, gm, r0, lat, lon, r,
+                                                   [lmax_calc, omega,
+                                                   degrees, chunksize,
+                                                   nthreads])
+    values = make_grav_points(cilm, gm, r0, lat, lon, r,
+                              components=('rad', 'pot'), [out, ...])
+    value = make_grav_points(cilm, gm, r0, lat, lon, r, components='rad',
+                             [out, ...])
+
+    Returns
+    -------
+    values : tuple of ndarrays
+        The values of the requested components at the points, in the order
+        given by components: 'rad' the radial component of the gravity
+        vector, 'theta' the theta component, 'phi' the phi component,
+        'total' the magnitude of the gravity vector, and 'pot' the
+        gravitational potential. The arrays have the broadcast shape of lat,
+        lon and r. When components is a string, a single array is returned.
+
+    Parameters
+    ----------
+    cilm : ndarray, shape (2, lmaxin+1, lmaxin+1)
+        The 4pi-normalized gravitational potential spherical harmonic
+        coefficients.
+    gm : float
+        The gravitational constant multiplied by the mass of the planet.
+    r0 : float
+        The reference radius of the spherical harmonic coefficients.
+    lat, lon, r : float or ndarray
+        The geocentric latitude, longitude and radius of the points.
+    lmax_calc : int, optional, default = lmaxin
+        The maximum spherical harmonic degree used in evaluating the
+        functions.
+    omega : float, optional, default = 0
+        The angular rotation rate of the planet.
+    degrees : bool, optional, default = True
+        True if lat and lon are in degrees, False if in radians.
+    components : str or sequence of str, optional
+        default = ('rad', 'theta', 'phi', 'total', 'pot')
+        The components to compute.
+    out : ndarray or sequence of ndarrays, optional, default = None
+        Arrays with the broadcast shape of lat, lon and r in which the
+        requested components are stored, in the order given by components.
+        Entries that are None are allocated.
+    chunksize : int, optional, default = None
+        The number of points evaluated at once. By default, this is chosen
+        such that the temporary arrays of each chunk contain about 2**20
+        elements.
+    nthreads : int, optional, default = None
+        The number of threads used to evaluate the chunks. If None, the
+        number of CPUs is used. If 1, the chunks are evaluated in the calling
+        thread.
+
+    Description
+    -----------
+    The field is evaluated with the same conventions as make_grav_grid_dh:
+    the radial component is positive upwards, the theta and phi components
+    are undefined at the poles and are set to zero, and the effects of
+    rotation are included when omega is non-zero. The normal gravity is not
+    removed from the total field.
+
+    The points are sorted by latitude and evaluated in chunks. Within each
+    chunk, the Legendre functions and their derivatives are computed only
+    once for each distinct latitude, and the sums over order are computed
+    directly at the longitude of each point. The chunks are evaluated by a
+    pool of threads, as the array operations release the GIL.
+    """
+    ccoef = _complex_coefficients(cilm, lmax_calc)
+    theta, phi, r, shape = _points_setup(lat, lon, r, degrees)
+    names, outputs, single = _output_grids(components, _GRAV_COMPONENTS,
+                                           out, shape)
+    needed, terms = _grav_terms(names, ccoef.shape[0] - 1)
+
+    def evaluate(theta, phi, r):
+        sums, synth = _point_sums(ccoef, r0, theta, phi, r, terms)
+        return _grav_fields(sums, synth, needed, gm, omega,
+                            r[:, _np.newaxis], theta)
+
+    _map_points(evaluate, theta, phi, r, names, outputs, ccoef.shape[0] - 1,
+                chunksize, nthreads)
+
+    if single:
+        return outputs[0]
+    else:
+        return tuple(outputs)
+
+
+def make_grav_grad_points(cilm, gm, r0, lat, lon, r, lmax_calc=None,
+                          degrees=True, components=_GRAVGRAD_COMPONENTS,
+                          out=None, chunksize=None, nthreads=None):
+    """
+    Evaluate selected components of the gravity "gradient" tensor at a set
+    of points.
+
+    Usage
+    -----
+    vxx, vyy, vzz, vxy, vxz, vyz = make_grav_grad_points(cilm, gm, r0, lat,
+                                                         lon, r, [lmax_calc,
+                                                         degrees, chunksize,
+                                                         nthreads])
+    values = make_grav_grad_points(cilm, gm, r0, lat, lon, r,
+                                   components=('vzz', 'vxz'), [out, ...])
+    value = make_grav_grad_points(cilm, gm, r0, lat, lon, r,
+                                  components='vzz', [out, ...])
+
+    Returns
+    -------
+    values : tuple of ndarrays
+        The values of the requested components of the gravity tensor at the
+        points, in units of 1/s, in the order given by components. The
+        arrays have the broadcast shape of lat, lon and r. When components
+        is a string, a single array is returned.
+
+    Parameters
+    ----------
+    cilm : ndarray, shape (2, lmaxin+1, lmaxin+1)
+        The 4pi-normalized gravitational potential spherical harmonic
+        coefficients.
+    gm : float
+        The gravitational constant multiplied by the mass of the planet.
+    r0 : float
+        The reference radius of the spherical harmonic coefficients.
+    lat, lon, r : float or ndarray
+        The geocentric latitude, longitude and radius of the points.
+    lmax_calc : int, optional, default = lmaxin
+        The maximum spherical harmonic degree used in evaluating the
+        functions.
+    degrees : bool, optional, default = True
+        True if lat and lon are in degrees, False if in radians.
+    components : str or sequence of str, optional
+        default = ('vxx', 'vyy', 'vzz', 'vxy', 'vxz', 'vyz')
+        The components to compute.
+    out : ndarray or sequence of ndarrays, optional, default = None
+        Arrays with the broadcast shape of lat, lon and r in which the
+        requested components are stored, in the order given by components.
+        Entries that are None are allocated.
+    chunksize : int, optional, default = None
+        The number of points evaluated at once. By default, this is chosen
+        such that the temporary arrays of each chunk contain about 2**20
+        elements.
+    nthreads : int, optional, default = None
+        The number of threads used to evaluate the chunks. If None, the
+        number of CPUs is used. If 1, the chunks are evaluated in the calling
+        thread.
+
+    Description
+    -----------
+    The components are computed with the same conventions as
+    make_grav_grad_grid_dh, in a local north-oriented reference frame, and
+    are set to zero at the poles. The points are sorted by latitude and
+    evaluated in chunks by a pool of threads. Within each chunk, the
+    Legendre functions and their derivatives are computed only once for
+    each distinct latitude.
+    """
+    ccoef = _complex_coefficients(cilm, lmax_calc)
+    theta, phi, r, shape = _points_setup(lat, lon, r, degrees)
+    names, outputs, single = _output_grids(components, _GRAVGRAD_COMPONENTS,
+                                           out, shape)
+    terms = _gravgrad_terms(names, ccoef.shape[0] - 1)
+
+    def evaluate(theta, phi, r):
+        sums, synth = _point_sums(ccoef, r0, theta, phi, r, terms)
+        return _gravgrad_fields(sums, synth, names, gm, r[:, _np.newaxis],
+                                theta)
+
+    _map_points(evaluate, theta, phi, r, names, outputs, ccoef.shape[0] - 1,
+                chunksize, nthreads)
+
+    if single:
+        return outputs[0]
+    else:
+        return tuple(outputs)
+
+
+def make_mag_points(cilm, r0, lat, lon, r, lmax_calc=None, degrees=True,
+                    components=_MAG_COMPONENTS, out=None, chunksize=None,
+                    nthreads=None):
+    """
+    Evaluate selected components of the magnetic field and the magnetic
+    potential at a set of points.
+
+    Usage
+    -----
+    rad, theta, phi, total = make_mag_points(cilm, r0, lat, lon, r,
+                                             [lmax_calc, degrees, chunksize,
+                                             nthreads])
+    values = make_mag_points(cilm, r0, lat, lon, r,
+                             components=('rad', 'pot'), [out, ...])
+    value = make_mag_points(cilm, r0, lat, lon, r, components='rad',
+                            [out, ...])
+
+    Returns
+    -------
+    values : tuple of ndarrays
+        The values of the requested components at the points, in the order
+        given by components: 'rad' the radial component of the magnetic
+        field, 'theta' the theta component, 'phi' the phi component, 'total'
+        the magnitude of the magnetic field, and 'pot' the magnetic
+        potential. The arrays have the broadcast shape of lat, lon and r.
+        When components is a string, a single array is returned.
+
+    Parameters
+    ----------
+    cilm : ndarray, shape (2, lmaxin+1, lmaxin+1)
+        The Schmidt semi-normalized magnetic potential spherical harmonic
+        coefficients, in nT.
+    r0 : float
+        The reference radius of the spherical harmonic coefficients.
+    lat, lon, r : float or ndarray
+        The geocentric latitude, longitude and radius of the points.
+    lmax_calc : int, optional, default = lmaxin
+        The maximum spherical harmonic degree used in evaluating the
+        functions.
+    degrees : bool, optional, default = True
+        True if lat and lon are in degrees, False if in radians.
+    components : str or sequence of str, optional
+        default = ('rad', 'theta', 'phi', 'total')
+        The components to compute.
+    out : ndarray or sequence of ndarrays, optional, default = None
+        Arrays with the broadcast shape of lat, lon and r in which the
+        requested components are stored, in the order given by components.
+        Entries that are None are allocated.
+    chunksize : int, optional, default = None
+        The number of points evaluated at once. By default, this is chosen
+        such that the temporary arrays of each chunk contain about 2**20
+        elements.
+    nthreads : int, optional, default = None
+        The number of threads used to evaluate the chunks. If None, the
+        number of CPUs is used. If 1, the chunks are evaluated in the calling
+        thread.
+
+    Description
+    -----------
+    The field is evaluated with the same conventions as make_mag_grid_dh,
+    and the theta and phi components are set to zero at the poles. The
+    points are sorted by latitude and evaluated in chunks by a pool of
+    threads. Within each chunk, the Legendre functions and their
+    derivatives are computed only once for each distinct latitude.
+    """
+    ccoef = _mag_coefficients(_complex_coefficients(cilm, lmax_calc))
+    theta, phi, r, shape = _points_setup(lat, lon, r, degrees)
+    names, outputs, single = _output_grids(components,
+                                           _MAG_COMPONENTS + ('pot', ), out,
+                                           shape)
+    needed, terms = _grav_terms(names, ccoef.shape[0] - 1)
+
+    def evaluate(theta, phi, r):
+        sums, synth = _point_sums(ccoef, r0, theta, phi, r, terms)
+        return _mag_fields(sums, synth, needed, r0, r[:, _np.newaxis], theta)
+
+    _map_points(evaluate, theta, phi, r, names, outputs, ccoef.shape[0] - 1,
+                chunksize, nthreads)
+
+    if single:
+        return outputs[0]
+    else:
+        return tuple(outputs)
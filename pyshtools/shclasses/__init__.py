@@ -23,6 +23,8 @@ pyshtools class structure:
         SHWindowCap
         SHWindowMask
 
+    SHExpression
+
 For more information, see the documentation for the top level classes.
 """
 
@@ -43,3 +45,5 @@ from .shcoeffsgrid import GLQComplexGrid
 from .shwindow import SHWindow
 from .shwindow import SHWindowCap
 from .shwindow import SHWindowMask
+
+from .shexpression import SHExpression
@@ -12,12 +12,225 @@ import matplotlib as _mpl
 import matplotlib.pyplot as _plt
 import copy as _copy
 import warnings as _warnings
+from collections import OrderedDict as _OrderedDict
 from scipy.special import factorial as _factorial
 
 from .. import shtools as _shtools
 from ..spectralanalysis import spectrum as _spectrum
 from ..shio import convert as _convert
 from ..shio import shread as _shread
+from ..shio import real_to_complex as _real_to_complex
+from ..shio import complex_to_real as _complex_to_real
+from ..gravmag import synthesis as _synthesis
+from ..gravmag import continuation as _continuation
+from .shexpression import SHExpression as _SHExpression
+
+
+# =============================================================================
+# =========    INDEX TABLES AND PACKED STORAGE UTILITIES    ===================
+# =============================================================================
+
+# Process-wide cache of the index tables, keyed by (lmax, kind). The tables
+# are read-only and are shared by all class instances.
+_index_cache = _OrderedDict()
+_index_cache_size = 16
+
+
+def _index_table(lmax, kind):
+    """
+    Return a cached, read-only index table for coefficients of maximum
+    degree lmax.
+
+    kind : 'mask', a boolean array of dimension (2, lmax+1, lmax+1) that is
+           True for the permissible values of degree l and order m.
+         : 'packed', a tuple (i, l, m) of arrays of dimension (lmax+1)**2
+           that map each element of a packed vector to its location in the
+           3-D array.
+
+    The packed vector uses the ordering of SHCilmToVector, where the
+    coefficient cilm[i, l, m] is stored at the index l**2 + i*l + m. All
+    coefficients of a given degree l are thus contiguous and occupy the
+    elements l**2 to (l+1)**2-1.
+    """
+    key = (lmax, kind)
+    table = _index_cache.get(key)
+    if table is not None:
+        return table
+
+    nl = lmax + 1
+    if kind == 'mask':
+        degrees = _np.arange(nl)
+        table = _np.empty((2, nl, nl), dtype=bool)
+        table[:] = degrees[None, :] <= degrees[:, None]
+        table[1, :, 0] = False
+        tables = (table, )
+    elif kind == 'packed':
+        ls = _np.repeat(_np.arange(nl, dtype=_np.int32),
+                        2 * _np.arange(nl) + 1)
+        k = _np.arange(nl**2, dtype=_np.int32) - ls**2
+        i = (k > ls).astype(_np.int8)
+        ms = k - i * ls
+        table = (i, ls, ms)
+        tables = table
+    else:
+        raise ValueError("kind must be 'mask' or 'packed'. " +
+                         'Input value was {:s}.'.format(repr(kind)))
+
+    for array in tables:
+        array.setflags(write=False)
+
+    _index_cache[key] = table
+    while len(_index_cache) > _index_cache_size:
+        _index_cache.popitem(last=False)
+    return table
+
+
+def _packed_indices(lmax):
+    """
+    Return the (i, l, m) indices of the elements of a packed coefficient
+    vector.
+    """
+    return _index_table(lmax, 'packed')
+
+
+def _lmax_packed(vector):
+    """Return the maximum degree of a packed coefficient vector."""
+    n = vector.shape[-1]
+    lmax = int(round(_np.sqrt(n))) - 1
+    if (lmax + 1)**2 != n:
+        raise ValueError('The length of a packed coefficient vector must ' +
+                         'be (lmax+1)**2. Input length is {:d}.'.format(n))
+    return lmax
+
+
+def _pack(cilm):
+    """
+    Pack an array of coefficients of shape (..., 2, lmax+1, lmax+1) into an
+    array of shape (..., (lmax+1)**2).
+    """
+    i, ls, ms = _packed_indices(cilm.shape[-2] - 1)
+    return cilm[..., i, ls, ms]
+
+
+def _unpack(vector):
+    """
+    Unpack an array of coefficients of shape (..., (lmax+1)**2) into an
+    array of shape (..., 2, lmax+1, lmax+1).
+    """
+    lmax = _lmax_packed(vector)
+    i, ls, ms = _packed_indices(lmax)
+    cilm = _np.zeros(vector.shape[:-1] + (2, lmax+1, lmax+1),
+                     dtype=vector.dtype)
+    cilm[..., i, ls, ms] = vector
+    return cilm
+
+
+# =============================================================================
+# =========    RANDOM COEFFICIENT UTILITIES    ================================
+# =============================================================================
+
+def _random_generator(seed, stream):
+    """
+    Return the random number generator used by SHCoeffs.from_random().
+
+    If seed and stream are None, numpy's global random state is used.
+    Otherwise, a numpy.random.Generator is returned. If stream is specified,
+    the generator is initialized with the child stream of seed that is
+    returned by numpy.random.SeedSequence(seed).spawn(), which guarantees that
+    the streams of different workers are statistically independent.
+    """
+    if isinstance(seed, _np.random.Generator):
+        if stream is not None:
+            raise ValueError('stream can not be specified when seed is a ' +
+                             'numpy.random.Generator.')
+        return seed
+    if seed is None and stream is None:
+        return _np.random
+    if stream is None:
+        return _np.random.default_rng(seed)
+
+    if isinstance(seed, _np.random.SeedSequence):
+        sequence = _np.random.SeedSequence(
+            seed.entropy, spawn_key=seed.spawn_key + (stream, ),
+            pool_size=seed.pool_size)
+    else:
+        sequence = _np.random.SeedSequence(seed, spawn_key=(stream, ))
+    return _np.random.default_rng(sequence)
+
+
+def _random_packed(rng, size, power, nl, lmax, kind, normalization,
+                   exact_power, legacy=False):
+    """
+    Return an array of shape (size, (lmax+1)**2) of random packed
+    coefficients with an expected power spectrum power[0:nl]. If legacy is
+    True, a single realization is drawn from numpy's global random state in
+    the order of previous versions.
+    """
+    i, ls, ms = _packed_indices(nl - 1)
+    ls = ls.astype(_np.float64)
+    ms = ms.astype(_np.float64)
+    starts = _np.arange(nl)**2
+    coeffs = _np.zeros((size, (lmax + 1)**2),
+                       dtype=complex if kind == 'complex' else _np.float64)
+
+    # Create coefficients with unit variance, which returns an expected
+    # total power per degree of (2l+1). Complex coefficients need to be
+    # divided by sqrt 2 as there are two terms for each coeff.
+    values = coeffs[:, :nl**2]
+    if legacy:
+        # Draw the coefficients of each degree in turn from numpy's global
+        # random state, as in previous versions, so that seeding it with
+        # numpy.random.seed() returns the same realization.
+        cilm = _np.empty((2, nl, nl), dtype=coeffs.dtype)
+        for l in range(nl):
+            if kind == 'real':
+                cilm[:, l, :l+1] = _np.random.normal(size=(2, l+1))
+            else:
+                cilm[:, l, :l+1] = _np.random.normal(size=(2, l+1)) + \
+                    1j * _np.random.normal(size=(2, l+1))
+        values[:] = _pack(cilm)
+    elif kind == 'real':
+        values[:] = rng.standard_normal(size=(size, nl**2))
+    else:
+        values.real = rng.standard_normal(size=(size, nl**2))
+        values.imag = rng.standard_normal(size=(size, nl**2))
+    if kind == 'complex':
+        values /= _np.sqrt(2.)
+
+    if normalization == 'unnorm':
+        # ratio of the unnormalized to the 4pi normalized power
+        conv = _factorial(ls+ms) / (2. * ls + 1.) / _factorial(ls-ms)
+        if kind == 'real':
+            conv[ms > 0] /= 2.
+
+    if exact_power:
+        # power per l of each realization, computed as in spectrum()
+        power_per_l = (values * values.conjugate()).real
+        if normalization == 'unnorm':
+            power_per_l *= conv
+        power_per_l = _np.add.reduceat(power_per_l, starts, axis=1)
+        if normalization == 'schmidt':
+            power_per_l /= (2. * _np.arange(nl) + 1.)
+        elif normalization == 'ortho':
+            power_per_l /= (4. * _np.pi)
+        values *= _np.repeat(_np.sqrt(power[0:nl] / power_per_l),
+                             2 * _np.arange(nl) + 1, axis=1)
+    else:
+        if normalization == '4pi':
+            factor = _np.sqrt(power[0:nl] / (2. * _np.arange(nl) + 1.))
+        elif normalization == 'ortho':
+            factor = _np.sqrt(4. * _np.pi * power[0:nl] /
+                              (2. * _np.arange(nl) + 1.))
+        else:
+            factor = _np.sqrt(power[0:nl])
+        factor = _np.repeat(factor, 2 * _np.arange(nl) + 1)
+        if normalization == 'unnorm':
+            factor *= _np.sqrt(_factorial(ls-ms) / _factorial(ls+ms))
+            if kind == 'real':
+                factor[ms > 0] *= _np.sqrt(2.)
+        values *= factor
+
+    return coeffs
 
 
 # =============================================================================
@@ -48,6 +261,16 @@ class SHCoeffs(object):
     csphase       : 1 (default), exlcude the Condon-Shortley phase factor.
                   : -1, include the Condon-Shortley phase factor.
 
+    The coefficients can be stored in one of two forms, which is specified by
+    the optional parameter storage of the constructor methods:
+
+    storage       : 'full' (default), a 3-D array of dimension
+                    (2, lmax+1, lmax+1).
+                  : 'packed', a 1-D array of dimension (lmax+1)**2 that
+                    contains only the permissible values of degree l and
+                    order m, ordered according to the convention in
+                    SHCilmToVector.
+
     See the documentation for each constructor method for further options.
 
     Once initialized, each class instance defines the following class
@@ -60,9 +283,12 @@ class SHCoeffs(object):
                     'schmidt', or 'unnorm'.
     csphase       : Defines whether the Condon-Shortley phase is used (1)
                     or not (-1).
-    mask          : A boolean mask that is True for the permissible values of
-                    degree l and order m.
+    mask          : A read-only boolean mask that is True for the permissible
+                    values of degree l and order m. The mask is shared by all
+                    class instances with the same lmax.
     kind          : The coefficient data type: either 'complex' or 'real'.
+    storage       : The storage form of the coefficients: either 'full' or
+                    'packed'.
 
     Each class instance provides the following methods:
 
@@ -81,10 +307,19 @@ class SHCoeffs(object):
                             normalization convention.
     pad()                 : Return a new class instance that is zero padded or
                             truncated to a different lmax.
+    continue_to()         : Return a new class instance of potential
+                            coefficients that are upward or downward
+                            continued to a different reference radius.
     expand()              : Evaluate the coefficients either on a spherical
                             grid and return an SHGrid class instance, or for
                             a list of latitude and longitude coordinates.
+    expand_field()        : Evaluate the gravity field, the gravity tensor or
+                            the magnetic field of potential coefficients at a
+                            set of points.
     copy()                : Return a copy of the class instance.
+    to_vector()           : Return the coefficients as a packed 1-D array.
+    lazy()                : Return a deferred expression of the coefficients
+                            for fused element-wise arithmetic.
     plot_spectrum()       : Plot the  spectrum as a function of spherical
                             harmonic degree.
     plot_spectrum2d()     : Plot the 2D spectrum of all spherical harmonic
@@ -103,14 +338,15 @@ class SHCoeffs(object):
 
     # ---- Factory methods ----
     @classmethod
-    def from_zeros(self, lmax, kind='real', normalization='4pi', csphase=1):
+    def from_zeros(self, lmax, kind='real', normalization='4pi', csphase=1,
+                   storage='full'):
         """
         Initialize class with spherical harmonic coefficients set to zero from
         degree 0 to lmax.
 
         Usage
         -----
-        x = SHCoeffs.from_zeros(lmax, [normalization, csphase])
+        x = SHCoeffs.from_zeros(lmax, [normalization, csphase, storage])
 
         Returns
         -------
@@ -129,6 +365,9 @@ class SHCoeffs(object):
             or -1 to include it.
         kind : str, optional, default = 'real'
             'real' or 'complex' spherical harmonic coefficients.
+        storage : str, optional, default = 'full'
+            'full' to store the coefficients in a 3-D array, or 'packed' to
+            store the coefficients in a 1-D packed array.
         """
         if kind.lower() not in ('real', 'complex'):
             raise ValueError(
@@ -137,6 +376,13 @@ class SHCoeffs(object):
                 .format(repr(kind))
                 )
 
+        if storage.lower() not in ('full', 'packed'):
+            raise ValueError(
+                "storage must be 'full' or 'packed'. " +
+                "Input value was {:s}."
+                .format(repr(storage))
+                )
+
         if normalization.lower() not in ('4pi', 'ortho', 'schmidt', 'unnorm'):
             raise ValueError(
                 "The normalization must be '4pi', 'ortho', 'schmidt', " +
@@ -159,26 +405,32 @@ class SHCoeffs(object):
             lmax = 85
 
         nl = lmax + 1
+        if storage.lower() == 'packed':
+            shape = (nl**2, )
+        else:
+            shape = (2, nl, nl)
         if kind.lower() == 'real':
-            coeffs = _np.zeros((2, nl, nl))
+            coeffs = _np.zeros(shape)
         else:
-            coeffs = _np.zeros((2, nl, nl), dtype=complex)
+            coeffs = _np.zeros(shape, dtype=complex)
 
         for cls in self.__subclasses__():
             if cls.istype(kind):
                 return cls(coeffs, normalization=normalization.lower(),
-                           csphase=csphase)
+                           csphase=csphase, copy=False,
+                           storage=storage.lower())
 
     @classmethod
     def from_array(self, coeffs, normalization='4pi', csphase=1, lmax=None,
-                   copy=True):
+                   copy=True, storage='full'):
         """
         Initialize the class with spherical harmonic coefficients from an input
         array.
 
         Usage
         -----
-        x = SHCoeffs.from_array(array, [normalization, csphase, lmax, copy])
+        x = SHCoeffs.from_array(array, [normalization, csphase, lmax, copy,
+                                        storage])
 
         Returns
         -------
@@ -186,8 +438,10 @@ class SHCoeffs(object):
 
         Parameters
         ----------
-        array : ndarray, shape (2, lmaxin+1, lmaxin+1).
-            The input spherical harmonic coefficients.
+        array : ndarray, shape (2, lmaxin+1, lmaxin+1) or ((lmaxin+1)**2).
+            The input spherical harmonic coefficients, either as a 3-D array
+            or as a 1-D packed array ordered according to the convention in
+            SHCilmToVector.
         normalization : str, optional, default = '4pi'
             '4pi', 'ortho', 'schmidt', or 'unnorm' for geodesy 4pi normalized,
             orthonormalized, Schmidt semi-normalized, or unnormalized
@@ -201,12 +455,23 @@ class SHCoeffs(object):
         copy : bool, optional, default = True
             If True, make a copy of array when initializing the class instance.
             If False, initialize the class instance with a reference to array.
+            If the form of array differs from storage, a copy is always made.
+        storage : str, optional, default = 'full'
+            'full' to store the coefficients in a 3-D array, or 'packed' to
+            store the coefficients in a 1-D packed array.
         """
         if _np.iscomplexobj(coeffs):
             kind = 'complex'
         else:
             kind = 'real'
 
+        if storage.lower() not in ('full', 'packed'):
+            raise ValueError(
+                "storage must be 'full' or 'packed'. " +
+                "Input value was {:s}."
+                .format(repr(storage))
+                )
+
         if type(normalization) != str:
             raise ValueError('normalization must be a string. ' +
                              'Input type was {:s}'
@@ -225,7 +490,10 @@ class SHCoeffs(object):
                 .format(repr(csphase))
                 )
 
-        lmaxin = coeffs.shape[1] - 1
+        if coeffs.ndim == 1:
+            lmaxin = _lmax_packed(coeffs)
+        else:
+            lmaxin = coeffs.shape[1] - 1
         if lmax is None:
             lmax = lmaxin
         else:
@@ -240,15 +508,21 @@ class SHCoeffs(object):
                            category=RuntimeWarning)
             lmax = 85
 
+        if coeffs.ndim == 1:
+            coeffs = coeffs[:(lmax+1)**2]
+        else:
+            coeffs = coeffs[:, 0:lmax+1, 0:lmax+1]
+
         for cls in self.__subclasses__():
             if cls.istype(kind):
-                return cls(coeffs[:, 0:lmax+1, 0:lmax+1],
-                           normalization=normalization.lower(),
-                           csphase=csphase, copy=copy)
+                return cls(coeffs, normalization=normalization.lower(),
+                           csphase=csphase, copy=copy,
+                           storage=storage.lower())
 
     @classmethod
     def from_random(self, power, lmax=None, kind='real', normalization='4pi',
-                    csphase=1, exact_power=False):
+                    csphase=1, exact_power=False, storage='full', n=None,
+                    seed=None, stream=None, chunksize=None):
         """
         Initialize the class with spherical harmonic coefficients as random
         variables.
@@ -256,11 +530,16 @@ class SHCoeffs(object):
         Usage
         -----
         x = SHCoeffs.from_random(power, [lmax, kind, normalization, csphase,
-                                         exact_power])
+                                         exact_power, storage, n, seed,
+                                         stream, chunksize])
 
         Returns
         -------
-        x : SHCoeffs class instance.
+        x : SHCoeffs class instance, list, or generator
+            If n is None, a single SHCoeffs class instance. If n is specified,
+            a list of n SHCoeffs class instances. If chunksize is specified,
+            a generator that yields lists of at most chunksize SHCoeffs class
+            instances, for a total of n instances.
 
         Parameters
         ----------
@@ -284,6 +563,22 @@ class SHCoeffs(object):
             The total variance of the coefficients is set exactly to the input
             power. This means that the distribution of power at degree l
             amongst the angular orders is random, but the total power is fixed.
+        storage : str, optional, default = 'full'
+            'full' to store the coefficients in a 3-D array, or 'packed' to
+            store the coefficients in a 1-D packed array.
+        n : int, optional, default = None
+            The number of random realizations to return.
+        seed : int, numpy.random.SeedSequence or numpy.random.Generator,
+               optional, default = None
+            The seed of the random number generator. If None (and stream is
+            None), numpy's global random state is used.
+        stream : int, optional, default = None
+            The index of an independent random stream derived from seed. Each
+            worker of a parallel computation should use the same seed and a
+            different value of stream.
+        chunksize : int, optional, default = None
+            If specified, return a generator that creates the n realizations
+            in chunks of at most chunksize realizations.
 
         Description
         -----------
@@ -293,6 +588,24 @@ class SHCoeffs(object):
         l divided by the number of coefficients at that degree. The power
         spectrum of the random realization can be fixed exactly to the input
         spectrum using the keyword exact_power.
+
+        When n is specified, all realizations are drawn with a single call to
+        the random number generator, and the coefficients of the returned
+        class instances are views of a single array of dimension
+        (n, 2, lmax+1, lmax+1), or (n, (lmax+1)**2) for packed storage. When
+        the entire array does not fit in memory, use chunksize to create the
+        realizations in successive blocks.
+
+        When seed, stream and n are None, the coefficients are drawn from
+        numpy's global random state in the same order as in previous
+        versions, so that a realization that follows a call to
+        numpy.random.seed() is unchanged.
+
+        The random realizations are reproducible when seed is specified.
+        Streams that are statistically independent, for instance for the
+        workers of a multiprocessing pool, are obtained by specifying the same
+        seed and a different stream for each worker. The streams are those
+        returned by numpy.random.SeedSequence(seed).spawn().
         """
         # check if all arguments are correct
         if type(normalization) != str:
@@ -318,6 +631,27 @@ class SHCoeffs(object):
                 "kind must be 'real' or 'complex'. " +
                 "Input value was {:s}.".format(repr(kind)))
 
+        if storage.lower() not in ('full', 'packed'):
+            raise ValueError(
+                "storage must be 'full' or 'packed'. " +
+                "Input value was {:s}.".format(repr(storage)))
+
+        if n is not None and n < 1:
+            raise ValueError('n must be greater than zero. ' +
+                             'Input value was {:s}.'.format(repr(n)))
+
+        if chunksize is not None:
+            if n is None:
+                raise ValueError('n must be specified when chunksize is ' +
+                                 'specified.')
+            if chunksize < 1:
+                raise ValueError('chunksize must be greater than zero. ' +
+                                 'Input value was {:s}.'
+                                 .format(repr(chunksize)))
+
+        rng = _random_generator(seed, stream)
+        legacy = rng is _np.random and n is None
+
         if lmax is None:
             nl = len(power)
             lmax = nl - 1
@@ -326,7 +660,6 @@ class SHCoeffs(object):
                 nl = lmax + 1
             else:
                 nl = len(power)
-        degrees = _np.arange(nl)
 
         if normalization.lower() == 'unnorm' and nl - 1 > 85:
             _warnings.warn("Calculations using unnormalized coefficients " +
@@ -337,57 +670,38 @@ class SHCoeffs(object):
             nl = 85 + 1
             lmax = 85
 
-        # Create coefficients with unit variance, which returns an expected
-        # total power per degree of (2l+1).
-        if kind.lower() == 'real':
-            coeffs = _np.empty((2, nl, nl))
-            for l in degrees:
-                coeffs[:2, l, :l+1] = _np.random.normal(size=(2, l+1))
-        elif kind.lower() == 'complex':
-            # - need to divide by sqrt 2 as there are two terms for each coeff.
-            coeffs = _np.empty((2, nl, nl), dtype=complex)
-            for l in degrees:
-                coeffs[:2, l, :l+1] = (_np.random.normal(size=(2, l+1)) +
-                                       1j * _np.random.normal(size=(2, l+1))
-                                       ) / _np.sqrt(2.)
-
-        if exact_power:
-            power_per_l = _spectrum(coeffs, normalization=normalization,
-                                    unit='per_l')
-            coeffs *= _np.sqrt(
-                power[0:nl] / power_per_l)[_np.newaxis, :, _np.newaxis]
-        else:
-            if normalization.lower() == '4pi':
-                coeffs *= _np.sqrt(
-                    power[0:nl] / (2. * degrees + 1.))[_np.newaxis, :,
-                                                       _np.newaxis]
-            elif normalization.lower() == 'ortho':
-                coeffs *= _np.sqrt(
-                    4. * _np.pi * power[0:nl] / (2. * degrees + 1.)
-                    )[_np.newaxis, :, _np.newaxis]
-            elif normalization.lower() == 'schmidt':
-                coeffs *= _np.sqrt(power[0:nl])[_np.newaxis, :, _np.newaxis]
-            elif normalization.lower() == 'unnorm':
-                coeffs *= _np.sqrt(power[0:nl])[_np.newaxis, :, _np.newaxis]
-                for l in degrees:
-                    ms = _np.arange(l+1)
-                    coeffs[:, l, :l+1] *= _np.sqrt(_factorial(l-ms) /
-                                                   _factorial(l+ms))
-                if kind.lower() == 'real':
-                    coeffs[:, :, 1:] *= _np.sqrt(2.)
-
-        if lmax > nl - 1:
-            coeffs = _np.pad(coeffs, ((0, 0), (0, lmax - nl + 1),
-                             (0, lmax - nl + 1)), 'constant')
+        power = _np.asarray(power, dtype=_np.float64)
+        kwargs = dict(power=power, nl=nl, lmax=lmax, kind=kind.lower(),
+                      normalization=normalization.lower(),
+                      exact_power=exact_power)
 
         for cls in self.__subclasses__():
             if cls.istype(kind):
-                return cls(coeffs, normalization=normalization.lower(),
-                           csphase=csphase)
+                break
+
+        def realizations(size):
+            coeffs = _random_packed(rng, size, legacy=legacy, **kwargs)
+            if storage.lower() == 'full':
+                coeffs = _unpack(coeffs)
+            return [cls(c, normalization=normalization.lower(),
+                        csphase=csphase, copy=False, storage=storage.lower())
+                    for c in coeffs]
+
+        def chunks():
+            for start in range(0, n, chunksize):
+                yield realizations(min(chunksize, n - start))
+
+        if chunksize is not None:
+            return chunks()
+        elif n is not None:
+            return realizations(n)
+        else:
+            return realizations(1)[0]
 
     @classmethod
     def from_file(self, fname, lmax=None, format='shtools', kind='real',
-                  normalization='4pi', skip=0, csphase=1, **kwargs):
+                  normalization='4pi', skip=0, csphase=1, storage='full',
+                  **kwargs):
         """
         Initialize the class with spherical harmonic coefficients from a file.
 
@@ -395,9 +709,11 @@ class SHCoeffs(object):
         -----
         x = SHCoeffs.from_file(filename, format='shtools', [lmax,
                                                             normalization,
-                                                            csphase, skip])
+                                                            csphase, skip,
+                                                            storage])
         x = SHCoeffs.from_file(filename, format='npy', [normalization,
-                                                        csphase, **kwargs])
+                                                        csphase, storage,
+                                                        **kwargs])
 
         Returns
         -------
@@ -422,6 +738,9 @@ class SHCoeffs(object):
         skip : int, optional, default = 0
             Number of lines to skip at the beginning of the file when format is
             'shtools'.
+        storage : str, optional, default = 'full'
+            'full' to store the coefficients in a 3-D array, or 'packed' to
+            store the coefficients in a 1-D packed array.
         **kwargs : keyword argument list, optional for format = 'npy'
             Keyword arguments of numpy.load() when format is 'npy'.
 
@@ -442,7 +761,8 @@ class SHCoeffs(object):
         zero. For more information, see `shio.shread()`.
 
         If format='npy', a binary numpy 'npy' file will be read using
-        numpy.load().
+        numpy.load(). The file can contain either a 3-D array of coefficients
+        or a 1-D packed array.
         """
         if type(normalization) != str:
             raise ValueError('normalization must be a string. ' +
@@ -461,6 +781,11 @@ class SHCoeffs(object):
                 .format(repr(csphase))
                 )
 
+        if storage.lower() not in ('full', 'packed'):
+            raise ValueError(
+                "storage must be 'full' or 'packed'. " +
+                "Input value was {:s}.".format(repr(storage)))
+
         if format.lower() == 'shtools':
             coeffs, lmaxout = _shread(fname, lmax=lmax, skip=skip)
         elif format.lower() == 'npy':
@@ -485,7 +810,7 @@ class SHCoeffs(object):
         for cls in self.__subclasses__():
             if cls.istype(kind):
                 return cls(coeffs, normalization=normalization.lower(),
-                           csphase=csphase)
+                           csphase=csphase, storage=storage.lower())
 
     def copy(self):
         """Return a deep copy of the class instance."""
@@ -507,14 +832,20 @@ class SHCoeffs(object):
             'shtools' or 'npy'. See method from_file() for more information.
         **kwargs : keyword argument list, optional for format = 'npy'
             Keyword arguments of numpy.save().
+
+        Description
+        -----------
+        If format='npy', the coefficients are saved using the storage form of
+        the class instance, which is either a 3-D array or a 1-D packed array.
         """
         if format is 'shtools':
+            coeffs = self._cilm()
             with open(filename, mode='w') as file:
                 for l in range(self.lmax+1):
                     for m in range(l+1):
                         file.write('{:d}, {:d}, {:e}, {:e}\n'
-                                   .format(l, m, self.coeffs[0, l, m],
-                                           self.coeffs[1, l, m]))
+                                   .format(l, m, coeffs[0, l, m],
+                                           coeffs[1, l, m]))
         elif format is 'npy':
             _np.save(filename, self.coeffs, **kwargs)
         else:
@@ -522,37 +853,65 @@ class SHCoeffs(object):
                 'format={:s} not yet implemented'.format(repr(format)))
 
     # ---- Mathematical operators ----
-    def __add__(self, other):
-        """
-        Add two similar sets of coefficients or coefficients and a scalar:
-        self + other.
-        """
-        if isinstance(other, SHCoeffs):
-            if (self.normalization == other.normalization and self.csphase ==
-                    other.csphase and self.kind == other.kind):
-                coeffs = _np.empty([2, self.lmax+1, self.lmax+1],
-                                   dtype=self.coeffs.dtype)
-                coeffs[self.mask] = (self.coeffs[self.mask] +
-                                     other.coeffs[self.mask])
-                return SHCoeffs.from_array(coeffs, csphase=self.csphase,
-                                           normalization=self.normalization)
+    def _operate(self, other, operator, errmsg, reverse=False, out=None):
+        """
+        Apply an element-wise binary operator to the coefficients of self and
+        other, where other is either a similar set of coefficients or a
+        scalar. If reverse is True, the operands are exchanged. If out is None,
+        return a new class instance, otherwise write the result to the
+        coefficients of out and return out.
+        """
+        if isinstance(other, _SHExpression):
+            return NotImplemented
+        elif isinstance(other, SHCoeffs):
+            if self._compatible(other):
+                if self.storage == 'packed':
+                    operand = other._packed()
+                else:
+                    operand = other._cilm()
             else:
                 raise ValueError('The two sets of coefficients must be of ' +
-                                 'the same kind and have the same ' +
+                                 'the same kind and have the same lmax, ' +
                                  'normalization and csphase.')
         elif _np.isscalar(other) is True:
-            coeffs = _np.empty([2, self.lmax+1, self.lmax+1],
-                               dtype=self.coeffs.dtype)
             if self.kind == 'real' and _np.iscomplexobj(other):
-                raise ValueError('Can not add a complex constant to real ' +
-                                 'coefficients.')
-            coeffs[self.mask] = self.coeffs[self.mask] + other
-            return SHCoeffs.from_array(coeffs, csphase=self.csphase,
-                                       normalization=self.normalization)
+                raise ValueError(errmsg)
+            operand = other
         else:
             raise NotImplementedError('Mathematical operator not implemented' +
                                       'for these operands.')
 
+        if reverse:
+            args = (operand, self.coeffs)
+        else:
+            args = (self.coeffs, operand)
+
+        if out is None:
+            # Coefficients that are not permissible are left at zero.
+            coeffs = _np.zeros_like(self.coeffs)
+            casting = 'unsafe'
+        else:
+            coeffs = out.coeffs
+            casting = 'same_kind'
+
+        if self.storage == 'packed':
+            operator(*args, out=coeffs, casting=casting)
+        else:
+            operator(*args, out=coeffs, where=self.mask, casting=casting)
+
+        if out is None:
+            return self._new(coeffs)
+        else:
+            return out
+
+    def __add__(self, other):
+        """
+        Add two similar sets of coefficients or coefficients and a scalar:
+        self + other.
+        """
+        return self._operate(other, _np.add, 'Can not add a complex ' +
+                             'constant to real coefficients.')
+
     def __radd__(self, other):
         """
         Add two similar sets of coefficients or coefficients and a scalar:
@@ -560,98 +919,47 @@ class SHCoeffs(object):
         """
         return self.__add__(other)
 
+    def __iadd__(self, other):
+        """
+        Add two similar sets of coefficients or coefficients and a scalar
+        in-place: self += other.
+        """
+        return self._operate(other, _np.add, 'Can not add a complex ' +
+                             'constant to real coefficients.', out=self)
+
     def __sub__(self, other):
         """
         Subtract two similar sets of coefficients or coefficients and a scalar:
         self - other.
         """
-        if isinstance(other, SHCoeffs):
-            if (self.normalization == other.normalization and self.csphase ==
-                    other.csphase and self.kind == other.kind):
-                coeffs = _np.empty([2, self.lmax+1, self.lmax+1],
-                                   dtype=self.coeffs.dtype)
-                coeffs[self.mask] = (self.coeffs[self.mask] -
-                                     other.coeffs[self.mask])
-                return SHCoeffs.from_array(coeffs, csphase=self.csphase,
-                                           normalization=self.normalization)
-            else:
-                raise ValueError('The two sets of coefficients must be of ' +
-                                 'the same kind and have the same ' +
-                                 'normalization and csphase.')
-        elif _np.isscalar(other) is True:
-            coeffs = _np.empty([2, self.lmax+1, self.lmax+1],
-                               dtype=self.coeffs.dtype)
-            if self.kind == 'real' and _np.iscomplexobj(other):
-                raise ValueError('Can not subtract a complex constant from ' +
-                                 'real coefficients.')
-            coeffs[self.mask] = self.coeffs[self.mask] - other
-            return SHCoeffs.from_array(coeffs, csphase=self.csphase,
-                                       normalization=self.normalization)
-        else:
-            raise NotImplementedError('Mathematical operator not implemented' +
-                                      'for these operands.')
+        return self._operate(other, _np.subtract, 'Can not subtract a ' +
+                             'complex constant from real coefficients.')
 
     def __rsub__(self, other):
         """
         Subtract two similar sets of coefficients or coefficients and a scalar:
         other - self.
         """
-        if isinstance(other, SHCoeffs):
-            if (self.normalization == other.normalization and self.csphase ==
-                    other.csphase and self.kind == other.kind):
-                coeffs = _np.empty([2, self.lmax+1, self.lmax+1],
-                                   dtype=self.coeffs.dtype)
-                coeffs[self.mask] = (other.coeffs[self.mask] -
-                                     self.coeffs[self.mask])
-                return SHCoeffs.from_array(coeffs, csphase=self.csphase,
-                                           normalization=self.normalization)
-            else:
-                raise ValueError('The two sets of coefficients must be of ' +
-                                 'the same kind and have the same ' +
-                                 'normalization and csphase.')
-        elif _np.isscalar(other) is True:
-            coeffs = _np.empty([2, self.lmax+1, self.lmax+1],
-                               dtype=self.coeffs.dtype)
-            if self.kind == 'real' and _np.iscomplexobj(other):
-                raise ValueError('Can not subtract a complex constant from ' +
-                                 'real coefficients.')
-            coeffs[self.mask] = other - self.coeffs[self.mask]
-            return SHCoeffs.from_array(coeffs, csphase=self.csphase,
-                                       normalization=self.normalization)
-        else:
-            raise NotImplementedError('Mathematical operator not implemented' +
-                                      'for these operands.')
+        return self._operate(other, _np.subtract, 'Can not subtract a ' +
+                             'complex constant from real coefficients.',
+                             reverse=True)
+
+    def __isub__(self, other):
+        """
+        Subtract two similar sets of coefficients or coefficients and a scalar
+        in-place: self -= other.
+        """
+        return self._operate(other, _np.subtract, 'Can not subtract a ' +
+                             'complex constant from real coefficients.',
+                             out=self)
 
     def __mul__(self, other):
         """
         Multiply two similar sets of coefficients or coefficients and a scalar:
         self * other.
         """
-        if isinstance(other, SHCoeffs):
-            if (self.normalization == other.normalization and self.csphase ==
-                    other.csphase and self.kind == other.kind):
-                coeffs = _np.empty([2, self.lmax+1, self.lmax+1],
-                                   dtype=self.coeffs.dtype)
-                coeffs[self.mask] = (self.coeffs[self.mask] *
-                                     other.coeffs[self.mask])
-                return SHCoeffs.from_array(coeffs, csphase=self.csphase,
-                                           normalization=self.normalization)
-            else:
-                raise ValueError('The two sets of coefficients must be of ' +
-                                 'the same kind and have the same ' +
-                                 'normalization and csphase.')
-        elif _np.isscalar(other) is True:
-            coeffs = _np.empty([2, self.lmax+1, self.lmax+1],
-                               dtype=self.coeffs.dtype)
-            if self.kind == 'real' and _np.iscomplexobj(other):
-                raise ValueError('Can not multiply real coefficients by ' +
-                                 'a complex constant.')
-            coeffs[self.mask] = self.coeffs[self.mask] * other
-            return SHCoeffs.from_array(coeffs, csphase=self.csphase,
-                                       normalization=self.normalization)
-        else:
-            raise NotImplementedError('Mathematical operator not implemented' +
-                                      'for these operands.')
+        return self._operate(other, _np.multiply, 'Can not multiply real ' +
+                             'coefficients by a complex constant.')
 
     def __rmul__(self, other):
         """
@@ -660,67 +968,45 @@ class SHCoeffs(object):
         """
         return self.__mul__(other)
 
+    def __imul__(self, other):
+        """
+        Multiply two similar sets of coefficients or coefficients and a scalar
+        in-place: self *= other.
+        """
+        return self._operate(other, _np.multiply, 'Can not multiply real ' +
+                             'coefficients by a complex constant.', out=self)
+
     def __div__(self, other):
         """
         Divide two similar sets of coefficients or coefficients and a scalar
         when __future__.division is not in effect: self / other.
         """
-        if isinstance(other, SHCoeffs):
-            if (self.normalization == other.normalization and self.csphase ==
-                    other.csphase and self.kind == other.kind):
-                coeffs = _np.empty([2, self.lmax+1, self.lmax+1],
-                                   dtype=self.coeffs.dtype)
-                coeffs[self.mask] = (self.coeffs[self.mask] /
-                                     other.coeffs[self.mask])
-                return SHCoeffs.from_array(coeffs, csphase=self.csphase,
-                                           normalization=self.normalization)
-            else:
-                raise ValueError('The two sets of coefficients must be of ' +
-                                 'the same kind and have the same ' +
-                                 'normalization and csphase.')
-        elif _np.isscalar(other) is True:
-            coeffs = _np.empty([2, self.lmax+1, self.lmax+1],
-                               dtype=self.coeffs.dtype)
-            if self.kind == 'real' and _np.iscomplexobj(other):
-                raise ValueError('Can not divide real coefficients by ' +
-                                 'a complex constant.')
-            coeffs[self.mask] = self.coeffs[self.mask] / other
-            return SHCoeffs.from_array(coeffs, csphase=self.csphase,
-                                       normalization=self.normalization)
-        else:
-            raise NotImplementedError('Mathematical operator not implemented' +
-                                      'for these operands.')
+        return self._operate(other, _np.true_divide, 'Can not divide real ' +
+                             'coefficients by a complex constant.')
 
     def __truediv__(self, other):
         """
         Divide two similar sets of coefficients or coefficients and a scalar
         when __future__.division is in effect: self / other.
         """
-        if isinstance(other, SHCoeffs):
-            if (self.normalization == other.normalization and self.csphase ==
-                    other.csphase and self.kind == other.kind):
-                coeffs = _np.empty([2, self.lmax+1, self.lmax+1],
-                                   dtype=self.coeffs.dtype)
-                coeffs[self.mask] = (self.coeffs[self.mask] /
-                                     other.coeffs[self.mask])
-                return SHCoeffs.from_array(coeffs, csphase=self.csphase,
-                                           normalization=self.normalization)
-            else:
-                raise ValueError('The two sets of coefficients must be of ' +
-                                 'the same kind and have the same ' +
-                                 'normalization and csphase.')
-        elif _np.isscalar(other) is True:
-            coeffs = _np.empty([2, self.lmax+1, self.lmax+1],
-                               dtype=self.coeffs.dtype)
-            if self.kind == 'real' and _np.iscomplexobj(other):
-                raise ValueError('Can not multiply real coefficients by ' +
-                                 'a complex constant.')
-            coeffs[self.mask] = self.coeffs[self.mask] / other
-            return SHCoeffs.from_array(coeffs, csphase=self.csphase,
-                                       normalization=self.normalization)
-        else:
-            raise NotImplementedError('Mathematical operator not implemented' +
-                                      'for these operands.')
+        return self._operate(other, _np.true_divide, 'Can not divide real ' +
+                             'coefficients by a complex constant.')
+
+    def __idiv__(self, other):
+        """
+        Divide two similar sets of coefficients or coefficients and a scalar
+        in-place when __future__.division is not in effect: self /= other.
+        """
+        return self._operate(other, _np.true_divide, 'Can not divide real ' +
+                             'coefficients by a complex constant.', out=self)
+
+    def __itruediv__(self, other):
+        """
+        Divide two similar sets of coefficients or coefficients and a scalar
+        in-place when __future__.division is in effect: self /= other.
+        """
+        return self._operate(other, _np.true_divide, 'Can not divide real ' +
+                             'coefficients by a complex constant.', out=self)
 
     def __pow__(self, other):
         """
@@ -730,11 +1016,76 @@ class SHCoeffs(object):
         if _np.isscalar(other) is True:
             return SHCoeffs.from_array(pow(self.coeffs, other),
                                        csphase=self.csphase,
-                                       normalization=self.normalization)
+                                       normalization=self.normalization,
+                                       storage=self.storage)
         else:
             raise NotImplementedError('Mathematical operator not implemented' +
                                       'for these operands.')
 
+    def __ipow__(self, other):
+        """
+        Raise the spherical harmonic coefficients to a scalar power in-place:
+        self **= other.
+        """
+        if _np.isscalar(other) is True:
+            return self._operate(other, _np.power, 'Can not raise real ' +
+                                 'coefficients to a complex power.', out=self)
+        else:
+            raise NotImplementedError('Mathematical operator not implemented' +
+                                      'for these operands.')
+
+    def lazy(self):
+        """
+        Return a deferred expression of the coefficients for fused
+        element-wise arithmetic.
+
+        Usage
+        -----
+        e = x.lazy()
+
+        Returns
+        -------
+        e : SHExpression class instance
+            An expression that consists only of the coefficients of x.
+
+        Description
+        -----------
+        Arithmetic operations with the returned expression are not computed
+        immediately, but are recorded in a new expression. When the method
+        evaluate() of the expression is called, the entire chain of
+        operations is computed in a single pass over the coefficients and
+        a new SHCoeffs class instance is returned, or, if the optional
+        parameter out is specified, the result is written to the
+        coefficients of an existing class instance. As an example,
+
+            y = (a * x.lazy() + b * z.lazy() - c).evaluate()
+
+        does not create any temporary arrays with the size of the
+        coefficients. The operands must be compatible with x. To compute
+        a single operation in-place, use the in-place operators +=, -=, *=,
+        /= and **=.
+        """
+        return _SHExpression(self)
+
+    def _compatible(self, other):
+        """
+        Return True if other is an SHCoeffs class instance of the same kind
+        and with the same lmax, normalization and csphase as self.
+        """
+        return (isinstance(other, SHCoeffs) and self.kind == other.kind and
+                self.lmax == other.lmax and
+                self.normalization == other.normalization and
+                self.csphase == other.csphase)
+
+    def _new(self, coeffs):
+        """
+        Return a new class instance that references coeffs and that uses the
+        conventions and storage form of self.
+        """
+        return SHCoeffs.from_array(coeffs, csphase=self.csphase,
+                                   normalization=self.normalization,
+                                   copy=False, storage=self.storage)
+
     # ---- Extract data ----
     def degrees(self):
         """
@@ -842,7 +1193,10 @@ class SHCoeffs(object):
         ms = _np.array(ms)
 
         mneg_mask = (ms < 0).astype(_np.int)
-        self.coeffs[mneg_mask, ls, _np.abs(ms)] = values
+        if self.storage == 'packed':
+            self.coeffs[ls**2 + mneg_mask * ls + _np.abs(ms)] = values
+        else:
+            self.coeffs[mneg_mask, ls, _np.abs(ms)] = values
 
     # ---- Return coefficients with a different normalization convention ----
     def to_array(self, normalization=None, csphase=None, lmax=None):
@@ -889,13 +1243,71 @@ class SHCoeffs(object):
         if lmax is None:
             lmax = self.lmax
 
-        coeffs = _convert(self.coeffs, normalization_in=self.normalization,
+        coeffs = _convert(self._cilm(), normalization_in=self.normalization,
                           normalization_out=normalization,
                           csphase_in=self.csphase, csphase_out=csphase,
                           lmax=lmax)
 
         return coeffs
 
+    def to_vector(self, lmax=None):
+        """
+        Return the spherical harmonic coefficients as a packed 1-D numpy array.
+
+        Usage
+        -----
+        vector = x.to_vector([lmax])
+
+        Returns
+        -------
+        vector : ndarray, shape ((lmax+1)**2)
+            1-D numpy ndarray of the spherical harmonic coefficients ordered
+            according to the convention in SHCilmToVector.
+
+        Parameters
+        ----------
+        lmax : int, optional, default = x.lmax
+            Maximum spherical harmonic degree to output. If lmax is greater
+            than x.lmax, the array will be zero padded.
+
+        Description
+        -----------
+        The coefficient of degree l, order m and index i (0 for the cosine
+        and 1 for the sine terms) is located at element l**2 + i*l + m of the
+        output array. All coefficients of degree l are contiguous, and the
+        coefficients of degrees less than or equal to lmax occupy the first
+        (lmax+1)**2 elements. The output array is always a copy and uses the
+        normalization and Condon-Shortley phase convention of the class
+        instance.
+        """
+        if lmax is None:
+            lmax = self.lmax
+
+        vector = _np.zeros((lmax + 1)**2, dtype=self.coeffs.dtype)
+        n = (min(lmax, self.lmax) + 1)**2
+        vector[:n] = self._packed()[:n]
+        return vector
+
+    def _cilm(self):
+        """
+        Return the coefficients as a 3-D array, without copying when the
+        storage is 'full'.
+        """
+        if self.storage == 'packed':
+            return _unpack(self.coeffs)
+        else:
+            return self.coeffs
+
+    def _packed(self):
+        """
+        Return the coefficients as a 1-D packed array, without copying when
+        the storage is 'packed'.
+        """
+        if self.storage == 'packed':
+            return self.coeffs
+        else:
+            return _pack(self.coeffs)
+
     # ---- Rotate the coordinate system ----
     def rotate(self, alpha, beta, gamma, degrees=True, convention='y',
                body=False, dj_matrix=None):
@@ -1007,14 +1419,14 @@ class SHCoeffs(object):
 
     # ---- Convert spherical harmonic coefficients to a different normalization
     def convert(self, normalization=None, csphase=None, lmax=None, kind=None,
-                check=True):
+                check=True, storage=None):
         """
         Return a SHCoeffs class instance with a different normalization
         convention.
 
         Usage
         -----
-        clm = x.convert([normalization, csphase, lmax, kind, check])
+        clm = x.convert([normalization, csphase, lmax, kind, check, storage])
 
         Returns
         -------
@@ -1037,6 +1449,9 @@ class SHCoeffs(object):
         check : bool, optional, default = True
             When converting complex coefficients to real coefficients, if True,
             check if function is entirely real.
+        storage : str, optional, default = x.storage
+            'full' or 'packed' storage for the coefficients of the output
+            class.
 
         Description
         -----------
@@ -1058,6 +1473,8 @@ class SHCoeffs(object):
             lmax = self.lmax
         if kind is None:
             kind = self.kind
+        if storage is None:
+            storage = self.storage
 
         # check argument consistency
         if type(normalization) != str:
@@ -1073,6 +1490,10 @@ class SHCoeffs(object):
             raise ValueError(
                 "csphase must be 1 or -1. Input value was {:s}"
                 .format(repr(csphase)))
+        if storage.lower() not in ('full', 'packed'):
+            raise ValueError(
+                "storage must be 'full' or 'packed'. " +
+                "Input value was {:s}".format(repr(storage)))
 
         if (kind != self.kind):
             if (kind == 'complex'):
@@ -1087,7 +1508,8 @@ class SHCoeffs(object):
 
         return SHCoeffs.from_array(coeffs,
                                    normalization=normalization.lower(),
-                                   csphase=csphase, copy=False)
+                                   csphase=csphase, copy=False,
+                                   storage=storage.lower())
 
     # ---- Return a SHCoeffs class instance zero padded up to lmax
     def pad(self, lmax):
@@ -1108,6 +1530,12 @@ class SHCoeffs(object):
         lmax : int
             Maximum spherical harmonic degree to output.
         """
+        if self.storage == 'packed':
+            return SHCoeffs.from_array(self.to_vector(lmax=lmax),
+                                       normalization=self.normalization,
+                                       csphase=self.csphase, copy=False,
+                                       storage='packed')
+
         clm = self.copy()
 
         if lmax <= self.lmax:
@@ -1119,6 +1547,49 @@ class SHCoeffs(object):
         clm.lmax = lmax
         return clm
 
+    def continue_to(self, r, r0, filter=None, half=0):
+        """
+        Return a SHCoeffs class instance of potential coefficients that are
+        upward or downward continued to a different reference radius.
+
+        Usage
+        -----
+        clm = x.continue_to(r, r0, [filter, half])
+
+        Returns
+        -------
+        clm : SHCoeffs class instance
+
+        Parameters
+        ----------
+        r : float
+            The reference radius of the output coefficients.
+        r0 : float
+            The reference radius of the coefficients of x.
+        filter : str, optional, default = None
+            The filter that is applied when r is less than r0: None for no
+            filter, 'ma' for the minimum-amplitude filter of
+            DownContFilterMA, and 'mc' for the minimum-curvature filter of
+            DownContFilterMC.
+        half : int, optional, default = 0
+            The spherical harmonic degree where the filter is equal to 0.5.
+
+        Description
+        -----------
+        The coefficients are multiplied by (r0/r)**l, and by the filter when
+        downward continuing, which corresponds to a potential of the form
+        GM/r sum_l (r0/r)**l sum_m Clm Ylm. The per-degree factors are
+        cached by continuation_factors. To continue a stack of coefficient
+        arrays, use pyshtools.gravmag.continue_coeffs.
+        """
+        factors = _continuation.continuation_factors(self.lmax, r0, r,
+                                                     filter=filter, half=half)
+        if self.storage == 'packed':
+            ls = _index_table(self.lmax, 'packed')[1]
+            return self._new(self.coeffs * factors[ls])
+        else:
+            return self._new(self.coeffs * factors[:, _np.newaxis])
+
     # ---- Expand the coefficients onto a grid ----
     def expand(self, grid='DH', lat=None, lon=None, degrees=True, zeros=None,
                lmax=None, lmax_calc=None):
@@ -1198,6 +1669,99 @@ class SHCoeffs(object):
 
             return gridout
 
+    def expand_field(self, lat, lon, r, r0, field='gravity', gm=None,
+                     components=None, lmax_calc=None, degrees=True, omega=0.,
+                     chunksize=None, nthreads=None):
+        """
+        Evaluate the gravity field, the gravity tensor or the magnetic field
+        of real potential coefficients at a set of points.
+
+        Usage
+        -----
+        values = x.expand_field(lat, lon, r, r0, [field, gm, components,
+                                lmax_calc, degrees, omega, chunksize,
+                                nthreads])
+
+        Returns
+        -------
+        values : tuple of ndarrays or ndarray
+            The values of the requested components at the points, with the
+            broadcast shape of lat, lon and r. When components is a string, a
+            single array is returned.
+
+        Parameters
+        ----------
+        lat, lon, r : float or ndarray
+            The geocentric latitude, longitude and radius of the points.
+        r0 : float
+            The reference radius of the coefficients.
+        field : str, optional, default = 'gravity'
+            'gravity' for the gravity vector and the gravitational potential,
+            'tensor' for the gravity tensor, or 'magnetic' for the magnetic
+            field and the magnetic potential.
+        gm : float, optional, default = None
+            The gravitational constant multiplied by the mass of the planet.
+            This is required when field is 'gravity' or 'tensor'.
+        components : str or sequence of str, optional, default = None
+            The components to compute. By default, these are the default
+            components of make_grav_points, make_grav_grad_points or
+            make_mag_points.
+        lmax_calc : int, optional, default = x.lmax
+            The maximum spherical harmonic degree used in evaluating the
+            field.
+        degrees : bool, optional, default = True
+            True if lat and lon are in degrees, False if in radians.
+        omega : float, optional, default = 0
+            The angular rotation rate of the planet, used when field is
+            'gravity'.
+        chunksize : int, optional, default = None
+            The number of points evaluated at once.
+        nthreads : int, optional, default = None
+            The number of threads used to evaluate the chunks of points.
+
+        Description
+        -----------
+        The coefficients are converted to 4pi-normalized coefficients for
+        gravity fields and to Schmidt semi-normalized coefficients for
+        magnetic fields, excluding the Condon-Shortley phase, and the field
+        is evaluated using make_grav_points, make_grav_grad_points or
+        make_mag_points. See the documentation of these functions for the
+        conventions of the output components.
+        """
+        if self.kind != 'real':
+            raise ValueError('expand_field is only defined for real ' +
+                             'coefficients. Input kind is {:s}.'
+                             .format(repr(self.kind)))
+
+        if field not in ('gravity', 'tensor', 'magnetic'):
+            raise ValueError("field must be 'gravity', 'tensor' or " +
+                             "'magnetic'. Input value was {:s}."
+                             .format(repr(field)))
+
+        if field in ('gravity', 'tensor') and gm is None:
+            raise ValueError('gm must be specified when field is ' +
+                             '{:s}.'.format(repr(field)))
+
+        if lmax_calc is None:
+            lmax_calc = self.lmax
+
+        kwargs = {'lmax_calc': lmax_calc, 'degrees': degrees,
+                  'chunksize': chunksize, 'nthreads': nthreads}
+        if components is not None:
+            kwargs['components'] = components
+
+        if field == 'magnetic':
+            cilm = self.to_array(normalization='schmidt', csphase=1)
+            return _synthesis.make_mag_points(cilm, r0, lat, lon, r, **kwargs)
+
+        cilm = self.to_array(normalization='4pi', csphase=1)
+        if field == 'gravity':
+            return _synthesis.make_grav_points(cilm, gm, r0, lat, lon, r,
+                                               omega=omega, **kwargs)
+        else:
+            return _synthesis.make_grav_grad_points(cilm, gm, r0, lat, lon, r,
+                                                    **kwargs)
+
     # ---- Plotting routines ----
     def plot_spectrum(self, convention='power', unit='per_l', base=10.,
                       xscale='lin', yscale='log', show=True, ax=None,
@@ -1327,9 +1891,10 @@ class SHCoeffs(object):
         """
         # Create the matrix of the spectrum for each coefficient
         spectrum = _np.empty((self.lmax + 1, 2 * self.lmax + 1))
-        mpositive = _np.abs(self.coeffs[0])**2
+        coeffs = self._cilm()
+        mpositive = _np.abs(coeffs[0])**2
         mpositive[~self.mask[0]] = _np.nan
-        mnegative = _np.abs(self.coeffs[1])**2
+        mnegative = _np.abs(coeffs[1])**2
         mnegative[~self.mask[1]] = _np.nan
 
         spectrum[:, :self.lmax] = _np.fliplr(mnegative)[:, :self.lmax]
@@ -1458,9 +2023,9 @@ class SHCoeffs(object):
         x.info()
         """
         print('kind = {:s}\nnormalization = {:s}\n'
-              'csphase = {:d}\nlmax = {:d}'.format(
+              'csphase = {:d}\nlmax = {:d}\nstorage = {:s}'.format(
                   repr(self.kind), repr(self.normalization), self.csphase,
-                  self.lmax))
+                  self.lmax, repr(self.storage)))
 
 
 # ================== REAL SPHERICAL HARMONICS ================
@@ -1473,22 +2038,32 @@ class SHRealCoeffs(SHCoeffs):
         """Test if class is Real or Complex."""
         return kind == 'real'
 
-    def __init__(self, coeffs, normalization='4pi', csphase=1, copy=True):
+    def __init__(self, coeffs, normalization='4pi', csphase=1, copy=True,
+                 storage='full'):
         """Initialize Real SH Coefficients."""
-        lmax = coeffs.shape[1] - 1
-        # ---- create mask to filter out m<=l ----
-        mask = _np.zeros((2, lmax + 1, lmax + 1), dtype=_np.bool)
-        mask[0, 0, 0] = True
-        for l in _np.arange(lmax + 1):
-            mask[:, l, :l + 1] = True
-        mask[1, :, 0] = False
+        if coeffs.ndim == 1:
+            lmax = _lmax_packed(coeffs)
+        else:
+            lmax = coeffs.shape[1] - 1
+        # ---- shared read-only mask to filter out m<=l ----
+        mask = _index_table(lmax, 'mask')
         self.mask = mask
         self.lmax = lmax
         self.kind = 'real'
         self.normalization = normalization
         self.csphase = csphase
+        self.storage = storage
 
-        if copy:
+        if storage == 'packed':
+            if coeffs.ndim != 1:
+                self.coeffs = _pack(coeffs)
+            elif copy:
+                self.coeffs = _np.copy(coeffs)
+            else:
+                self.coeffs = coeffs
+        elif coeffs.ndim == 1:
+            self.coeffs = _unpack(coeffs)
+        elif copy:
             self.coeffs = _np.copy(coeffs)
             self.coeffs[~mask] = 0.
         else:
@@ -1496,25 +2071,14 @@ class SHRealCoeffs(SHCoeffs):
 
     def _make_complex(self):
         """Convert the real SHCoeffs class to the complex class."""
-        rcomplex_coeffs = _shtools.SHrtoc(self.coeffs,
-                                          convention=1, switchcs=0)
-
-        # These coefficients are using real floats, and need to be
-        # converted to complex form.
-        complex_coeffs = _np.zeros((2, self.lmax+1, self.lmax+1),
-                                   dtype='complex')
-        complex_coeffs[0, :, :] = (rcomplex_coeffs[0, :, :] + 1j *
-                                   rcomplex_coeffs[1, :, :])
-        complex_coeffs[1, :, :] = complex_coeffs[0, :, :].conjugate()
-        for m in self.degrees():
-            if m % 2 == 1:
-                complex_coeffs[1, :, m] = - complex_coeffs[1, :, m]
+        complex_coeffs = _real_to_complex(self._cilm())
 
         # complex_coeffs is initialized in this function and can be
         # passed as reference
         return SHCoeffs.from_array(complex_coeffs,
                                    normalization=self.normalization,
-                                   csphase=self.csphase, copy=False)
+                                   csphase=self.csphase, copy=False,
+                                   storage=self.storage)
 
     def _rotate(self, angles, dj_matrix):
         """Rotate the coefficients by the Euler angles alpha, beta, gamma."""
@@ -1533,9 +2097,10 @@ class SHRealCoeffs(SHCoeffs):
                 normalization=self.normalization, csphase=self.csphase)
             return SHCoeffs.from_array(
                 tempcoeffs, normalization=self.normalization,
-                csphase=self.csphase, copy=False)
+                csphase=self.csphase, copy=False, storage=self.storage)
         else:
-            return SHCoeffs.from_array(coeffs, copy=False)
+            return SHCoeffs.from_array(coeffs, copy=False,
+                                       storage=self.storage)
 
     def _expandDH(self, sampling, lmax, lmax_calc):
         """Evaluate the coefficients on a Driscoll and Healy (1994) grid."""
@@ -1553,7 +2118,7 @@ class SHRealCoeffs(SHCoeffs):
                 "'unnorm'. Input value was {:s}"
                 .format(repr(self.normalization)))
 
-        data = _shtools.MakeGridDH(self.coeffs, sampling=sampling, norm=norm,
+        data = _shtools.MakeGridDH(self._cilm(), sampling=sampling, norm=norm,
                                    csphase=self.csphase, lmax=lmax,
                                    lmax_calc=lmax_calc)
         gridout = SHGrid.from_array(data, grid='DH', copy=False)
@@ -1578,7 +2143,7 @@ class SHRealCoeffs(SHCoeffs):
         if zeros is None:
             zeros, weights = _shtools.SHGLQ(self.lmax)
 
-        data = _shtools.MakeGridGLQ(self.coeffs, zeros, norm=norm,
+        data = _shtools.MakeGridGLQ(self._cilm(), zeros, norm=norm,
                                     csphase=self.csphase, lmax=lmax,
                                     lmax_calc=lmax_calc)
         gridout = SHGrid.from_array(data, grid='GLQ', copy=False)
@@ -1612,15 +2177,17 @@ class SHRealCoeffs(SHCoeffs):
                              'Input types are {:s} and {:s}'
                              .format(repr(type(lat)), repr(type(lon))))
 
+        coeffs = self._cilm()
+
         if type(lat) is int or type(lat) is float:
-            return _shtools.MakeGridPoint(self.coeffs, lat=latin, lon=lonin,
+            return _shtools.MakeGridPoint(coeffs, lat=latin, lon=lonin,
                                           lmax=lmax_calc, norm=norm,
                                           csphase=self.csphase)
         elif type(lat) is _np.ndarray:
             values = _np.empty_like(lat, dtype=float)
             for v, latitude, longitude in _np.nditer([values, latin, lonin],
                                                      op_flags=['readwrite']):
-                v[...] = _shtools.MakeGridPoint(self.coeffs, lat=latitude,
+                v[...] = _shtools.MakeGridPoint(coeffs, lat=latitude,
                                                 lon=longitude,
                                                 lmax=lmax_calc, norm=norm,
                                                 csphase=self.csphase)
@@ -1629,7 +2196,7 @@ class SHRealCoeffs(SHCoeffs):
             values = []
             for latitude, longitude in zip(latin, lonin):
                 values.append(
-                    _shtools.MakeGridPoint(self.coeffs, lat=latitude,
+                    _shtools.MakeGridPoint(coeffs, lat=latitude,
                                            lon=longitude,
                                            lmax=lmax_calc, norm=norm,
                                            csphase=self.csphase))
@@ -1651,23 +2218,33 @@ class SHComplexCoeffs(SHCoeffs):
         """Check if class has kind 'real' or 'complex'."""
         return kind == 'complex'
 
-    def __init__(self, coeffs, normalization='4pi', csphase=1, copy=True):
+    def __init__(self, coeffs, normalization='4pi', csphase=1, copy=True,
+                 storage='full'):
         """Initialize Complex coefficients."""
-        lmax = coeffs.shape[1] - 1
-        # ---- create mask to filter out m<=l ----
-        mask = _np.zeros((2, lmax + 1, lmax + 1), dtype=_np.bool)
-        mask[0, 0, 0] = True
-        for l in _np.arange(lmax + 1):
-            mask[:, l, :l + 1] = True
-        mask[1, :, 0] = False
+        if coeffs.ndim == 1:
+            lmax = _lmax_packed(coeffs)
+        else:
+            lmax = coeffs.shape[1] - 1
+        # ---- shared read-only mask to filter out m<=l ----
+        mask = _index_table(lmax, 'mask')
 
         self.mask = mask
         self.lmax = lmax
         self.kind = 'complex'
         self.normalization = normalization
         self.csphase = csphase
+        self.storage = storage
 
-        if copy:
+        if storage == 'packed':
+            if coeffs.ndim != 1:
+                self.coeffs = _pack(coeffs)
+            elif copy:
+                self.coeffs = _np.copy(coeffs)
+            else:
+                self.coeffs = coeffs
+        elif coeffs.ndim == 1:
+            self.coeffs = _unpack(coeffs)
+        elif copy:
             self.coeffs = _np.copy(coeffs)
             self.coeffs[~mask] = 0.
         else:
@@ -1675,44 +2252,16 @@ class SHComplexCoeffs(SHCoeffs):
 
     def _make_real(self, check=True):
         """Convert the complex SHCoeffs class to the real class."""
-        # Test if the coefficients correspond to a real grid.
-        # This is not very elegant, and the equality condition
-        # is probably not robust to round off errors.
-        if check:
-            for l in self.degrees():
-                if self.coeffs[0, l, 0] != self.coeffs[0, l, 0].conjugate():
-                    raise RuntimeError('Complex coefficients do not ' +
-                                       'correspond to a real field. ' +
-                                       'l = {:d}, m = 0: {:e}'
-                                       .format(l, self.coeffs[0, l, 0]))
-                for m in _np.arange(1, l + 1):
-                    if m % 2 == 1:
-                        if (self.coeffs[0, l, m] != -
-                                self.coeffs[1, l, m].conjugate()):
-                            raise RuntimeError('Complex coefficients do not ' +
-                                               'correspond to a real field. ' +
-                                               'l = {:d}, m = {:d}: {:e}, {:e}'
-                                               .format(
-                                                   l, m, self.coeffs[0, l, 0],
-                                                   self.coeffs[1, l, 0]))
-                    else:
-                        if (self.coeffs[0, l, m] !=
-                                self.coeffs[1, l, m].conjugate()):
-                            raise RuntimeError('Complex coefficients do not ' +
-                                               'correspond to a real field. ' +
-                                               'l = {:d}, m = {:d}: {:e}, {:e}'
-                                               .format(
-                                                   l, m, self.coeffs[0, l, 0],
-                                                   self.coeffs[1, l, 0]))
-
-        coeffs_rc = _np.zeros((2, self.lmax + 1, self.lmax + 1))
-        coeffs_rc[0, :, :] = self.coeffs[0, :, :].real
-        coeffs_rc[1, :, :] = self.coeffs[0, :, :].imag
-        real_coeffs = _shtools.SHctor(coeffs_rc, convention=1,
-                                      switchcs=0)
+        # Test if the coefficients correspond to a real grid. The equality
+        # condition is probably not robust to round off errors.
+        real_coeffs = _complex_to_real(self._cilm(), check=check)
+
+        # real_coeffs is initialized in this function and can be
+        # passed as reference
         return SHCoeffs.from_array(real_coeffs,
                                    normalization=self.normalization,
-                                   csphase=self.csphase)
+                                   csphase=self.csphase, copy=False,
+                                   storage=self.storage)
 
     def _rotate(self, angles, dj_matrix):
         """Rotate the coefficients by the Euler angles alpha, beta, gamma."""
@@ -1760,7 +2309,8 @@ class SHComplexCoeffs(SHCoeffs):
 
         return SHCoeffs.from_array(coeffs_rot,
                                    normalization=self.normalization,
-                                   csphase=self.csphase, copy=False)
+                                   csphase=self.csphase, copy=False,
+                                   storage=self.storage)
 
     def _expandDH(self, sampling, lmax, lmax_calc):
         """Evaluate the coefficients on a Driscoll and Healy (1994) grid."""
@@ -1778,7 +2328,7 @@ class SHComplexCoeffs(SHCoeffs):
                 "'unnorm'. Input value was {:s}"
                 .format(repr(self.normalization)))
 
-        data = _shtools.MakeGridDHC(self.coeffs, sampling=sampling,
+        data = _shtools.MakeGridDHC(self._cilm(), sampling=sampling,
                                     norm=norm, csphase=self.csphase, lmax=lmax,
                                     lmax_calc=lmax_calc)
         gridout = SHGrid.from_array(data, grid='DH', copy=False)
@@ -1803,7 +2353,7 @@ class SHComplexCoeffs(SHCoeffs):
         if zeros is None:
             zeros, weights = _shtools.SHGLQ(self.lmax)
 
-        data = _shtools.MakeGridGLQC(self.coeffs, zeros, norm=norm,
+        data = _shtools.MakeGridGLQC(self._cilm(), zeros, norm=norm,
                                      csphase=self.csphase, lmax=lmax,
                                      lmax_calc=lmax_calc)
         gridout = SHGrid.from_array(data, grid='GLQ', copy=False)
@@ -1837,15 +2387,17 @@ class SHComplexCoeffs(SHCoeffs):
                              'Input types are {:s} and {:s}'
                              .format(repr(type(lat)), repr(type(lon))))
 
+        coeffs = self._cilm()
+
         if type(lat) is int or type(lat) is float:
-            return _shtools.MakeGridPointC(self.coeffs, lat=latin, lon=lonin,
+            return _shtools.MakeGridPointC(coeffs, lat=latin, lon=lonin,
                                            lmax=lmax_calc, norm=norm,
                                            csphase=self.csphase)
         elif type(lat) is _np.ndarray:
             values = _np.empty_like(lat, dtype=float)
             for v, latitude, longitude in _np.nditer([values, latin, lonin],
                                                      op_flags=['readwrite']):
-                v[...] = _shtools.MakeGridPointC(self.coeffs, lat=latitude,
+                v[...] = _shtools.MakeGridPointC(coeffs, lat=latitude,
                                                  lon=longitude,
                                                  lmax=lmax_calc, norm=norm,
                                                  csphase=self.csphase)
@@ -1854,7 +2406,7 @@ class SHComplexCoeffs(SHCoeffs):
             values = []
             for latitude, longitude in zip(latin, lonin):
                 values.append(
-                    _shtools.MakeGridPointC(self.coeffs, lat=latitude,
+                    _shtools.MakeGridPointC(coeffs, lat=latitude,
                                             lon=longitude,
                                             lmax=lmax_calc, norm=norm,
                                             csphase=self.csphase))
@@ -1905,6 +2457,8 @@ class SHGrid(object):
                   of the gridded data.
     expand()    : Expand the grid into spherical harmonics.
     copy()      : Return a copy of the class instance.
+    lazy()      : Return a deferred expression of the gridded data for fused
+                  element-wise arithmetic.
     plot()      : Plot the raw data using a simple cylindrical projection.
     plot3d()    : Plot the raw data on a 3d sphere.
     info()      : Print a summary of the data stored in the SHGrid instance.
@@ -2052,151 +2606,204 @@ class SHGrid(object):
                              'Input value is {:s}'.format(binary))
 
     # ---- Mathematical operators ----
-    def __add__(self, other):
-        """Add two similar grids or a grid and a scaler: self + other."""
-        if isinstance(other, SHGrid):
-            if (self.grid == other.grid and self.data.shape ==
-                    other.data.shape and self.kind == other.kind):
-                data = self.data + other.data
-                return SHGrid.from_array(data, grid=self.grid)
+    def _operate(self, other, operator, errmsg, reverse=False, out=None):
+        """
+        Apply an element-wise binary operator to the data of self and other,
+        where other is either a similar grid or a scalar. If reverse is True,
+        the operands are exchanged. If out is None, return a new class
+        instance, otherwise write the result to the data of out and return
+        out.
+        """
+        if isinstance(other, _SHExpression):
+            return NotImplemented
+        elif isinstance(other, SHGrid):
+            if self._compatible(other):
+                operand = other.data
             else:
                 raise ValueError('The two grids must be of the ' +
                                  'same kind and have the same shape.')
         elif _np.isscalar(other) is True:
             if self.kind == 'real' and _np.iscomplexobj(other):
-                raise ValueError('Can not add a complex constant to a ' +
-                                 'real grid.')
-            data = self.data + other
-            return SHGrid.from_array(data, grid=self.grid)
+                raise ValueError(errmsg)
+            operand = other
         else:
             raise NotImplementedError('Mathematical operator not implemented' +
                                       'for these operands.')
 
+        if reverse:
+            args = (operand, self.data)
+        else:
+            args = (self.data, operand)
+
+        if out is None:
+            return self._new(operator(*args))
+        else:
+            operator(*args, out=out.data)
+            return out
+
+    def __add__(self, other):
+        """Add two similar grids or a grid and a scaler: self + other."""
+        return self._operate(other, _np.add, 'Can not add a complex ' +
+                             'constant to a real grid.')
+
     def __radd__(self, other):
         """Add two similar grids or a grid and a scaler: self + other."""
         return self.__add__(other)
 
+    def __iadd__(self, other):
+        """
+        Add two similar grids or a grid and a scaler in-place: self += other.
+        """
+        return self._operate(other, _np.add, 'Can not add a complex ' +
+                             'constant to a real grid.', out=self)
+
     def __sub__(self, other):
         """Subtract two similar grids or a grid and a scaler: self - other."""
-        if isinstance(other, SHGrid):
-            if (self.grid == other.grid and self.data.shape ==
-                    other.data.shape and self.kind == other.kind):
-                data = self.data - other.data
-                return SHGrid.from_array(data, grid=self.grid)
-            else:
-                raise ValueError('The two grids must be of the ' +
-                                 'same kind and have the same shape.')
-        elif _np.isscalar(other) is True:
-            if self.kind == 'real' and _np.iscomplexobj(other):
-                raise ValueError('Can not subtract a complex constant from ' +
-                                 'a real grid.')
-            data = self.data - other
-            return SHGrid.from_array(data, grid=self.grid)
-        else:
-            raise NotImplementedError('Mathematical operator not implemented' +
-                                      'for these operands.')
+        return self._operate(other, _np.subtract, 'Can not subtract a ' +
+                             'complex constant from a real grid.')
 
     def __rsub__(self, other):
         """Subtract two similar grids or a grid and a scaler: other - self."""
-        if isinstance(other, SHGrid):
-            if (self.grid == other.grid and self.data.shape ==
-                    other.data.shape and self.kind == other.kind):
-                data = other.data - self.data
-                return SHGrid.from_array(data, grid=self.grid)
-            else:
-                raise ValueError('The two grids must be of the ' +
-                                 'same kind and have the same shape.')
-        elif _np.isscalar(other) is True:
-            if self.kind == 'real' and _np.iscomplexobj(other):
-                raise ValueError('Can not subtract a complex constant from ' +
-                                 'a real grid.')
-            data = other - self.data
-            return SHGrid.from_array(data, grid=self.grid)
-        else:
-            raise NotImplementedError('Mathematical operator not implemented' +
-                                      'for these operands.')
+        return self._operate(other, _np.subtract, 'Can not subtract a ' +
+                             'complex constant from a real grid.',
+                             reverse=True)
+
+    def __isub__(self, other):
+        """
+        Subtract two similar grids or a grid and a scaler in-place:
+        self -= other.
+        """
+        return self._operate(other, _np.subtract, 'Can not subtract a ' +
+                             'complex constant from a real grid.', out=self)
 
     def __mul__(self, other):
         """Multiply two similar grids or a grid and a scaler: self * other."""
-        if isinstance(other, SHGrid):
-            if (self.grid == other.grid and self.data.shape ==
-                    other.data.shape and self.kind == other.kind):
-                data = self.data * other.data
-                return SHGrid.from_array(data, grid=self.grid)
-            else:
-                raise ValueError('The two grids must be of the ' +
-                                 'same kind and have the same shape.')
-        elif _np.isscalar(other) is True:
-            if self.kind == 'real' and _np.iscomplexobj(other):
-                raise ValueError('Can not multiply a real grid by a complex ' +
-                                 'constant.')
-            data = self.data * other
-            return SHGrid.from_array(data, grid=self.grid)
-        else:
-            raise NotImplementedError('Mathematical operator not implemented' +
-                                      'for these operands.')
+        return self._operate(other, _np.multiply, 'Can not multiply a real ' +
+                             'grid by a complex constant.')
 
     def __rmul__(self, other):
         """Multiply two similar grids or a grid and a scaler: other * self."""
         return self.__mul__(other)
 
+    def __imul__(self, other):
+        """
+        Multiply two similar grids or a grid and a scaler in-place:
+        self *= other.
+        """
+        return self._operate(other, _np.multiply, 'Can not multiply a real ' +
+                             'grid by a complex constant.', out=self)
+
     def __div__(self, other):
         """
         Divide two similar grids or a grid and a scalar, when
         __future__.division is not in effect.
         """
-        if isinstance(other, SHGrid):
-            if (self.grid == other.grid and self.data.shape ==
-                    other.data.shape and self.kind == other.kind):
-                data = self.data / other.data
-                return SHGrid.from_array(data, grid=self.grid)
-            else:
-                raise ValueError('The two grids must be of the ' +
-                                 'same kind and have the same shape.')
-        elif _np.isscalar(other) is True:
-            if self.kind == 'real' and _np.iscomplexobj(other):
-                raise ValueError('Can not divide a real grid by a complex ' +
-                                 'constant.')
-            data = self.data / other
-            return SHGrid.from_array(data, grid=self.grid)
-        else:
-            raise NotImplementedError('Mathematical operator not implemented' +
-                                      'for these operands.')
+        return self._operate(other, _np.true_divide, 'Can not divide a real ' +
+                             'grid by a complex constant.')
 
     def __truediv__(self, other):
         """
         Divide two similar grids or a grid and a scalar, when
         __future__.division is in effect.
         """
-        if isinstance(other, SHGrid):
-            if (self.grid == other.grid and self.data.shape ==
-                    other.data.shape and self.kind == other.kind):
-                data = self.data / other.data
-                return SHGrid.from_array(data, grid=self.grid)
-            else:
-                raise ValueError('The two grids must be of the ' +
-                                 'same kind and have the same shape.')
-        elif _np.isscalar(other) is True:
-            if self.kind == 'real' and _np.iscomplexobj(other):
-                raise ValueError('Can not divide a real grid by a complex ' +
-                                 'constant.')
-            data = self.data / other
-            return SHGrid.from_array(data, grid=self.grid)
+        return self._operate(other, _np.true_divide, 'Can not divide a real ' +
+                             'grid by a complex constant.')
+
+    def __idiv__(self, other):
+        """
+        Divide two similar grids or a grid and a scalar in-place, when
+        __future__.division is not in effect.
+        """
+        return self._operate(other, _np.true_divide, 'Can not divide a real ' +
+                             'grid by a complex constant.', out=self)
+
+    def __itruediv__(self, other):
+        """
+        Divide two similar grids or a grid and a scalar in-place, when
+        __future__.division is in effect.
+        """
+        return self._operate(other, _np.true_divide, 'Can not divide a real ' +
+                             'grid by a complex constant.', out=self)
+
+    def __pow__(self, other):
+        """Raise a grid to a scalar power: pow(self, other)."""
+        if _np.isscalar(other) is True:
+            return self._new(pow(self.data, other))
         else:
             raise NotImplementedError('Mathematical operator not implemented' +
                                       'for these operands.')
 
-    def __pow__(self, other):
-        """Raise a grid to a scalar power: pow(self, other)."""
+    def __ipow__(self, other):
+        """Raise a grid to a scalar power in-place: self **= other."""
         if _np.isscalar(other) is True:
-            return SHGrid.from_array(pow(self.data, other), grid=self.grid)
+            return self._operate(other, _np.power, 'Can not raise a real ' +
+                                 'grid to a complex power.', out=self)
         else:
             raise NotImplementedError('Mathematical operator not implemented' +
                                       'for these operands.')
 
     def __abs__(self):
         """Return the absolute value of the gridded data."""
-        return SHGrid.from_array(abs(self.data), grid=self.grid)
+        return self._new(abs(self.data))
+
+    def lazy(self):
+        """
+        Return a deferred expression of the gridded data for fused
+        element-wise arithmetic.
+
+        Usage
+        -----
+        e = x.lazy()
+
+        Returns
+        -------
+        e : SHExpression class instance
+            An expression that consists only of the gridded data of x.
+
+        Description
+        -----------
+        Arithmetic operations with the returned expression are not computed
+        immediately, but are recorded in a new expression. When the method
+        evaluate() of the expression is called, the entire chain of
+        operations is computed in a single pass over the data and a new
+        SHGrid class instance is returned, or, if the optional parameter out
+        is specified, the result is written to the data of an existing class
+        instance. As an example,
+
+            y = (a * x.lazy() + b * z.lazy() - c).evaluate()
+
+        does not create any temporary arrays with the size of the grid. The
+        operands must be compatible with x. To compute a single operation
+        in-place, use the in-place operators +=, -=, *=, /= and **=.
+        """
+        return _SHExpression(self)
+
+    def _compatible(self, other):
+        """
+        Return True if other is an SHGrid class instance of the same kind and
+        grid type and with the same shape as self.
+        """
+        return (isinstance(other, SHGrid) and self.grid == other.grid and
+                self.data.shape == other.data.shape and
+                self.kind == other.kind)
+
+    def _new(self, data):
+        """
+        Return a new class instance that references data and that uses the
+        grid type of self.
+        """
+        if _np.iscomplexobj(data):
+            kind = 'complex'
+        else:
+            kind = 'real'
+
+        for cls in SHGrid.__subclasses__():
+            if cls.istype(kind) and cls.isgrid(self.grid):
+                if self.grid == 'GLQ':
+                    return cls(data, zeros=self.zeros, weights=self.weights,
+                               copy=False)
+                else:
+                    return cls(data, copy=False)
 
     # ---- Extract grid properties ----
     def lats(self, degrees=True):
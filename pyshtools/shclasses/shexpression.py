@@ -0,0 +1,270 @@
+"""
+    Deferred element-wise arithmetic for the SHCoeffs and SHGrid classes
+
+        SHExpression
+"""
+from __future__ import absolute_import as _absolute_import
+from __future__ import division as _division
+from __future__ import print_function as _print_function
+
+import numpy as _np
+
+
+# Number of elements that are computed at once when evaluating an expression.
+_BLOCKSIZE = 2**16
+
+
+class SHExpression(object):
+    """
+    Deferred element-wise expression of SHCoeffs or SHGrid class instances.
+
+    An expression is initialized by calling the method lazy() of an SHCoeffs
+    or SHGrid class instance:
+
+        e = x.lazy()
+
+    Arithmetic operations on an expression (+, -, *, /, unary -, and ** with
+    a scalar exponent) are not computed immediately, but are recorded and
+    return a new expression. The operands can be other expressions, SHCoeffs
+    or SHGrid class instances that are compatible with x, or scalars. When the
+    expression is evaluated, the entire chain of operations is computed in a
+    single pass over the data, block by block, without allocating temporary
+    arrays that have the size of the data:
+
+        y = (a * x.lazy() + b * z.lazy() - c).evaluate()
+
+    For SHCoeffs class instances, all operands must be of the same kind and
+    have the same lmax, normalization and csphase. The returned class instance
+    uses the storage form of the left-most operand. For SHGrid class
+    instances, all operands must be of the same kind and grid type and have
+    the same shape.
+
+    Each class instance provides the following methods:
+
+    evaluate()  : Compute the expression and return an SHCoeffs or SHGrid
+                  class instance.
+    """
+
+    def __init__(self, instance):
+        """
+        Initialize an expression that consists of a single SHCoeffs or SHGrid
+        class instance. Use the method lazy() of these classes instead.
+        """
+        self._template = instance
+        self._op = None
+        self._args = ()
+
+    @classmethod
+    def _node(self, template, op, args):
+        """Return an expression that applies the ufunc op to args."""
+        node = self.__new__(self)
+        node._template = template
+        node._op = op
+        node._args = tuple(args)
+        return node
+
+    # ---- Build the expression ----
+    def _operand(self, other):
+        """
+        Check that other can be combined with the expression and return it as
+        an expression or a scalar.
+        """
+        if isinstance(other, SHExpression):
+            instance = other._template
+        elif _np.isscalar(other) is True:
+            if self._template.kind == 'real' and _np.iscomplexobj(other):
+                raise ValueError('Can not use a complex constant in an ' +
+                                 'expression of real data.')
+            return other
+        elif hasattr(other, 'lazy'):
+            instance = other
+            other = other.lazy()
+        else:
+            raise NotImplementedError('Mathematical operator not implemented' +
+                                      'for these operands.')
+
+        if not self._template._compatible(instance):
+            raise ValueError('All operands of an expression must be of the ' +
+                             'same class and kind, and have the same ' +
+                             'dimensions and conventions.')
+        return other
+
+    def __add__(self, other):
+        """Record the operation self + other."""
+        return SHExpression._node(self._template, _np.add,
+                                  (self, self._operand(other)))
+
+    def __radd__(self, other):
+        """Record the operation other + self."""
+        return SHExpression._node(self._template, _np.add,
+                                  (self._operand(other), self))
+
+    def __sub__(self, other):
+        """Record the operation self - other."""
+        return SHExpression._node(self._template, _np.subtract,
+                                  (self, self._operand(other)))
+
+    def __rsub__(self, other):
+        """Record the operation other - self."""
+        return SHExpression._node(self._template, _np.subtract,
+                                  (self._operand(other), self))
+
+    def __mul__(self, other):
+        """Record the operation self * other."""
+        return SHExpression._node(self._template, _np.multiply,
+                                  (self, self._operand(other)))
+
+    def __rmul__(self, other):
+        """Record the operation other * self."""
+        return SHExpression._node(self._template, _np.multiply,
+                                  (self._operand(other), self))
+
+    def __div__(self, other):
+        """Record the operation self / other."""
+        return SHExpression._node(self._template, _np.true_divide,
+                                  (self, self._operand(other)))
+
+    def __truediv__(self, other):
+        """Record the operation self / other."""
+        return SHExpression._node(self._template, _np.true_divide,
+                                  (self, self._operand(other)))
+
+    def __rdiv__(self, other):
+        """Record the operation other / self."""
+        return SHExpression._node(self._template, _np.true_divide,
+                                  (self._operand(other), self))
+
+    def __rtruediv__(self, other):
+        """Record the operation other / self."""
+        return SHExpression._node(self._template, _np.true_divide,
+                                  (self._operand(other), self))
+
+    def __pow__(self, other):
+        """Record the operation pow(self, other) for a scalar other."""
+        if _np.isscalar(other) is True:
+            return SHExpression._node(self._template, _np.power,
+                                      (self, self._operand(other)))
+        else:
+            raise NotImplementedError('Mathematical operator not implemented' +
+                                      'for these operands.')
+
+    def __neg__(self):
+        """Record the operation -self."""
+        return SHExpression._node(self._template, _np.negative, (self,))
+
+    # ---- Evaluate the expression ----
+    def evaluate(self, out=None):
+        """
+        Compute the expression and return the result as an SHCoeffs or SHGrid
+        class instance.
+
+        Usage
+        -----
+        y = e.evaluate([out])
+
+        Returns
+        -------
+        y : SHCoeffs or SHGrid class instance
+            The result of the expression. If out is specified, this is out.
+
+        Parameters
+        ----------
+        out : SHCoeffs or SHGrid class instance, optional, default = None
+            If specified, the result is written to the data of out, which must
+            be compatible with the operands of the expression and have the
+            same storage form and data type as the result. out may be one of
+            the operands of the expression.
+
+        Description
+        -----------
+        The expression is evaluated in blocks of consecutive elements. For
+        each block, the operations are computed one after another using small
+        work arrays, and the result is written directly to the output. The
+        data are thus read and written only once, and the memory requirements
+        do not depend on the number of operations in the expression.
+        """
+        template = self._template
+        coeffs = hasattr(template, 'coeffs')
+        if coeffs and template.storage == 'full':
+            mask = template.mask.reshape(-1)
+        else:
+            mask = None
+
+        leaves = {}
+        scalars = []
+        internal = []
+        self._collect(leaves, scalars, internal)
+        for key, node in leaves.items():
+            if coeffs and template.storage == 'packed':
+                array = node._template._packed()
+            elif coeffs:
+                array = node._template._cilm()
+            else:
+                array = node._template.data
+            leaves[key] = _np.ravel(array)
+
+        dtype = _np.result_type(1., *(list(leaves.values()) + scalars))
+        shape = template.coeffs.shape if coeffs else template.data.shape
+
+        if out is None:
+            data = _np.zeros(shape, dtype=dtype)
+        else:
+            if not template._compatible(out) or (
+                    coeffs and out.storage != template.storage):
+                raise ValueError('out must be compatible with the operands ' +
+                                 'of the expression and have the same ' +
+                                 'storage form.')
+            data = out.coeffs if coeffs else out.data
+            if data.dtype != dtype:
+                raise ValueError('The data type of out must be {:s}. '
+                                 .format(repr(dtype.name)) +
+                                 'Input data type is {:s}.'
+                                 .format(repr(data.dtype.name)))
+            if not data.flags.c_contiguous:
+                raise ValueError('The data of out must be C-contiguous.')
+
+        flat = data.reshape(-1)
+        buffers = dict((key, _np.empty(min(_BLOCKSIZE, flat.size),
+                                       dtype=dtype)) for key in internal)
+
+        for start in range(0, flat.size, _BLOCKSIZE):
+            stop = min(start + _BLOCKSIZE, flat.size)
+            where = True if mask is None else mask[start:stop]
+            self._compute(slice(start, stop), flat[start:stop], where,
+                          leaves, buffers)
+
+        if out is None:
+            return template._new(data)
+        else:
+            return out
+
+    def _collect(self, leaves, scalars, internal):
+        """Gather the leaves, scalars and operation nodes of the expression."""
+        if self._op is None:
+            leaves[id(self)] = self
+            return
+        if id(self) not in internal:
+            internal.append(id(self))
+        for arg in self._args:
+            if isinstance(arg, SHExpression):
+                arg._collect(leaves, scalars, internal)
+            else:
+                scalars.append(arg)
+
+    def _compute(self, block, out, where, leaves, buffers):
+        """Compute a block of the expression and write it to out."""
+        if self._op is None:
+            _np.copyto(out, leaves[id(self)][block], where=where)
+            return out
+
+        n = out.size
+        args = []
+        for arg in self._args:
+            if not isinstance(arg, SHExpression):
+                args.append(arg)
+            elif arg._op is None:
+                args.append(leaves[id(arg)][block])
+            else:
+                args.append(arg._compute(block, buffers[id(arg)][:n], where,
+                                         leaves, buffers))
+        return self._op(*args, out=out, where=where)
@@ -12,9 +12,16 @@ import numpy as _np
 import matplotlib as _mpl
 import matplotlib.pyplot as _plt
 import copy as _copy
+import multiprocessing as _multiprocessing
+import os as _os
+import hashlib as _hashlib
+import tempfile as _tempfile
+import shutil as _shutil
+from collections import OrderedDict as _OrderedDict
 
 from .. import shtools as _shtools
-from ..spectralanalysis import spectrum as _spectrum
+from ..spectralanalysis import mt_coupling_matrix as _mt_coupling_matrix
+from ..spectralanalysis import return_tapers_map as _return_tapers_map
 
 from .shcoeffsgrid import SHCoeffs
 from .shcoeffsgrid import SHGrid
@@ -23,6 +30,326 @@ from .shcoeffsgrid import SHGrid
 __all__ = ['SHWindow', 'SHWindowCap', 'SHWindowMask']
 
 
+def _cap_taper_coeffs(tapers, orders, itaper):
+    """
+    Return the spherical harmonic coefficients of the unrotated spherical-cap
+    taper i as an array, where i = 0 is the best concentrated.
+    """
+    lwin = tapers.shape[0] - 1
+    taperm = orders[itaper]
+    coeffs = _np.zeros((2, lwin + 1, lwin + 1))
+    if taperm < 0:
+        coeffs[1, :, abs(taperm)] = tapers[:, itaper]
+    else:
+        coeffs[0, :, abs(taperm)] = tapers[:, itaper]
+
+    return coeffs
+
+
+def _rotate_cap_tapers(tapers, orders, nrot, clat, clon, coord_degrees,
+                       dj_matrix, ncols=None):
+    """
+    Return an array of dimension ((lwin+1)**2, ncols) whose first nrot columns
+    contain the spherical harmonic coefficients of the spherical-cap tapers
+    rotated to clat and clon, ordered according to the convention in
+    SHCilmToVector.
+    """
+    lwin = tapers.shape[0] - 1
+    if ncols is None:
+        ncols = nrot
+    coeffs = _np.zeros(((lwin + 1)**2, ncols))
+
+    if coord_degrees:
+        angles = _np.radians(_np.array([0., -(90. - clat), -clon]))
+    else:
+        angles = _np.array([0., -(_np.pi/2. - clat), -clon])
+
+    north = ((coord_degrees is True and clat == 90. and clon == 0.) or
+             (coord_degrees is False and clat == _np.pi/2. and clon == 0.))
+
+    for i in range(nrot):
+        cilm = _cap_taper_coeffs(tapers, orders, i)
+        if not north:
+            cilm = _shtools.SHRotateRealCoef(cilm, angles, dj_matrix)
+        coeffs[:, i] = _shtools.SHCilmToVector(cilm)
+
+    return coeffs
+
+
+# Data shared by the workers of SHWindowCap.spectrum_map().
+_spectrum_map_state = {}
+
+
+def _spectrum_map_init(state):
+    """Initialize a worker of SHWindowCap.spectrum_map()."""
+    _spectrum_map_state.clear()
+    _spectrum_map_state.update(state)
+
+
+def _spectrum_map_center(center, state=None):
+    """
+    Return the multitaper spectrum estimate and standard error for the
+    spherical-cap tapers rotated to center = (clat, clon).
+    """
+    if state is None:
+        state = _spectrum_map_state
+
+    tapers = _rotate_cap_tapers(state['tapers'], state['orders'], state['k'],
+                                center[0], center[1], state['coord_degrees'],
+                                state['dj_matrix'])
+
+    if state['taper_wt'] is None:
+        return _shtools.SHMultiTaperMaskSE(state['sh'], tapers,
+                                           lmax=state['lmax'], k=state['k'])
+    else:
+        return _shtools.SHMultiTaperMaskSE(state['sh'], tapers,
+                                           lmax=state['lmax'], k=state['k'],
+                                           taper_wt=state['taper_wt'])
+
+
+def _map_centers(function, init, state, centers, nprocs=None):
+    """
+    Return the list of outputs of function(center) for each of the centers,
+    using a pool of nprocs worker processes that are initialized with state.
+    """
+    if nprocs == 1 or len(centers) == 1:
+        return [function(center, state) for center in centers]
+
+    if nprocs is None:
+        nprocs = _multiprocessing.cpu_count()
+    pool = _multiprocessing.Pool(processes=nprocs, initializer=init,
+                                 initargs=(state, ))
+    try:
+        chunksize = max(1, len(centers) // (4 * nprocs))
+        return pool.map(function, list(centers), chunksize=chunksize)
+    finally:
+        pool.close()
+        pool.join()
+
+
+# Data shared by the workers of SHWindowCap.admitcorr_map().
+_admitcorr_map_state = {}
+
+
+def _admitcorr_map_init(state):
+    """Initialize a worker of SHWindowCap.admitcorr_map()."""
+    _admitcorr_map_state.clear()
+    _admitcorr_map_state.update(state)
+
+
+def _admitcorr_map_center(center, state=None):
+    """
+    Return the localized power spectra of g and t, and their localized
+    cross-power spectrum, for each of the spherical-cap tapers rotated to
+    center = (clat, clon). The output array has shape (3, k, lmax-lwin+1).
+    """
+    if state is None:
+        state = _admitcorr_map_state
+
+    k = state['k']
+    lwin = state['tapers'].shape[0] - 1
+    lmax = state['lmax']
+    zeros, weights = state['zeros'], state['weights']
+    tapers = _rotate_cap_tapers(state['tapers'], state['orders'], k,
+                                center[0], center[1], state['coord_degrees'],
+                                state['dj_matrix'])
+
+    spectra = _np.empty((3, k, lmax - lwin + 1))
+    for i in range(k):
+        window = _shtools.MakeGridGLQ(_shtools.SHVectorToCilm(tapers[:, i]),
+                                      zeros, lmax=lmax+lwin)
+        shloc_g = _shtools.SHExpandGLQ(state['grid_g'] * window, weights,
+                                       zeros, lmax_calc=lmax-lwin)
+        shloc_t = _shtools.SHExpandGLQ(state['grid_t'] * window, weights,
+                                       zeros, lmax_calc=lmax-lwin)
+        spectra[0, i] = (shloc_g**2).sum(axis=(0, 2))
+        spectra[1, i] = (shloc_t**2).sum(axis=(0, 2))
+        spectra[2, i] = (shloc_g * shloc_t).sum(axis=(0, 2))
+
+    return spectra
+
+
+def _admitcorr_stats(sgg, stt, sgt, taper_wt=None, mtdef=1, k1linsig=False):
+    """
+    Return the admittance, correlation and their uncertainties from the
+    localized spectra sgg, stt and sgt of shape (..., k, nl), following the
+    conventions of SHLocalizedAdmitCorr.
+    """
+    k = sgg.shape[-2]
+    degree_l = _np.arange(sgg.shape[-1])
+
+    if mtdef == 1:
+        def _mean_se(s):
+            if taper_wt is None:
+                mean = s.mean(axis=-2)
+                if k == 1:
+                    return mean, _np.zeros_like(mean)
+                se = ((s - mean[..., _np.newaxis, :])**2).sum(axis=-2) / \
+                    (k - 1) / k
+            else:
+                mean = _np.einsum('...il,i->...l', s, taper_wt) / \
+                    taper_wt.sum()
+                if k == 1:
+                    return mean, _np.zeros_like(mean)
+                factor = (taper_wt.sum()**2 - (taper_wt**2).sum()) * \
+                    taper_wt.sum()
+                factor = (taper_wt**2).sum() / factor
+                se = _np.einsum('...il,i->...l',
+                                (s - mean[..., _np.newaxis, :])**2,
+                                taper_wt) * factor
+            return mean, _np.sqrt(se)
+
+        gg, gg_sd = _mean_se(sgg)
+        tt, tt_sd = _mean_se(stt)
+        gt, gt_sd = _mean_se(sgt)
+
+        admit = gt / tt
+        corr = gt / _np.sqrt(tt * gg)
+        if k > 1:
+            admit_error = _np.sqrt((gt_sd / tt)**2 + (gt / tt**2 * tt_sd)**2)
+            corr_error = _np.sqrt(gt_sd**2 / tt / gg +
+                                  (gt * tt_sd / _np.sqrt(gg) / 2. /
+                                   tt**1.5)**2 +
+                                  (gt * gg_sd / _np.sqrt(tt) / 2. /
+                                   gg**1.5)**2)
+    else:
+        admit_k = sgt / stt
+        corr_k = sgt / _np.sqrt(stt) / _np.sqrt(sgg)
+        admit = admit_k.mean(axis=-2)
+        corr = corr_k.mean(axis=-2)
+        if k > 1:
+            admit_error = _np.sqrt(
+                ((admit_k - admit[..., _np.newaxis, :])**2).sum(axis=-2) /
+                (k - 1) / k)
+            corr_error = _np.sqrt(
+                ((corr_k - corr[..., _np.newaxis, :])**2).sum(axis=-2) /
+                (k - 1) / k)
+        gg, tt = sgg[..., 0, :], stt[..., 0, :]
+
+    if k == 1:
+        admit_error = _np.zeros_like(admit)
+        corr_error = _np.zeros_like(corr)
+        if k1linsig:
+            admit_error[..., 1:] = _np.sqrt(
+                gg[..., 1:] * (1. - corr[..., 1:]**2) /
+                (tt[..., 1:] * 2. * degree_l[1:]))
+
+    return admit, corr, admit_error, corr_error
+
+
+# Maximum number of coupling matrices that are stored by each SHWindow
+# class instance.
+_coupling_cache_size = 8
+
+# Environment variable that specifies the directory of the taper cache.
+_TAPER_CACHE_ENV = 'PYSHTOOLS_TAPER_CACHE'
+
+
+def _taper_cache_dir(cache):
+    """
+    Return the directory of the persistent taper cache, or None if the cache
+    is not used.
+    """
+    if cache is None:
+        cache = _os.environ.get(_TAPER_CACHE_ENV) or False
+    if cache is False:
+        return None
+    if not _os.path.isdir(cache):
+        _os.makedirs(cache)
+    return cache
+
+
+def _taper_cache_key(kind, params, array=None):
+    """
+    Return a hash of the parameters, and optionally of the content of an
+    array, that is used as the name of an entry of the taper cache.
+    """
+    sha = _hashlib.sha1(repr((kind, params)).encode('utf-8'))
+    if array is not None:
+        array = _np.asarray(array)
+        sha.update(repr((array.dtype.str, array.shape)).encode('utf-8'))
+        # The values are hashed exactly, such that masks with values other
+        # than 0 and 1 never share an entry.
+        sha.update(_np.ascontiguousarray(array, dtype=_np.float64).tobytes())
+    return kind + '-' + sha.hexdigest()
+
+
+def _taper_cache_load(cache, key, names):
+    """
+    Return the memory-mapped arrays of an entry of the taper cache, or None
+    if the entry does not exist.
+    """
+    entry = _os.path.join(cache, key)
+    if not _os.path.isdir(entry):
+        return None
+    return [_np.asarray(_np.load(_os.path.join(entry, name + '.npy'),
+                                 mmap_mode='r')) for name in names]
+
+
+def _taper_cache_save(cache, key, names, arrays):
+    """
+    Save arrays as a new entry of the taper cache and return them memory
+    mapped. The entry is written to a temporary directory that is then
+    renamed, such that concurrent jobs never read incomplete entries.
+    """
+    tmp = _tempfile.mkdtemp(prefix='.' + key, dir=cache)
+    try:
+        for name, array in zip(names, arrays):
+            _np.save(_os.path.join(tmp, name + '.npy'), array)
+        _os.rename(tmp, _os.path.join(cache, key))
+    except OSError:
+        # Another job saved the same entry first.
+        _shutil.rmtree(tmp, ignore_errors=True)
+    return _taper_cache_load(cache, key, names)
+
+
+def _multitaper_spectrum_stack(sh, tapers, lmax, k, taper_wt=None):
+    """
+    Return the multitaper spectrum estimates and standard errors of a stack
+    of 4pi-normalized coefficient arrays sh of shape (n, 2, lmax+1, lmax+1)
+    using the first k tapers, ordered according to SHCilmToVector.
+    """
+    lwin = int(round(_np.sqrt(tapers.shape[0]))) - 1
+    lmaxmul = lmax + lwin
+    zeros, weights = _shtools.SHGLQ(lmaxmul)
+
+    # The grids of the tapers are computed only once for all functions.
+    taper_grids = [_shtools.MakeGridGLQ(_shtools.SHVectorToCilm(tapers[:, i]),
+                                        zeros, lmax=lmaxmul)
+                   for i in range(k)]
+
+    se = _np.empty((len(sh), k, lmax - lwin + 1))
+    for j in range(len(sh)):
+        grid = _shtools.MakeGridGLQ(sh[j], zeros, lmax=lmaxmul,
+                                    lmax_calc=lmax)
+        for i in range(k):
+            # Only the degrees 0 to lmax-lwin of the product are used.
+            shloc = _shtools.SHExpandGLQ(grid * taper_grids[i], weights,
+                                         zeros, lmax_calc=lmax-lwin)
+            se[j, i] = (shloc**2).sum(axis=(0, 2))
+
+    if taper_wt is None:
+        mtse = se.mean(axis=1)
+        if k > 1:
+            sd = _np.sqrt(((se - mtse[:, _np.newaxis])**2).sum(axis=1) /
+                          (k - 1) / k)
+        else:
+            sd = _np.zeros_like(mtse)
+    else:
+        taper_wt = _np.asarray(taper_wt, dtype=_np.float64)[:k]
+        mtse = _np.einsum('jil,i->jl', se, taper_wt) / taper_wt.sum()
+        if k > 1:
+            factor = (taper_wt.sum()**2 - (taper_wt**2).sum()) * taper_wt.sum()
+            factor = (taper_wt**2).sum() / factor
+            sd = _np.sqrt(_np.einsum('jil,i->jl',
+                                     (se - mtse[:, _np.newaxis])**2,
+                                     taper_wt) * factor)
+        else:
+            sd = _np.zeros_like(mtse)
+
+    return mtse, sd
+
+
 class SHWindow(object):
     """
     Class for spatio-spectral localization windows on the sphere.
@@ -83,6 +410,12 @@ class SHWindow(object):
                             at the north pole, to clat and clon and save the
                             spherical harmonic coefficients in the attribute
                             coeffs.
+    spectrum_map()        : Return the multitaper spectrum estimates and
+                            standard errors for spherical-cap windows
+                            centered at each of a list of coordinates.
+    admitcorr_map()       : Return the localized admittance and correlation
+                            of two functions for spherical-cap windows
+                            centered at each point of a grid of coordinates.
     coupling_matrix()     : Return the coupling matrix of the first nwin
                             localization windows.
     biased_spectrum()     : Calculate the multitaper (cross-) spectrum
@@ -111,14 +444,15 @@ class SHWindow(object):
     @classmethod
     def from_cap(cls, theta, lwin, clat=None, clon=None, nwin=None,
                  theta_degrees=True, coord_degrees=True, dj_matrix=None,
-                 weights=None):
+                 weights=None, cache=None):
         """
         Construct spherical cap localization windows.
 
         Usage
         -----
         x = SHWindow.from_cap(theta, lwin, [clat, clon, nwin, theta_degrees,
-                                            coord_degrees, dj_matrix, weights])
+                                            coord_degrees, dj_matrix, weights,
+                                            cache])
 
         Returns
         -------
@@ -144,27 +478,47 @@ class SHWindow(object):
             The djpi2 rotation matrix computed by a call to djpi2.
         weights : ndarray, optional, default = None
             Taper weights used with the multitaper spectral analyses.
+        cache : str or bool, optional, default = None
+            Directory of a persistent cache of tapers. If the tapers for the
+            same theta and lwin have already been computed, they are
+            memory mapped from the cache instead of being recomputed, and
+            otherwise they are saved in the cache. If None, the directory
+            given by the environment variable PYSHTOOLS_TAPER_CACHE is used
+            when it is set. If False, the cache is not used.
         """
         if theta_degrees:
-            tapers, eigenvalues, taper_order = _shtools.SHReturnTapers(
-                _np.radians(theta), lwin)
+            theta_radians = _np.radians(theta)
         else:
-            tapers, eigenvalues, taper_order = _shtools.SHReturnTapers(
-                theta, lwin)
+            theta_radians = theta
+
+        names = ('tapers', 'eigenvalues', 'taper_order')
+        cache = _taper_cache_dir(cache)
+        if cache is not None:
+            key = _taper_cache_key('cap', (float(theta_radians), int(lwin)))
+            arrays = _taper_cache_load(cache, key, names)
+
+        if cache is None or arrays is None:
+            arrays = _shtools.SHReturnTapers(theta_radians, lwin)
+            if cache is not None:
+                arrays = _taper_cache_save(cache, key, names, arrays)
+
+        tapers, eigenvalues, taper_order = arrays
 
         return SHWindowCap(theta, tapers, eigenvalues, taper_order,
                            clat, clon, nwin, theta_degrees, coord_degrees,
                            dj_matrix, weights, copy=False)
 
     @classmethod
-    def from_mask(cls, dh_mask, lwin, nwin=None, weights=None):
+    def from_mask(cls, dh_mask, lwin, nwin=None, weights=None,
+                  method='dense', cache=None):
         """
         Construct localization windows that are optimally concentrated within
         the region specified by a mask.
 
         Usage
         -----
-        x = SHWindow.from_mask(dh_mask, lwin, [nwin, weights])
+        x = SHWindow.from_mask(dh_mask, lwin, [nwin, weights, method,
+                                               cache])
 
         Returns
         -------
@@ -185,8 +539,33 @@ class SHWindow(object):
             return.
         weights ndarray, optional, default = None
             Taper weights used with the multitaper spectral analyses.
+        method : str, optional, default = 'dense'
+            The method used to compute the windows. 'dense' computes the full
+            space-concentration kernel and all of its eigenvalues with
+            SHReturnTapersMap. 'lanczos' and 'lobpcg' compute only the nwin
+            best-concentrated windows with an iterative eigensolver that
+            never forms the kernel (see return_tapers_map), which is much
+            faster and requires much less memory when nwin is small.
+            'gaunt' computes the full kernel from the spherical harmonic
+            expansion of the mask (see compute_dmap), which is much faster
+            than SHReturnTapersMap and gives the same windows.
+        cache : str or bool, optional, default = None
+            Directory of a persistent cache of tapers. If the tapers for the
+            same mask, lwin, nwin and method have already been computed, they
+            are memory mapped from the cache instead of being recomputed, and
+            otherwise they are saved in the cache. If None, the directory
+            given by the environment variable PYSHTOOLS_TAPER_CACHE is used
+            when it is set. If False, the cache is not used.
         """
+        if method not in ('dense', 'lanczos', 'lobpcg', 'gaunt'):
+            raise ValueError("method must be 'dense', 'lanczos', " +
+                             "'lobpcg' or 'gaunt'. Input value is {:s}."
+                             .format(repr(method)))
+
         if nwin is None:
+            if method in ('lanczos', 'lobpcg'):
+                raise ValueError('nwin must be specified when method is ' +
+                                 '{:s}.'.format(repr(method)))
             nwin = (lwin + 1)**2
         else:
             if nwin > (lwin + 1)**2:
@@ -204,8 +583,25 @@ class SHWindow(object):
                              '(n, 2 * n). Input shape is ({:d}, {:d})'
                              .format(dh_mask.shape[0], dh_mask.shape[1]))
 
-        tapers, eigenvalues = _shtools.SHReturnTapersMap(dh_mask, lwin,
-                                                         ntapers=nwin)
+        names = ('tapers', 'eigenvalues')
+        cache = _taper_cache_dir(cache)
+        if cache is not None:
+            key = _taper_cache_key('mask', (int(lwin), int(nwin), method),
+                                   array=dh_mask)
+            arrays = _taper_cache_load(cache, key, names)
+            if arrays is not None:
+                return SHWindowMask(arrays[0], arrays[1], weights, copy=False)
+
+        if method == 'dense':
+            tapers, eigenvalues = _shtools.SHReturnTapersMap(dh_mask, lwin,
+                                                             ntapers=nwin)
+        else:
+            tapers, eigenvalues = _return_tapers_map(dh_mask, lwin, nwin,
+                                                     method=method)
+
+        if cache is not None:
+            tapers, eigenvalues = _taper_cache_save(cache, key, names,
+                                                    (tapers, eigenvalues))
         return SHWindowMask(tapers, eigenvalues, weights, copy=False)
 
     def copy(self):
@@ -413,19 +809,25 @@ class SHWindow(object):
 
         Returns
         -------
-        mtse : ndarray, shape (lmax-lwin+1)
+        mtse : ndarray, shape (lmax-lwin+1) or (n, lmax-lwin+1)
             The localized multitaper spectrum estimate, where lmax is the
             spherical-harmonic bandwidth of clm, and lwin is the
-            spherical-harmonic bandwidth of the localization windows.
-        sd : ndarray, shape (lmax-lwin+1)
+            spherical-harmonic bandwidth of the localization windows. If clm
+            is a stack of n functions, the spectrum estimate of each function
+            is given in a row.
+        sd : ndarray, shape (lmax-lwin+1) or (n, lmax-lwin+1)
             The standard error of the localized multitaper spectrum
             estimate.
 
         Parameters
         ----------
-        clm : SHCoeffs class instance
+        clm : SHCoeffs class instance, list of SHCoeffs, or ndarray
             SHCoeffs class instance containing the spherical harmonic
-            coefficients of the global field to analyze.
+            coefficients of the global field to analyze. Alternatively, a
+            stack of n global fields can be given as a list of real SHCoeffs
+            class instances, or as an array of shape (n, 2, lmax+1, lmax+1)
+            of real 4pi-normalized coefficients that exclude the
+            Condon-Shortley phase.
         k : int
             The number of tapers to be utilized in performing the multitaper
             spectral analysis.
@@ -447,9 +849,22 @@ class SHWindow(object):
             localization windows.
         coord_degrees : bool, optional, default = True
             True if clat and clon are in degrees.
+
+        Description
+        -----------
+        When a stack of functions is given, the grids of the tapers are
+        computed only once, each function is expanded on a grid only once,
+        and the product of each function with each taper is expanded only up
+        to degree lmax-lwin. The results are the same as those obtained by
+        calling this method for each function separately.
         """
-        return self._multitaper_spectrum(clm, k, convention=convention,
-                                         unit=unit, **kwargs)
+        if isinstance(clm, SHCoeffs):
+            return self._multitaper_spectrum(clm, k, convention=convention,
+                                             unit=unit, **kwargs)
+        else:
+            return self._multitaper_spectrum_batch(clm, k,
+                                                   convention=convention,
+                                                   unit=unit, **kwargs)
 
     def multitaper_cross_spectrum(self, clm, slm, k, convention='power',
                                   unit='per_l', **kwargs):
@@ -546,10 +961,9 @@ class SHWindow(object):
         taper_wt : ndarray, optional, default = None
             The weights used in calculating the multitaper spectral estimates
             and standard error.
-        save_cg : int, optional, default = 0
-            If 1, the Clebsch-Gordon coefficients will be precomputed and saved
-            for future use. If 0, the Clebsch-Gordon coefficients will be
-            recomputed for each call.
+        save_cg : int, optional, default = None
+            Unused. The Wigner 3j symbols are always taken from a cached table
+            that is computed only once for each lmax and lwin.
         ldata : int, optional, default = len(power)-1
             The maximum degree of the global unwindowed spectrum.
         """
@@ -618,24 +1032,42 @@ class SHWindow(object):
         spectrum(l, 'per_l')*l*log(a).
 
          """
+        if convention.lower() not in ('power', 'energy', 'l2norm'):
+            raise ValueError("convention must be 'power', 'energy', or " +
+                             "'l2norm'. Input value was {:s}"
+                             .format(repr(convention)))
+
+        if unit.lower() not in ('per_l', 'per_lm', 'per_dlogl'):
+            raise ValueError("unit must be 'per_l', 'per_lm', or " +
+                             "'per_dlogl'. Input value was {:s}"
+                             .format(repr(unit)))
+
         if itaper is None:
             if nwin is None:
                 nwin = self.nwin
-            spectra = _np.zeros((self.lwin+1, nwin))
-
-            for iwin in range(nwin):
-                coeffs = self.to_array(iwin)
-                spectra[:, iwin] = _spectrum(coeffs, normalization='4pi',
-                                             convention=convention, unit=unit,
-                                             base=base)
+            spectra = _np.array(self._tapers_power(nwin))
         else:
-            coeffs = self.to_array(itaper)
-            spectra = _spectrum(coeffs, normalization='4pi',
-                                convention=convention, unit=unit, base=base)
+            spectra = _np.array(self._tapers_power(itaper + 1)[:, itaper])
+
+        # The conversions are those of spectrum() for 4pi-normalized
+        # coefficients, for which the l2norm spectrum is the power spectrum.
+        if convention.lower() == 'l2norm':
+            return spectra
+        elif convention.lower() == 'energy':
+            spectra *= 4. * _np.pi
+
+        degrees = self.degrees()
+        if spectra.ndim == 2:
+            degrees = degrees[:, _np.newaxis]
+        if unit.lower() == 'per_lm':
+            spectra /= (2. * degrees + 1.)
+        elif unit.lower() == 'per_dlogl':
+            spectra *= degrees * _np.log(base)
 
         return spectra
 
-    def coupling_matrix(self, lmax, nwin=None, weights=None, mode='full'):
+    def coupling_matrix(self, lmax, nwin=None, weights=None, mode='full',
+                        copy=True):
         """
         Return the coupling matrix of the first nwin tapers. This matrix
         relates the global power spectrum to the expectation of the localized
@@ -643,7 +1075,7 @@ class SHWindow(object):
 
         Usage
         -----
-        Mmt = x.coupling_matrix(lmax, [nwin, weights, mode])
+        Mmt = x.coupling_matrix(lmax, [nwin, weights, mode, copy])
 
         Returns
         -------
@@ -667,6 +1099,16 @@ class SHWindow(object):
             'valid' returns a biased spectrum with size lmax-lwin+1. This
             returns only that part of the biased spectrum that is not
             influenced by the input spectrum beyond degree lmax.
+        copy : bool, optional, default = True
+            If True, return a new array. If False, return a read-only view of
+            the matrix that is stored by the class instance.
+
+        Description
+        -----------
+        The class instance stores the most recently computed coupling
+        matrices, which are returned for repeated calls with the same lmax,
+        nwin and weights, and which are also used by biased_spectrum(). The
+        stored matrices are discarded when the attribute tapers is replaced.
         """
         if weights is not None:
             if nwin is not None:
@@ -683,19 +1125,24 @@ class SHWindow(object):
                                                                   self.nwin))
 
         if mode == 'full':
-            return self._coupling_matrix(lmax, nwin=nwin, weights=weights)
+            cmatrix = self._coupling_matrix(lmax, nwin=nwin, weights=weights)
         elif mode == 'same':
             cmatrix = self._coupling_matrix(lmax, nwin=nwin,
                                             weights=weights)
-            return cmatrix[:lmax+1, :]
+            cmatrix = cmatrix[:lmax+1, :]
         elif mode == 'valid':
             cmatrix = self._coupling_matrix(lmax, nwin=nwin,
                                             weights=weights)
-            return cmatrix[:lmax - self.lwin+1, :]
+            cmatrix = cmatrix[:lmax - self.lwin+1, :]
         else:
             raise ValueError("mode has to be 'full', 'same' or 'valid', not "
                              "{}".format(mode))
 
+        if copy:
+            return _np.copy(cmatrix)
+        else:
+            return cmatrix
+
     def plot_windows(self, nwin, lmax=None, maxcolumns=5,
                      tick_interval=[60, 45], xlabel='longitude',
                      ylabel='latitude', show=True, ax=None, legend=True,
@@ -991,6 +1438,157 @@ class SHWindow(object):
         """
         self._info()
 
+    def _clear_cache(self):
+        """Clear the quantities that are derived from the tapers."""
+        self._cache_tapers = self.tapers
+        self._power = None
+        self._coupling = _OrderedDict()
+
+    def _check_cache(self):
+        """Clear the cached quantities if the tapers have been replaced."""
+        if self._cache_tapers is not self.tapers:
+            self._clear_cache()
+
+    def _tapers_power(self, k):
+        """
+        Return the power spectra of the first k tapers. The spectra of all
+        tapers are computed only once and are shared by spectra(),
+        coupling_matrix() and biased_spectrum().
+        """
+        self._check_cache()
+        if self._power is None:
+            self._power = self._taper_power_spectra()
+            self._power.setflags(write=False)
+        return self._power[:, :k]
+
+    def _window_power(self, k, weights=None):
+        """
+        Return the average power spectrum of the first k tapers, weighted by
+        weights if specified.
+        """
+        tapers_power = self._tapers_power(k)
+        if weights is None:
+            return tapers_power.sum(axis=1) / k
+        else:
+            return _np.dot(tapers_power, _np.asarray(weights)[:k])
+
+    def _coupling_matrix(self, lmax, nwin=None, weights=None):
+        """Return the coupling matrix of the first nwin tapers."""
+        if nwin is None:
+            nwin = self.nwin
+
+        if weights is None:
+            weights = self.weights
+
+        return self._cached_coupling_matrix(lmax, nwin, weights)
+
+    def _cached_coupling_matrix(self, lmax, k, weights=None):
+        """
+        Return a read-only coupling matrix of the first k tapers, using equal
+        weights if weights is None. The most recently computed matrices are
+        stored and are returned for repeated calls with the same lmax, k and
+        weights.
+        """
+        self._check_cache()
+        if weights is None:
+            key = (lmax, k, None)
+        else:
+            weights = _np.ascontiguousarray(weights[:k], dtype=_np.float64)
+            key = (lmax, k, _hashlib.sha1(weights.tobytes()).hexdigest())
+
+        mmt = self._coupling.get(key)
+        if mmt is not None:
+            return mmt
+
+        mmt = _mt_coupling_matrix(self._window_power(k, weights), lmax)
+        mmt.setflags(write=False)
+        self._coupling[key] = mmt
+        while len(self._coupling) > _coupling_cache_size:
+            self._coupling.popitem(last=False)
+        return mmt
+
+    def _biased_spectrum(self, spectrum, k, convention='power', unit='per_l',
+                         taper_wt=None, save_cg=None, ldata=None):
+        """
+        Calculate the multitaper (cross-) spectrum expectation of a localized
+        function.
+        """
+        # The equation is not modified if the in- and out- spectra are power
+        # or energy. However, the convention can not be l2norm, which depends
+        # upon the normalization of the coefficients.
+        if (convention != 'power' and convention != 'energy'):
+            raise ValueError(
+                "convention must be 'power' or 'energy'." +
+                "Input value was {:s}".format(repr(convention)))
+
+        if ldata is None:
+            ldata = len(spectrum) - 1
+        spectrum = _np.asarray(spectrum, dtype=_np.float64)[:ldata+1]
+
+        if (unit == 'per_l'):
+            pass
+        elif (unit == 'per_lm'):
+            spectrum = spectrum * (2.0 * _np.arange(ldata+1) + 1.0)
+        else:
+            raise ValueError(
+                "unit must be 'per_l' or 'per_lm'." +
+                "Input value was {:s}".format(repr(unit)))
+
+        # The Wigner 3j symbols are taken from a cached table, such that
+        # save_cg is no longer needed.
+        mmt = self._cached_coupling_matrix(ldata, k, taper_wt)
+        outspectrum = _np.dot(mmt, spectrum)
+
+        if (unit == 'per_lm'):
+            outspectrum /= (2.0 * _np.arange(len(outspectrum)) + 1.0)
+
+        return outspectrum
+
+    def _multitaper_spectrum_batch(self, clms, k, convention='power',
+                                   unit='per_l', lmax=None, taper_wt=None,
+                                   **kwargs):
+        """
+        Return the multitaper spectrum estimates and standard errors for a
+        stack of global functions.
+        """
+        if (convention != 'power' and convention != 'energy'):
+            raise ValueError(
+                "convention must be 'power' or 'energy'." +
+                "Input value was {:s}".format(repr(convention)))
+        if (unit != 'per_l' and unit != 'per_lm'):
+            raise ValueError(
+                "unit must be 'per_l' or 'per_lm'." +
+                "Input value was {:s}".format(repr(unit)))
+
+        if isinstance(clms, _np.ndarray):
+            if clms.ndim != 4 or clms.shape[1] != 2:
+                raise ValueError('The stack of coefficients must be ' +
+                                 'dimensioned as (n, 2, lmax+1, lmax+1). ' +
+                                 'Input shape is {:s}.'
+                                 .format(repr(clms.shape)))
+            if lmax is None:
+                lmax = clms.shape[-1] - 1
+            sh = clms[:, :, :lmax+1, :lmax+1]
+        else:
+            if lmax is None:
+                lmax = min(clm.lmax for clm in clms)
+            sh = [clm.to_array(normalization='4pi', csphase=1, lmax=lmax)
+                  for clm in clms]
+
+        mtse, sd = _multitaper_spectrum_stack(
+            sh, self._taper_vectors(k, **kwargs), lmax, k, taper_wt=taper_wt)
+
+        if (unit == 'per_lm'):
+            degree_l = _np.arange(mtse.shape[-1])
+            mtse /= (2.0 * degree_l + 1.0)
+            sd /= (2.0 * degree_l + 1.0)
+
+        if (convention == 'energy'):
+            mtse *= 4.0 * _np.pi
+            sd *= 4.0 * _np.pi
+
+        return mtse, sd
+
 
 class SHWindowCap(SHWindow):
     """Class for localization windows concentrated within a spherical cap."""
@@ -1031,6 +1629,7 @@ class SHWindowCap(SHWindow):
             self.tapers = tapers[:, :self.nwin]
             self.eigenvalues = eigenvalues[:self.nwin]
             self.orders = taper_order[:self.nwin]
+        self._clear_cache()
 
         # If the windows aren't rotated, don't store them.
         if self.clat is None and self.clon is None:
@@ -1045,14 +1644,7 @@ class SHWindowCap(SHWindow):
         Return the spherical harmonic coefficients of the unrotated taper i
         as an array, where i = 0 is the best concentrated.
         """
-        taperm = self.orders[itaper]
-        coeffs = _np.zeros((2, self.lwin + 1, self.lwin + 1))
-        if taperm < 0:
-            coeffs[1, :, abs(taperm)] = self.tapers[:, itaper]
-        else:
-            coeffs[0, :, abs(taperm)] = self.tapers[:, itaper]
-
-        return coeffs
+        return _cap_taper_coeffs(self.tapers, self.orders, itaper)
 
     def _to_array(self, itaper, normalization='4pi', csphase=1):
         """
@@ -1114,7 +1706,6 @@ class SHWindowCap(SHWindow):
         column of coeffs contains a single window, and is ordered according to
         the convention in SHCilmToVector.
         """
-        self.coeffs = _np.zeros(((self.lwin + 1)**2, self.nwin))
         self.clat = clat
         self.clon = clon
         self.coord_degrees = coord_degrees
@@ -1124,11 +1715,6 @@ class SHWindowCap(SHWindow):
         else:
             self.nwinrot = self.nwin
 
-        if self.coord_degrees:
-            angles = _np.radians(_np.array([0., -(90. - clat), -clon]))
-        else:
-            angles = _np.array([0., -(_np.pi/2. - clat), -clon])
-
         if dj_matrix is None:
             if self.dj_matrix is None:
                 self.dj_matrix = _shtools.djpi2(self.lwin + 1)
@@ -1136,42 +1722,269 @@ class SHWindowCap(SHWindow):
             else:
                 dj_matrix = self.dj_matrix
 
-        for i in range(self.nwinrot):
-            if ((coord_degrees is True and clat == 90. and clon == 0.) or
-                    (coord_degrees is False and clat == _np.pi/2. and
-                     clon == 0.)):
-                coeffs = self._taper2coeffs(i)
-                self.coeffs[:, i] = _shtools.SHCilmToVector(coeffs)
+        self.coeffs = _rotate_cap_tapers(self.tapers, self.orders,
+                                         self.nwinrot, clat, clon,
+                                         coord_degrees, dj_matrix,
+                                         ncols=self.nwin)
 
-            else:
-                coeffs = _shtools.SHRotateRealCoef(self._taper2coeffs(i),
-                                                   angles, dj_matrix)
-                self.coeffs[:, i] = _shtools.SHCilmToVector(coeffs)
+    def spectrum_map(self, clm, centers, k, convention='power', unit='per_l',
+                     lmax=None, taper_wt=None, coord_degrees=True,
+                     nprocs=None):
+        """
+        Return the multitaper spectrum estimates and standard errors for
+        spherical-cap windows centered at each of a list of coordinates.
 
-    def _coupling_matrix(self, lmax, nwin=None, weights=None):
-        """Return the coupling matrix of the first nwin tapers."""
-        if nwin is None:
-            nwin = self.nwin
+        Usage
+        -----
+        mtse, sd = x.spectrum_map(clm, centers, k, [convention, unit, lmax,
+                                                    taper_wt, coord_degrees,
+                                                    nprocs])
 
-        if weights is None:
-            weights = self.weights
+        Returns
+        -------
+        mtse : ndarray, shape (ncenters, lmax-lwin+1)
+            The localized multitaper spectrum estimates for each center,
+            where lmax is the spherical-harmonic bandwidth of clm, and lwin is
+            the spherical-harmonic bandwidth of the localization windows.
+        sd : ndarray, shape (ncenters, lmax-lwin+1)
+            The standard errors of the localized multitaper spectrum
+            estimates.
 
-        if weights is None:
-            return _shtools.SHMTCouplingMatrix(lmax, self.tapers**2, k=nwin)
-        else:
-            return _shtools.SHMTCouplingMatrix(lmax, self.tapers**2, k=nwin,
-                                               taper_wt=self.weights)
+        Parameters
+        ----------
+        clm : SHCoeffs class instance
+            SHCoeffs class instance containing the spherical harmonic
+            coefficients of the global field to analyze.
+        centers : ndarray, shape (ncenters, 2)
+            Latitudes and longitudes of the centers of the spherical-cap
+            localization windows.
+        k : int
+            The number of tapers to be utilized in performing the multitaper
+            spectral analysis.
+        convention : str, optional, default = 'power'
+            The type of output spectra: 'power' for power spectra, and
+            'energy' for energy spectra.
+        unit : str, optional, default = 'per_l'
+            The units of the output spectra. If 'per_l', the spectra contain
+            the total contribution for each spherical harmonic degree l. If
+            'per_lm', the spectra contain the average contribution for each
+            coefficient at spherical harmonic degree l.
+        lmax : int, optional, default = clm.lmax
+            The maximum spherical-harmonic degree of clm to use.
+        taper_wt : ndarray, optional, default = None
+            1-D numpy array of dimension k of the weights used in calculating
+            the multitaper spectral estimates and standard error.
+        coord_degrees : bool, optional, default = True
+            True if the coordinates of centers are in degrees.
+        nprocs : int, optional, default = None
+            The number of worker processes. If None, the number of CPUs is
+            used. If 1, all centers are computed in the calling process.
 
-    def _multitaper_spectrum(self, clm, k, convention='power', unit='per_l',
-                             clat=None, clon=None, coord_degrees=True,
-                             lmax=None, taper_wt=None):
-        """
-        Return the multitaper spectrum estimate and standard error for an
-        input SHCoeffs class instance.
+        Description
+        -----------
+        For each center, the k best-concentrated tapers are rotated to the
+        center and the multitaper spectrum estimate of clm is computed. In
+        contrast to rotate() and multitaper_spectrum(), the class instance is
+        not modified. The centers are distributed over a pool of worker
+        processes that each receive the unrotated tapers, the djpi2 rotation
+        matrix and the coefficients of clm only once.
         """
+        if k > self.nwin:
+            raise ValueError('k must be less than or equal to nwin. ' +
+                             'k = {:d} and nwin = {:d}.'.format(k, self.nwin))
+
+        if unit not in ('per_l', 'per_lm'):
+            raise ValueError(
+                "unit must be 'per_l' or 'per_lm'." +
+                "Input value was {:s}".format(repr(unit)))
+
+        if convention not in ('power', 'energy'):
+            raise ValueError(
+                "convention must be 'power' or 'energy'." +
+                "Input value was {:s}".format(repr(convention)))
+
+        centers = _np.atleast_2d(_np.asarray(centers, dtype=_np.float64))
+        if centers.ndim != 2 or centers.shape[1] != 2:
+            raise ValueError('centers must be dimensioned as (ncenters, 2). ' +
+                             'Input shape is {:s}.'
+                             .format(repr(centers.shape)))
+
         if lmax is None:
             lmax = clm.lmax
 
+        if self.dj_matrix is None:
+            dj_matrix = _shtools.djpi2(self.lwin + 1)
+        else:
+            dj_matrix = self.dj_matrix
+
+        state = {'tapers': self.tapers[:, :k], 'orders': self.orders[:k],
+                 'k': k, 'lmax': lmax, 'coord_degrees': coord_degrees,
+                 'dj_matrix': dj_matrix,
+                 'sh': clm.to_array(normalization='4pi', csphase=1,
+                                    lmax=lmax),
+                 'taper_wt': None if taper_wt is None else
+                 _np.asarray(taper_wt, dtype=_np.float64)[:k]}
+
+        results = _map_centers(_spectrum_map_center, _spectrum_map_init,
+                               state, centers, nprocs=nprocs)
+
+        mtse = _np.array([result[0] for result in results])
+        sd = _np.array([result[1] for result in results])
+
+        if (unit == 'per_lm'):
+            degree_l = _np.arange(mtse.shape[1])
+            mtse /= (2.0 * degree_l + 1.0)
+            sd /= (2.0 * degree_l + 1.0)
+
+        if (convention == 'energy'):
+            mtse *= 4.0 * _np.pi
+            sd *= 4.0 * _np.pi
+
+        return mtse, sd
+
+    def admitcorr_map(self, gclm, tclm, centers, k, lmax=None, taper_wt=None,
+                      mtdef=1, k1linsig=False, coord_degrees=True,
+                      nprocs=None):
+        """
+        Return the localized admittance and correlation of two functions for
+        spherical-cap windows centered at each point of a grid of coordinates.
+
+        Usage
+        -----
+        admit, corr, admit_error, corr_error = x.admitcorr_map(
+            gclm, tclm, centers, k, [lmax, taper_wt, mtdef, k1linsig,
+                                     coord_degrees, nprocs])
+
+        Returns
+        -------
+        admit : ndarray, shape (..., lmax-lwin+1)
+            The localized admittance Sgt/Stt for each center, where the
+            leading dimensions are those of the grid of centers, lmax is the
+            maximum spherical-harmonic degree of the input functions, and lwin
+            is the spherical-harmonic bandwidth of the localization windows.
+        corr : ndarray, shape (..., lmax-lwin+1)
+            The localized degree correlation Sgt/sqrt(Sgg Stt) for each
+            center.
+        admit_error : ndarray, shape (..., lmax-lwin+1)
+            The uncertainty of the admittance. This is zero when k is 1,
+            unless k1linsig is True.
+        corr_error : ndarray, shape (..., lmax-lwin+1)
+            The uncertainty of the correlation. This is zero when k is 1.
+
+        Parameters
+        ----------
+        gclm : SHCoeffs class instance
+            SHCoeffs class instance containing the spherical harmonic
+            coefficients of the function g, such as the gravity field.
+        tclm : SHCoeffs class instance
+            SHCoeffs class instance containing the spherical harmonic
+            coefficients of the function t, such as the topography.
+        centers : ndarray, shape (..., 2)
+            Latitudes and longitudes of the centers of the spherical-cap
+            localization windows. The leading dimensions are arbitrary, such
+            that a grid of centers of shape (nlat, nlon, 2) gives output
+            arrays of shape (nlat, nlon, lmax-lwin+1).
+        k : int
+            The number of tapers to be utilized in performing the multitaper
+            spectral analysis.
+        lmax : int, optional, default = min(gclm.lmax, tclm.lmax)
+            The maximum spherical-harmonic degree of gclm and tclm to use.
+        taper_wt : ndarray, optional, default = None
+            1-D numpy array of dimension k of the weights used in calculating
+            the multitaper spectral estimates. This can only be used when
+            mtdef is 1.
+        mtdef : int, optional, default = 1
+            1: Calculate the multitaper spectral estimates, and use these to
+            compute a single admittance and correlation. 2: Compute the
+            admittance and correlation for each taper, and average these to
+            obtain the admittance, correlation and their uncertainties.
+        k1linsig : bool, optional, default = False
+            If True and k is 1, the uncertainty of the admittance is computed
+            by assuming that g and t are linearly related, and that any lack
+            of correlation is the result of uncorrelated noise.
+        coord_degrees : bool, optional, default = True
+            True if the coordinates of centers are in degrees.
+        nprocs : int, optional, default = None
+            The number of worker processes. If None, the number of CPUs is
+            used. If 1, all centers are computed in the calling process.
+
+        Description
+        -----------
+        This method returns the same quantities as the function
+        SHLocalizedAdmitCorr evaluated at each of the centers, but the work
+        that does not depend on the center is performed only once: the
+        Gauss-Legendre quadrature grids of g and t and the djpi2 rotation
+        matrix are computed once and are sent to each worker process together
+        with the unrotated tapers. For each center, the tapers are rotated,
+        the localized power and cross-power spectra are computed, and the
+        admittances, correlations and uncertainties are then computed for all
+        centers at once. The class instance is not modified.
+        """
+        if k > self.nwin:
+            raise ValueError('k must be less than or equal to nwin. ' +
+                             'k = {:d} and nwin = {:d}.'.format(k, self.nwin))
+
+        if mtdef not in (1, 2):
+            raise ValueError('mtdef must be 1 or 2. ' +
+                             'Input value was {:s}.'.format(repr(mtdef)))
+
+        if mtdef == 2 and taper_wt is not None:
+            raise ValueError('taper_wt can only be used when mtdef is 1.')
+
+        centers = _np.asarray(centers, dtype=_np.float64)
+        if centers.ndim < 1 or centers.shape[-1] != 2:
+            raise ValueError('centers must be dimensioned as (..., 2). ' +
+                             'Input shape is {:s}.'
+                             .format(repr(centers.shape)))
+
+        if lmax is None:
+            lmax = min(gclm.lmax, tclm.lmax)
+        if lmax > min(gclm.lmax, tclm.lmax) or lmax < self.lwin:
+            raise ValueError('lmax must be greater than or equal to lwin ' +
+                             'and less than or equal to the lmax of gclm ' +
+                             'and tclm. lmax = {:s}, lwin = {:d}.'
+                             .format(repr(lmax), self.lwin))
+
+        if self.dj_matrix is None:
+            dj_matrix = _shtools.djpi2(self.lwin + 1)
+        else:
+            dj_matrix = self.dj_matrix
+
+        if taper_wt is not None:
+            taper_wt = _np.asarray(taper_wt, dtype=_np.float64)[:k]
+
+        # The grids of g and t are the same for all centers.
+        zeros, weights = _shtools.SHGLQ(lmax + self.lwin)
+        grids = [_shtools.MakeGridGLQ(clm.to_array(normalization='4pi',
+                                                   csphase=1, lmax=lmax),
+                                      zeros, lmax=lmax+self.lwin,
+                                      lmax_calc=lmax)
+                 for clm in (gclm, tclm)]
+
+        state = {'tapers': self.tapers[:, :k], 'orders': self.orders[:k],
+                 'k': k, 'lmax': lmax, 'coord_degrees': coord_degrees,
+                 'dj_matrix': dj_matrix, 'zeros': zeros, 'weights': weights,
+                 'grid_g': grids[0], 'grid_t': grids[1]}
+
+        flat = centers.reshape(-1, 2)
+        spectra = _np.array(_map_centers(_admitcorr_map_center,
+                                         _admitcorr_map_init, state, flat,
+                                         nprocs=nprocs))
+        spectra = spectra.reshape(centers.shape[:-1] + spectra.shape[1:])
+
+        return _admitcorr_stats(spectra[..., 0, :, :], spectra[..., 1, :, :],
+                                spectra[..., 2, :, :], taper_wt=taper_wt,
+                                mtdef=mtdef, k1linsig=k1linsig)
+
+    def _taper_power_spectra(self):
+        """Return the power spectra of all tapers."""
+        return self.tapers**2
+
+    def _taper_vectors(self, k, clat=None, clon=None, coord_degrees=True):
+        """
+        Return the coefficients of the first k tapers rotated to clat and
+        clon, ordered according to SHCilmToVector.
+        """
         if (clat is not None and clon is not None and clat == self.clat and
                 clon == self.clon and coord_degrees is self.coord_degrees and
                 k <= self.nwinrot):
@@ -1198,6 +2011,21 @@ class SHWindowCap(SHWindow):
                 self.rotate(clat=clat, clon=clon, coord_degrees=coord_degrees,
                             nwinrot=k)
 
+        return self.coeffs[:, :k]
+
+    def _multitaper_spectrum(self, clm, k, convention='power', unit='per_l',
+                             clat=None, clon=None, coord_degrees=True,
+                             lmax=None, taper_wt=None):
+        """
+        Return the multitaper spectrum estimate and standard error for an
+        input SHCoeffs class instance.
+        """
+        if lmax is None:
+            lmax = clm.lmax
+
+        self._taper_vectors(k, clat=clat, clon=clon,
+                            coord_degrees=coord_degrees)
+
         sh = clm.to_array(normalization='4pi', csphase=1, lmax=lmax)
 
         if taper_wt is None:
@@ -1296,36 +2124,6 @@ class SHWindowCap(SHWindow):
                 "convention must be 'power' or 'energy'." +
                 "Input value was {:s}".format(repr(convention)))
 
-    def _biased_spectrum(self, spectrum, k, convention='power', unit='per_l',
-                         **kwargs):
-        """
-        Calculate the multitaper (cross-) spectrum expectation of a function
-        localized by spherical cap windows.
-        """
-        # The equation is not modified if the in- and out- spectra are power
-        # or energy. However, the convention can not be l2norm, which depends
-        # upon the normalization of the coefficients.
-        if (convention != 'power' and convention != 'energy'):
-            raise ValueError(
-                "convention must be 'power' or 'energy'." +
-                "Input value was {:s}".format(repr(convention)))
-
-        if (unit == 'per_l'):
-            outspectrum = _shtools.SHBiasK(self.tapers, spectrum, k=k,
-                                           **kwargs)
-        elif (unit == 'per_lm'):
-            degree_l = _np.arange(len(spectrum))
-            temp = spectrum * (2.0 * degree_l + 1.0)
-            outspectrum = _shtools.SHBiasK(self.tapers, temp, k=k,
-                                           **kwargs)
-            outspectrum /= (2.0 * degree_l + 1.0)
-        else:
-            raise ValueError(
-                "unit must be 'per_l' or 'per_lm'." +
-                "Input value was {:s}".format(repr(unit)))
-
-        return outspectrum
-
     def _info(self):
         """Print a summary of the data in the SHWindow instance."""
         print('kind = {:s}\n'.format(repr(self.kind)), end='')
@@ -1389,6 +2187,7 @@ class SHWindowMask(SHWindow):
             self.weights = weights
             self.tapers = tapers
             self.eigenvalues = eigenvalues
+        self._clear_cache()
 
     def _to_array(self, itaper, normalization='4pi', csphase=1):
         """
@@ -1410,25 +2209,18 @@ class SHWindowMask(SHWindow):
 
         return coeffs
 
-    def _coupling_matrix(self, lmax, nwin=None, weights=None):
-        """Return the coupling matrix of the first nwin tapers."""
-        if nwin is None:
-            nwin = self.nwin
-
-        if weights is None:
-            weights = self.weights
-
-        tapers_power = _np.zeros((self.lwin+1, nwin))
-        for i in range(nwin):
-            tapers_power[:, i] = _spectrum(self.to_array(i),
-                                           normalization='4pi',
-                                           convention='power', unit='per_l')
+    def _taper_power_spectra(self):
+        """Return the power spectra of all tapers."""
+        # All coefficients of degree l are located in rows l**2 to (l+1)**2-1.
+        return _np.add.reduceat(self.tapers**2, _np.arange(self.lwin + 1)**2,
+                                axis=0)
 
-        if weights is None:
-            return _shtools.SHMTCouplingMatrix(lmax, tapers_power, k=nwin)
-        else:
-            return _shtools.SHMTCouplingMatrix(lmax, tapers_power, k=nwin,
-                                               taper_wt=self.weights)
+    def _taper_vectors(self, k):
+        """
+        Return the coefficients of the first k tapers, ordered according to
+        SHCilmToVector.
+        """
+        return self.tapers[:, :k]
 
     def _multitaper_spectrum(self, clm, k, convention='power', unit='per_l',
                              lmax=None, taper_wt=None):
@@ -1508,36 +2300,6 @@ class SHWindowMask(SHWindow):
                 "convention must be 'power' or 'energy'." +
                 "Input value was {:s}".format(repr(convention)))
 
-    def _biased_spectrum(self, spectrum, k, convention='power', unit='per_l',
-                         **kwargs):
-        """
-        Calculate the multitaper (cross-) spectrum expectation of a function
-        localized by arbitary windows.
-        """
-        # The equation is not modified if the in- and out- spectra are power
-        # or energy. However, the convention can not be l2norm, which depends
-        # upon the normalization of the coefficients.
-        if (convention != 'power' and convention != 'energy'):
-            raise ValueError(
-                "convention must be 'power' or 'energy'." +
-                "Input value was {:s}".format(repr(convention)))
-
-        if (unit == 'per_l'):
-            outspectrum = _shtools.SHBiasKMask(self.tapers, spectrum, k=k,
-                                               **kwargs)
-        elif (unit == 'per_lm'):
-            degree_l = _np.arange(len(spectrum))
-            temp = spectrum * (2.0 * degree_l + 1.0)
-            outspectrum = _shtools.SHBiasKMask(self.tapers, temp, k=k,
-                                               **kwargs)
-            outspectrum /= (2.0 * degree_l + 1.0)
-        else:
-            raise ValueError(
-                "unit must be 'per_l' or 'per_lm'." +
-                "Input value was {:s}".format(repr(unit)))
-
-        return outspectrum
-
     def _info(self):
         """Print a summary of the data in the SHWindow instance."""
         print('kind = {:s}\n'.format(repr(self.kind)), end='')
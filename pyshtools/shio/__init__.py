@@ -36,6 +36,10 @@ convert          Convert an array of spherical harmonic coefficients to a
                  different normalization.
 SHrtoc           Convert real spherical harmonics to complex form.
 SHctor           Convert complex spherical harmonics to real form.
+real_to_complex  Convert real spherical harmonic coefficients to complex form
+                 using vectorized operations.
+complex_to_real  Convert complex spherical harmonic coefficients to real form
+                 using vectorized operations.
 """
 
 from __future__ import absolute_import as _absolute_import
@@ -54,6 +58,8 @@ from ..shtools import SHrtoc
 from ..shtools import SHctor
 
 from .convert import convert
+from .convert_kind import real_to_complex
+from .convert_kind import complex_to_real
 from .shread import shread
 from .icgem import read_icgem_gfc
 from .yilm_index_vector import YilmIndexVector
@@ -0,0 +1,172 @@
+"""
+    Functions for converting spherical harmonic coefficients between real and
+    complex form.
+"""
+from __future__ import absolute_import as _absolute_import
+from __future__ import division as _division
+from __future__ import print_function as _print_function
+
+import numpy as _np
+
+
+def _factors(lmax):
+    """
+    Return the scaling factors of the complex coefficients with respect to the
+    real coefficients and the sign vector (-1)**m, for orders 0 to lmax.
+    """
+    scale = _np.full(lmax + 1, 1. / _np.sqrt(2.))
+    scale[0] = 1.
+    sign = _np.ones(lmax + 1)
+    sign[1::2] = -1.
+    return scale, sign
+
+
+def real_to_complex(coeffs, out=None):
+    """
+    Convert real spherical harmonic coefficients to complex form.
+
+    Usage
+    -----
+    ccoeffs = real_to_complex(coeffs, [out])
+
+    Returns
+    -------
+    ccoeffs : ndarray, shape (..., 2, lmax+1, lmax+1)
+        The complex spherical harmonic coefficients. The first index of the
+        last three dimensions corresponds to positive and negative orders,
+        respectively. If out is specified, this is out.
+
+    Parameters
+    ----------
+    coeffs : ndarray, shape (..., 2, lmax+1, lmax+1)
+        The real spherical harmonic coefficients, or a stack of coefficients
+        where the leading dimensions are arbitrary.
+    out : ndarray, optional, default = None
+        A complex array with the same shape as coeffs where the output is
+        written.
+
+    Description
+    -----------
+    The real coefficients C_lm and S_lm are converted to complex coefficients
+    that use the same normalization and Condon-Shortley phase convention
+    (this corresponds to convention=1 and switchcs=0 in SHrtoc):
+
+        c_lm = (C_lm - i S_lm) / sqrt(2),
+        c_l-m = (-1)**m conj(c_lm),
+
+    for m > 0, and c_l0 = C_l0. In contrast to SHrtoc, the conversion is
+    performed with a few broadcast operations that write directly to the
+    output array, and stacks of coefficients are converted in a single pass.
+    """
+    coeffs = _np.asarray(coeffs)
+    if coeffs.ndim < 3 or coeffs.shape[-3] != 2:
+        raise ValueError('coeffs must be dimensioned as (..., 2, lmax+1, ' +
+                         'lmax+1). Input shape is {:s}.'
+                         .format(repr(coeffs.shape)))
+
+    scale, sign = _factors(coeffs.shape[-1] - 1)
+    if out is None:
+        out = _np.empty(coeffs.shape,
+                        dtype=_np.result_type(coeffs.dtype, _np.complex64))
+    elif out.shape != coeffs.shape or not _np.iscomplexobj(out):
+        raise ValueError('out must be a complex array with the same shape ' +
+                         'as coeffs. Input shape is {:s} and dtype is {:s}.'
+                         .format(repr(out.shape), repr(out.dtype.name)))
+
+    cos = coeffs[..., 0, :, :]
+    sin = coeffs[..., 1, :, :]
+    _np.multiply(cos, scale, out=out[..., 0, :, :].real)
+    _np.multiply(sin, -scale, out=out[..., 0, :, :].imag)
+    _np.multiply(cos, scale * sign, out=out[..., 1, :, :].real)
+    _np.multiply(sin, scale * sign, out=out[..., 1, :, :].imag)
+    out[..., 0, :, 0].imag = 0.
+    out[..., 1, :, 0] = 0.
+    return out
+
+
+def complex_to_real(coeffs, out=None, check=True):
+    """
+    Convert complex spherical harmonic coefficients to real form.
+
+    Usage
+    -----
+    rcoeffs = complex_to_real(coeffs, [out, check])
+
+    Returns
+    -------
+    rcoeffs : ndarray, shape (..., 2, lmax+1, lmax+1)
+        The real spherical harmonic coefficients. If out is specified, this is
+        out.
+
+    Parameters
+    ----------
+    coeffs : ndarray, shape (..., 2, lmax+1, lmax+1)
+        The complex spherical harmonic coefficients, or a stack of
+        coefficients where the leading dimensions are arbitrary. The first
+        index of the last three dimensions corresponds to positive and
+        negative orders, respectively.
+    out : ndarray, optional, default = None
+        A real array with the same shape as coeffs where the output is
+        written.
+    check : bool, optional, default = True
+        If True, raise a RuntimeError if the coefficients do not correspond
+        to a real function, i.e., if c_l0 is not real or if c_l-m is not
+        equal to (-1)**m conj(c_lm).
+
+    Description
+    -----------
+    The complex coefficients are converted to real coefficients that use the
+    same normalization and Condon-Shortley phase convention (this corresponds
+    to convention=1 and switchcs=0 in SHctor):
+
+        C_lm = sqrt(2) Re(c_lm),
+        S_lm = -sqrt(2) Im(c_lm),
+
+    for m > 0, and C_l0 = Re(c_l0). Only the coefficients of positive order
+    are used in the conversion. In contrast to SHctor, the conversion is
+    performed with a few broadcast operations that write directly to the
+    output array, and stacks of coefficients are converted in a single pass.
+    """
+    coeffs = _np.asarray(coeffs)
+    if coeffs.ndim < 3 or coeffs.shape[-3] != 2:
+        raise ValueError('coeffs must be dimensioned as (..., 2, lmax+1, ' +
+                         'lmax+1). Input shape is {:s}.'
+                         .format(repr(coeffs.shape)))
+
+    lmax = coeffs.shape[-1] - 1
+    scale, sign = _factors(lmax)
+    positive = coeffs[..., 0, :, :]
+    negative = coeffs[..., 1, :, :]
+
+    if check:
+        bad = positive[..., :, 0].imag != 0
+        if bad.any():
+            index = _np.argwhere(bad)[0]
+            l = index[-1]
+            raise RuntimeError('Complex coefficients do not ' +
+                               'correspond to a real field. ' +
+                               'l = {:d}, m = 0: {:e}'
+                               .format(l, positive[tuple(index) + (0, )]))
+        bad = negative[..., :, 1:] != sign[1:] * positive[..., :, 1:].conj()
+        bad &= _np.tri(lmax + 1, lmax, k=-1, dtype=bool)
+        if bad.any():
+            index = tuple(_np.argwhere(bad)[0])
+            l, m = index[-2], index[-1] + 1
+            index = index[:-1] + (m, )
+            raise RuntimeError('Complex coefficients do not ' +
+                               'correspond to a real field. ' +
+                               'l = {:d}, m = {:d}: {:e}, {:e}'
+                               .format(l, m, positive[index],
+                                       negative[index]))
+
+    if out is None:
+        out = _np.empty(coeffs.shape, dtype=positive.real.dtype)
+    elif out.shape != coeffs.shape or _np.iscomplexobj(out):
+        raise ValueError('out must be a real array with the same shape as ' +
+                         'coeffs. Input shape is {:s} and dtype is {:s}.'
+                         .format(repr(out.shape), repr(out.dtype.name)))
+
+    _np.divide(positive.real, scale, out=out[..., 0, :, :])
+    _np.divide(positive.imag, -scale, out=out[..., 1, :, :])
+    out[..., 1, :, 0] = 0.
+    return out
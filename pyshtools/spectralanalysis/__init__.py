@@ -62,11 +62,29 @@ ComputeDMap            Compute the space-concentration kernel of a mask
                        defined on the sphere.
 Curve2Mask             Given a set of latitude and longitude coordinates
                        representing a closed curve, output a gridded mask.
+return_tapers_map      Calculate the best-concentrated eigenfunctions of the
+                       concentration problem for an arbitrary region using an
+                       iterative eigensolver.
+concentration_operator Return the space-concentration kernel of a mask as a
+                       matrix-free linear operator.
+compute_dmap           Compute the space-concentration kernel of a mask from
+                       the spherical harmonic expansion of the mask.
 
 Localization Bias (General)
 ---------------------------
 SHBias                 Calculate the (cross-)power spectrum expectation of a
                        windowed function.
+w3j000_table           Return a cached table of the squared Wigner 3j symbols
+                       (i j l; 0 0 0)**2, optionally persisted on disk.
+mt_coupling_matrix     Calculate the multitaper coupling matrix from the power
+                       spectrum of the window using a cached table of Wigner
+                       3j symbols.
+bias_spectrum          Calculate the (cross-)power spectrum expectation of a
+                       windowed function using a cached table of Wigner 3j
+                       symbols.
+mt_debias              Invert for the global power spectrum given one or more
+                       localized multitaper spectrum estimates using a banded
+                       solver.
 
 Other
 -----
@@ -106,3 +124,11 @@ from ..shtools import ComputeDMap
 from ..shtools import Curve2Mask
 from ..shtools import SHBias
 from ..shtools import SphericalCapCoef
+
+from .coupling import w3j000_table
+from .coupling import mt_coupling_matrix
+from .coupling import bias_spectrum
+from .coupling import mt_debias
+from .tapers_map import return_tapers_map
+from .tapers_map import concentration_operator
+from .tapers_map import compute_dmap
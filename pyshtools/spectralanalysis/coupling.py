@@ -0,0 +1,533 @@
+"""
+    Functions for computing multitaper coupling matrices and localization
+    biases from a cached table of squared Wigner 3j symbols, and for inverting
+    localized spectra for the global spectrum.
+"""
+from __future__ import absolute_import as _absolute_import
+from __future__ import division as _division
+from __future__ import print_function as _print_function
+
+import os as _os
+import warnings as _warnings
+import numpy as _np
+import scipy.sparse as _sparse
+from scipy.linalg import solve_banded as _solve_banded
+from scipy.sparse.linalg import LinearOperator as _LinearOperator
+from scipy.sparse.linalg import onenormest as _onenormest
+
+
+# Process-wide cache of squared Wigner 3j tables, keyed by (lmax, lwin).
+_w3j000_cache = {}
+
+
+def _compute_w3j000(lmax, lwin):
+    """
+    Compute the banded table of squared Wigner 3j symbols (i j l; 0 0 0)**2
+    for 0 <= i, j <= lmax and 0 <= l <= lwin.
+    """
+    # log(n!) for n = 0, ..., 2*lmax+lwin+1
+    logfact = _np.zeros(2 * lmax + lwin + 2)
+    logfact[1:] = _np.cumsum(_np.log(_np.arange(1, 2 * lmax + lwin + 2)))
+
+    table = _np.zeros((lwin + 1, lmax + 1, 2 * lwin + 1))
+    i = _np.arange(lmax + 1)[:, _np.newaxis]
+    j = i + _np.arange(-lwin, lwin + 1)[_np.newaxis, :]
+
+    for l in range(lwin + 1):
+        big_j = i + j + l
+        valid = ((j >= 0) & (j <= lmax) & (_np.abs(i - j) <= l) &
+                 (big_j % 2 == 0))
+        ii, jj, jl = _np.broadcast_arrays(i, j, big_j)
+        ii, jj, jl = ii[valid], jj[valid], jl[valid]
+        g = jl // 2
+        table[l][valid] = _np.exp(
+            logfact[jl - 2 * ii] + logfact[jl - 2 * jj] + logfact[jl - 2 * l] -
+            logfact[jl + 1] + 2. * (logfact[g] - logfact[g - ii] -
+                                    logfact[g - jj] - logfact[g - l]))
+
+    return table
+
+
+def w3j000_table(lmax, lwin, path=None):
+    """
+    Return a cached table of the squared Wigner 3j symbols (i j l; 0 0 0)**2.
+
+    Usage
+    -----
+    table = w3j000_table(lmax, lwin, [path])
+
+    Returns
+    -------
+    table : ndarray, shape (lwin+1, lmax+1, 2*lwin+1)
+        The squared Wigner 3j symbols (i j l; 0 0 0)**2 stored as a band
+        matrix: the symbol for degrees i, j and l is table[l, i, j-i+lwin].
+        The table is read-only.
+
+    Parameters
+    ----------
+    lmax : int
+        The maximum degree of i and j.
+    lwin : int
+        The maximum degree of l.
+    path : str, optional, default = None
+        If specified, a directory where the table is saved as a numpy binary
+        file. If the file already exists, the table is memory mapped from the
+        file instead of being computed.
+
+    Description
+    -----------
+    The Wigner 3j symbols (i j l; 0 0 0) are non-zero only when |i-j| <= l
+    and when i+j+l is even. For windows with a bandwidth lwin, the symbols
+    that are needed in the multitaper coupling matrix and the localization
+    bias therefore lie in a band of width 2*lwin+1 about the diagonal i = j,
+    and the table requires O(lwin**2 lmax) memory.
+
+    The symbols are computed from the closed form expression in terms of
+    factorials, and the table is stored in a process-wide cache. Subsequent
+    calls with a smaller lmax or lwin return a view of an existing table,
+    such that the O(lwin**2 lmax) computation is performed only once.
+    """
+    if lmax < 0 or lwin < 0:
+        raise ValueError('lmax and lwin must be non-negative. ' +
+                         'Input values are lmax = {:s} and lwin = {:s}.'
+                         .format(repr(lmax), repr(lwin)))
+
+    for (lmax_c, lwin_c), table in _w3j000_cache.items():
+        if lmax_c >= lmax and lwin_c >= lwin:
+            return table[:lwin+1, :lmax+1, lwin_c-lwin:lwin_c+lwin+1]
+
+    fname = None
+    if path is not None:
+        fname = _os.path.join(path, 'w3j000_lmax{:d}_lwin{:d}.npy'
+                              .format(lmax, lwin))
+
+    if fname is not None and _os.path.isfile(fname):
+        table = _np.load(fname, mmap_mode='r')
+    else:
+        table = _compute_w3j000(lmax, lwin)
+        if fname is not None:
+            _np.save(fname, table)
+        table.setflags(write=False)
+
+    _w3j000_cache[(lmax, lwin)] = table
+    return table
+
+
+def _coupling_band(power, nmax, path=None):
+    """
+    Return the coupling matrix of a window with power spectrum power for
+    degrees 0 to nmax in band form: the element for degrees i and j is
+    band[i, j-i+lwin].
+    """
+    lwin = len(power) - 1
+    table = w3j000_table(nmax, lwin, path=path)
+    band = _np.tensordot(power, table, axes=(0, 0))
+    band *= (2. * _np.arange(nmax + 1) + 1.)[:, _np.newaxis]
+    return band
+
+
+def mt_coupling_matrix(power, lmax, lmax_out=None, path=None):
+    """
+    Return the coupling matrix of a localization window from the power
+    spectrum of the window.
+
+    Usage
+    -----
+    mmt = mt_coupling_matrix(power, lmax, [lmax_out, path])
+
+    Returns
+    -------
+    mmt : ndarray, shape (lmax_out+1, lmax+1)
+        The coupling matrix that relates the global power spectrum (for
+        degrees 0 to lmax) to the expectation of the localized power spectrum
+        (for degrees 0 to lmax_out).
+
+    Parameters
+    ----------
+    power : ndarray, shape (lwin+1)
+        The power spectrum of the localization window. For multitaper
+        spectral estimates, this is the (weighted) average of the power
+        spectra of the tapers.
+    lmax : int
+        The maximum degree of the global power spectrum.
+    lmax_out : int, optional, default = lmax + lwin
+        The maximum degree of the localized power spectrum.
+    path : str, optional, default = None
+        Directory used to store the table of Wigner 3j symbols on disk. See
+        w3j000_table for details.
+
+    Description
+    -----------
+    The elements of the coupling matrix are given by
+
+        mmt[i, j] = (2i+1) sum_l power[l] (i j l; 0 0 0)**2,
+
+    where the Wigner 3j symbols are obtained from w3j000_table. When power is
+    the average of the power spectra of the first k tapers, tapers**2 for
+    spherical-cap tapers, this is identical to the output of
+    SHMTCouplingMatrix. The sums are computed with a single tensor product
+    over the band of non-zero symbols.
+    """
+    power = _np.asarray(power, dtype=_np.float64)
+    lwin = len(power) - 1
+    if lmax_out is None:
+        lmax_out = lmax + lwin
+    band = _coupling_band(power, max(lmax, lmax_out), path=path)
+
+    mmt = _np.zeros((lmax_out + 1, lmax + 1))
+    for d in range(2 * lwin + 1):
+        offset = d - lwin
+        i = _np.arange(max(0, -offset), min(lmax_out, lmax - offset) + 1)
+        mmt[i, i + offset] = band[i, d]
+
+    return mmt
+
+
+def bias_spectrum(power, incspectra, ldata=None, path=None):
+    """
+    Return the expectation of the (cross-)power spectrum of a localized
+    function.
+
+    Usage
+    -----
+    outcspectra = bias_spectrum(power, incspectra, [ldata, path])
+
+    Returns
+    -------
+    outcspectra : ndarray, shape (ldata+lwin+1)
+        The expectation of the localized (cross-)power spectrum.
+
+    Parameters
+    ----------
+    power : ndarray, shape (lwin+1)
+        The power spectrum of the localization window. For multitaper
+        spectral estimates, this is the (weighted) average of the power
+        spectra of the tapers.
+    incspectra : ndarray, shape (ldata+1)
+        The global unwindowed (cross-)power spectrum.
+    ldata : int, optional, default = len(incspectra) - 1
+        The maximum degree of the global spectrum to use.
+    path : str, optional, default = None
+        Directory used to store the table of Wigner 3j symbols on disk. See
+        w3j000_table for details.
+
+    Description
+    -----------
+    The expectation of the localized spectrum is given by the product of the
+    coupling matrix, computed by mt_coupling_matrix, and the global spectrum.
+    This is the same quantity that is returned by SHBias, SHBiasK and
+    SHBiasKMask, but the Wigner 3j symbols are taken from the cached table
+    instead of being recomputed for each call.
+    """
+    incspectra = _np.asarray(incspectra, dtype=_np.float64)
+    if ldata is None:
+        ldata = len(incspectra) - 1
+
+    mmt = mt_coupling_matrix(power, ldata, path=path)
+    return _np.dot(mmt, incspectra[:ldata + 1])
+
+
+def _matrix_band(mmt):
+    """
+    Return a coupling matrix in band form, band[i, j-i+lwin], where lwin is
+    the largest value of |j-i| of the non-zero elements of mmt.
+    """
+    rows, cols = _np.nonzero(mmt)
+    lwin = int(_np.abs(cols - rows).max()) if len(rows) > 0 else 0
+    band = _np.zeros((mmt.shape[0], 2 * lwin + 1))
+    for d in range(2 * lwin + 1):
+        i = _np.arange(max(0, lwin - d),
+                       min(mmt.shape[0], mmt.shape[1] + lwin - d))
+        band[i, d] = mmt[i, i + d - lwin]
+    return band
+
+
+def _debias_system(band, nglobal, nl, sd):
+    """
+    Return the sparse design matrix of the least-squares problem of
+    mt_debias.
+    """
+    m = band.shape[0]
+    lwin = (band.shape[1] - 1) // 2
+    n = -(-m // nl)
+
+    rows, d = _np.indices(band.shape)
+    cols = rows + d - lwin
+    valid = (cols >= 0) & (cols < nglobal) & (band != 0.)
+    rows, cols = rows[valid], cols[valid]
+    # Degrees beyond the last full bin belong to the last bin.
+    bins = _np.minimum(cols // nl, n - 1)
+    return _sparse.coo_matrix((band[valid] / sd[rows], (rows, bins)),
+                              shape=(m, n)).tocsr()
+
+
+def _banded_qr(a, y):
+    """
+    Return the triangular factor R of the QR decomposition of the sparse
+    banded matrix a in the upper band form of scipy.linalg.solve_banded,
+    together with Q^T y.
+
+    Blocks of rows of a are appended to the rows of R that can still be
+    modified by the remaining rows of a, and are reduced by a dense
+    Householder factorization, so that the memory and the work are linear in
+    the number of rows. The diagonal of R is non-negative, and is zero for
+    columns that are not constrained by any row.
+    """
+    m, n = a.shape
+    a = a.tocsr()
+    y = y.reshape(m, -1)
+    nrhs = y.shape[1]
+
+    counts = _np.diff(a.indptr)
+    first = _np.full(m, n)
+    last = _np.full(m, -1)
+    first[counts > 0] = _np.minimum.reduceat(a.indices, a.indptr[:-1])[
+        counts > 0]
+    last[counts > 0] = _np.maximum.reduceat(a.indices, a.indptr[:-1])[
+        counts > 0]
+    # Columns smaller than lowest[i] are not used by the rows i to m-1.
+    lowest = _np.minimum.accumulate(_np.append(first, n)[::-1])[::-1]
+    nblock = max(2 * int((last - first + 1).max()), 32)
+
+    rrows = []
+    pending = _np.zeros((0, nrhs))
+    start = 0
+    stop = 0
+    for i in range(0, m, nblock):
+        j = min(i + nblock, m)
+        stop = max(stop, int(last[i:j].max()) + 1)
+        npending = pending.shape[0]
+        block = _np.zeros((npending + j - i, stop - start + nrhs))
+        block[:npending, :pending.shape[1] - nrhs] = pending[:, :-nrhs]
+        block[:npending, -nrhs:] = pending[:, -nrhs:]
+        block[npending:, :stop - start] = a[i:j, start:stop].toarray()
+        block[npending:, -nrhs:] = y[i:j]
+        r = _np.linalg.qr(block, mode='r')[:stop - start]
+        r = _np.vstack((r, _np.zeros((stop - start - r.shape[0],
+                                      r.shape[1]))))
+
+        done = min(int(lowest[j]), stop) - start
+        rrows.append((start, r[:done]))
+        pending = r[done:, done:]
+        start += done
+
+    u = max([r.shape[1] - nrhs - 1 for col, r in rrows] + [0])
+    ab = _np.zeros((u + 1, n))
+    qty = _np.zeros((n, nrhs))
+    for col, r in rrows:
+        width = r.shape[1] - nrhs
+        sign = _np.where(_np.diag(r[:, :width]) < 0., -1., 1.)
+        r = r * sign[:, _np.newaxis]
+        for k in range(len(r)):
+            offsets = _np.arange(width - k)
+            ab[u - offsets, col + k + offsets] = r[k, k:width]
+        qty[col:col + len(r)] = r[:, width:]
+
+    # Remove the superdiagonals that are zero.
+    nonzero = (ab != 0.).any(axis=1)
+    return ab[_np.argmax(nonzero) if nonzero.any() else u:], qty
+
+
+def _inverse_diagonal(cb):
+    """
+    Return the diagonal of inv(U^T U) for an upper triangular band matrix
+    cb = U in upper band form, such as the Cholesky factor of a band matrix
+    or the triangular factor of the QR decomposition of a, using the
+    recurrence Z[j, i] = (delta_ij / U[j, j] - sum_k U[j, k] Z[k, i]) / U[j, j]
+    for the elements of Z = inv(U^T U) within the band.
+    """
+    u = cb.shape[0] - 1
+    n = cb.shape[1]
+    ub = _np.zeros((u + 1, n + u))
+    ub[:, :n] = cb
+    offsets = _np.arange(1, u + 1)
+
+    diag = _np.empty(n)
+    # The block of Z for the degrees j+1 to j+u.
+    block = _np.zeros((u, u))
+    for j in range(n - 1, -1, -1):
+        row = ub[u - offsets, j + offsets]
+        ujj = ub[u, j]
+        z = -_np.dot(row, block) / ujj
+        diag[j] = (1. / ujj - _np.dot(row, z)) / ujj
+        if u > 0:
+            block[1:, 1:] = block[:-1, :-1].copy()
+            block[0, 1:] = z[:-1]
+            block[1:, 0] = z[:-1]
+            block[0, 0] = diag[j]
+
+    return diag
+
+
+def _condition_number(ab):
+    """
+    Return an estimate of the 1-norm condition number of a triangular matrix
+    in the upper band form of scipy.linalg.solve_banded.
+    """
+    u, n = ab.shape[0] - 1, ab.shape[1]
+    if (ab[u] == 0.).any():
+        return _np.inf
+
+    # The transpose in the lower band form of scipy.linalg.solve_banded.
+    abt = _np.zeros_like(ab)
+    for k in range(u + 1):
+        abt[k, :n - k] = ab[u - k, k:]
+
+    rinv = _LinearOperator((n, n), dtype=_np.float64,
+                           matvec=lambda v: _solve_banded((0, u), ab, v),
+                           rmatvec=lambda v: _solve_banded((u, 0), abt, v))
+    return _np.abs(ab).sum(axis=0).max() * _onenormest(rinv)
+
+
+def _debias_solve(a, y):
+    """
+    Return the least-squares solution of a x = y and the square roots of the
+    diagonal of inv(a^T a). These are computed from the banded QR
+    decomposition of a when a is well conditioned, and from the singular
+    value decomposition of a, as in SHMTDebias, otherwise.
+    """
+    m, n = a.shape
+    y = y.reshape(m, -1)
+    ab, qty = _banded_qr(a, y)
+
+    if _condition_number(ab) < 1. / _np.sqrt(_np.finfo(_np.float64).eps):
+        x = _solve_banded((0, ab.shape[0] - 1), ab, qty)
+        return x, _np.sqrt(_inverse_diagonal(ab))
+
+    uu, ss, vt = _np.linalg.svd(a.toarray(), full_matrices=False)
+    if ss[-1] <= max(m, n) * _np.finfo(_np.float64).eps * ss[0]:
+        _warnings.warn('The least-squares problem is numerically rank ' +
+                       'deficient and the global spectrum is poorly ' +
+                       'constrained. Consider increasing nl.',
+                       RuntimeWarning)
+    x = _np.dot(vt.T, _np.dot(uu.T, y) / ss[:, _np.newaxis])
+    return x, _np.sqrt(_np.sum((vt / ss[:, _np.newaxis])**2, axis=0))
+
+
+def mt_debias(mtspectra, nl, power=None, mmt=None, sd=None, path=None):
+    """
+    Invert for the global power spectrum given one or more localized
+    multitaper spectrum estimates, using the band structure of the coupling
+    matrix.
+
+    Usage
+    -----
+    mtdebias, mtdebias_sd, lmid = mt_debias(mtspectra, nl, [power, mmt, sd,
+                                                            path])
+
+    Returns
+    -------
+    mtdebias : ndarray, shape (..., n)
+        The global power spectrum, assumed to be constant in bins of nl
+        degrees, where n = ceil((lmax+1)/nl) and the leading dimensions are
+        those of mtspectra.
+    mtdebias_sd : ndarray, shape (n) or (..., n)
+        The uncertainty of the global power spectrum. The leading dimensions
+        are those of sd.
+    lmid : ndarray, shape (n)
+        The midpoint spherical harmonic degree of each bin.
+
+    Parameters
+    ----------
+    mtspectra : ndarray, shape (lmax+1) or (..., lmax+1)
+        The localized multitaper spectrum estimate, or a stack of estimates
+        where the leading dimensions are arbitrary.
+    nl : int
+        The global spectrum is assumed to be constant in bins of nl degrees.
+    power : ndarray, shape (lwin+1), optional, default = None
+        The power spectrum of the localization window. For multitaper
+        spectral estimates, this is the (weighted) average of the power
+        spectra of the tapers. The coupling matrix is computed in band form
+        from the cached table of Wigner 3j symbols.
+    mmt : ndarray, shape (lmax+1, lmax+lwin+1), optional, default = None
+        A precomputed coupling matrix that relates the global spectrum for
+        degrees 0 to lmax+lwin to the localized spectrum for degrees 0 to
+        lmax, such as mt_coupling_matrix(power, lmax+lwin, lmax_out=lmax) or
+        SHWindow.coupling_matrix(lmax+lwin, mode='valid'). Exactly one of
+        power and mmt must be specified.
+    sd : ndarray, shape (lmax+1) or (..., lmax+1), optional, default = None
+        The uncertainty of the localized spectra, used to weight the
+        equations of the least-squares problem. If None, all equations have
+        the same weight.
+    path : str, optional, default = None
+        Directory used to store the table of Wigner 3j symbols on disk. See
+        w3j000_table for details.
+
+    Description
+    -----------
+    This routine solves the same least-squares problem as SHMTDebias: the
+    global spectrum is assumed to be constant in bins of nl degrees and
+    beyond lmax, and the equations for each localized degree are divided by
+    their uncertainty. Because the coupling matrix is non-zero only for
+    |i-j| <= lwin, the design matrix is stored as a sparse matrix and its QR
+    decomposition is computed in blocks of rows, which requires O(n) memory
+    instead of the dense O(lmax**2) singular value decomposition of
+    SHMTDebias. The uncertainties are the square roots of the diagonal of
+    inv(A^T A), where A is the design matrix, which are computed from the band
+    of the triangular factor only. The normal equations are never formed, so
+    that the accuracy is governed by the condition number of A and not its
+    square.
+
+    When the estimated condition number of A exceeds 1/sqrt(eps), where eps
+    is the machine precision, as is often the case for nl=1, the solution and
+    uncertainties are instead computed from the dense singular value
+    decomposition of A as in SHMTDebias. A RuntimeWarning is issued when A is
+    numerically rank deficient, in which case the global spectrum is poorly
+    constrained and nl should be increased.
+
+    When sd is None or one-dimensional, a single factorization is used for
+    all localized spectra in mtspectra. When sd has leading dimensions, the
+    system is factorized separately for each spectrum.
+    """
+    if (power is None) == (mmt is None):
+        raise ValueError('Exactly one of power and mmt must be specified.')
+
+    mtspectra = _np.asarray(mtspectra, dtype=_np.float64)
+    if mmt is not None:
+        mmt = _np.asarray(mmt, dtype=_np.float64)
+        if mmt.ndim != 2 or mmt.shape[1] < mmt.shape[0]:
+            raise ValueError('mmt must be dimensioned as (lmax+1, ' +
+                             'lmax+lwin+1). Input shape is {:s}.'
+                             .format(repr(mmt.shape)))
+        m, nglobal = mmt.shape
+        band = _matrix_band(mmt)
+    else:
+        power = _np.asarray(power, dtype=_np.float64)
+        m = mtspectra.shape[-1]
+        nglobal = m + len(power) - 1
+        band = _coupling_band(power, nglobal - 1, path=path)[:m]
+
+    if mtspectra.shape[-1] < m:
+        raise ValueError('mtspectra must be dimensioned as (..., lmax+1), ' +
+                         'where lmax = {:d}. Input shape is {:s}.'
+                         .format(m - 1, repr(mtspectra.shape)))
+    mtspectra = mtspectra[..., :m]
+
+    if sd is None:
+        sd = _np.ones(m)
+    else:
+        sd = _np.asarray(sd, dtype=_np.float64)[..., :m]
+
+    n = -(-m // nl)
+    start = _np.arange(n) * nl
+    stop = _np.append(start[1:] - 1, nglobal - 1)
+    lmid = (start + stop) / 2.
+
+    if sd.ndim == 1:
+        a = _debias_system(band, nglobal, nl, sd)
+        x, mtdebias_sd = _debias_solve(a, (mtspectra / sd).reshape(-1, m).T)
+        mtdebias = x.T.reshape(mtspectra.shape[:-1] + (n, ))
+        return mtdebias, mtdebias_sd, lmid
+
+    shape = _np.broadcast(mtspectra, sd).shape
+    mtspectra = _np.broadcast_to(mtspectra, shape).reshape(-1, m)
+    sd = _np.broadcast_to(sd, shape).reshape(-1, m)
+    mtdebias = _np.empty((len(sd), n))
+    mtdebias_sd = _np.empty((len(sd), n))
+    for i in range(len(sd)):
+        a = _debias_system(band, nglobal, nl, sd[i])
+        x, mtdebias_sd[i] = _debias_solve(a, mtspectra[i] / sd[i])
+        mtdebias[i] = x[:, 0]
+
+    return (mtdebias.reshape(shape[:-1] + (n, )),
+            mtdebias_sd.reshape(shape[:-1] + (n, )), lmid)
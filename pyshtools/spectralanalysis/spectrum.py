@@ -20,13 +20,16 @@ def spectrum(clm, normalization='4pi', degrees=None, lmax=None,
 
     Parameters
     ----------
-    clm : ndarray, shape (2, lmax + 1, lmax + 1)
-        ndarray containing the spherical harmonic coefficients.
+    clm : ndarray, shape (2, lmax + 1, lmax + 1) or ((lmax + 1)**2)
+        ndarray containing the spherical harmonic coefficients, either as a
+        3-D array or as a 1-D packed array ordered according to the
+        convention in SHCilmToVector.
     normalization : str, optional, default = '4pi'
         '4pi', 'ortho', 'schmidt', or 'unnorm' for geodesy 4pi normalized,
         orthonormalized, Schmidt semi-normalized, or unnormalized coefficients,
         respectively.
-    lmax : int, optional, default = len(clm[0,:,0]) - 1.
+    lmax : int, optional, default = len(clm[0,:,0]) - 1 or
+           sqrt(len(clm)) - 1.
         Maximum spherical harmonic degree to output.
     degrees : ndarray, optional, default = numpy.arange(lmax+1)
         Array containing the spherical harmonic degrees where the spectrum
@@ -62,6 +65,10 @@ def spectrum(clm, normalization='4pi', degrees=None, lmax=None,
     logarithmic degree band. The contrubution in the band dlog_a(l) is
     spectrum(l, 'per_dlogl')*dlog_a(l), where a is the base, and where
     spectrum(l, 'per_dlogl) is equal to spectrum(l, 'per_l')*l*log(a).
+
+    When the coefficients are input as a 1-D packed array, all coefficients
+    of a given degree are contiguous, and the sums over angular order are
+    computed in a single vectorized reduction.
     """
     if normalization.lower() not in ('4pi', 'ortho', 'schmidt', 'unnorm'):
         raise ValueError("The normalization must be '4pi', 'ortho', " +
@@ -77,15 +84,51 @@ def spectrum(clm, normalization='4pi', degrees=None, lmax=None,
         raise ValueError("unit must be 'per_l', 'per_lm', or 'per_dlogl'." +
                          "Input value was {:s}".format(repr(unit)))
 
+    if clm.ndim == 1:
+        lmaxin = int(round(_np.sqrt(len(clm)))) - 1
+        if (lmaxin + 1)**2 != len(clm):
+            raise ValueError('The length of a packed coefficient array must ' +
+                             'be (lmax+1)**2. Input length is {:d}.'
+                             .format(len(clm)))
+    else:
+        lmaxin = len(clm[0, :, 0]) - 1
+
     if lmax is None:
-        lmax = len(clm[0, :, 0]) - 1
+        lmax = lmaxin
 
     if degrees is None:
         degrees = _np.arange(lmax+1)
 
     array = _np.empty(len(degrees))
 
-    if normalization.lower() == 'unnorm':
+    if clm.ndim == 1:
+        if normalization.lower() == 'unnorm' and \
+                convention.lower() == 'l2norm':
+            raise ValueError("convention can not be set to 'l2norm' when " +
+                             "using unnormalized harmonics.")
+
+        # All coefficients of degree l are located in clm[l**2:(l+1)**2].
+        ls = _np.repeat(_np.arange(lmaxin+1), 2 * _np.arange(lmaxin+1) + 1)
+        power = (clm * clm.conjugate()).real
+        if normalization.lower() == 'unnorm':
+            k = _np.arange(len(clm)) - ls**2
+            ms = _np.where(k > ls, k - ls, k)
+            conv = _factorial(ls+ms) / (2. * ls + 1.) / _factorial(ls-ms)
+            if not _np.iscomplexobj(clm):
+                conv[ms > 0] /= 2.
+            power *= conv
+        array[:] = _np.add.reduceat(power,
+                                    _np.arange(lmaxin+1)**2)[degrees]
+
+        if normalization.lower() != 'unnorm':
+            if convention.lower() == 'l2norm':
+                return array
+            elif normalization.lower() == 'schmidt':
+                array /= (2. * degrees + 1.)
+            elif normalization.lower() == 'ortho':
+                array /= (4. * _np.pi)
+
+    elif normalization.lower() == 'unnorm':
         if convention.lower() == 'l2norm':
             raise ValueError("convention can not be set to 'l2norm' when " +
                              "using unnormalized harmonics.")
@@ -0,0 +1,424 @@
+"""
+    Functions for computing the space-concentration kernel and the
+    best-concentrated localization windows of an arbitrary region.
+"""
+from __future__ import absolute_import as _absolute_import
+from __future__ import division as _division
+from __future__ import print_function as _print_function
+
+import numpy as _np
+import scipy.sparse.linalg as _spla
+from multiprocessing.pool import ThreadPool as _ThreadPool
+
+from .. import shtools as _shtools
+
+
+def _mask_sampling(dh_mask):
+    """Return the sampling of a Driscoll and Healy (1994) mask grid."""
+    if dh_mask.ndim != 2 or dh_mask.shape[0] % 2 != 0:
+        raise ValueError('dh_mask must be a two-dimensional array with an ' +
+                         'even number of latitude bands. Input shape is ' +
+                         '{:s}.'.format(repr(dh_mask.shape)))
+    if dh_mask.shape[1] == dh_mask.shape[0]:
+        return 1
+    elif dh_mask.shape[1] == 2 * dh_mask.shape[0]:
+        return 2
+    else:
+        raise ValueError('dh_mask must be dimensioned as (n, n) or ' +
+                         '(n, 2 * n). Input shape is {:s}.'
+                         .format(repr(dh_mask.shape)))
+
+
+def concentration_operator(dh_mask, lwin):
+    """
+    Return the space-concentration kernel of a mask as a matrix-free linear
+    operator.
+
+    Usage
+    -----
+    dij = concentration_operator(dh_mask, lwin)
+
+    Returns
+    -------
+    dij : scipy.sparse.linalg.LinearOperator, shape ((lwin+1)**2, (lwin+1)**2)
+        The symmetric space-concentration kernel. The operator acts on
+        vectors of 4-pi normalized spherical harmonic coefficients that are
+        ordered according to SHCilmToVector.
+
+    Parameters
+    ----------
+    dh_mask : ndarray, shape (nlat, nlon)
+        A Driscoll and Healy (1994) sampled grid describing the concentration
+        region R. All elements should either be 1 (for inside the
+        concentration region) or 0 (for outside the concentration region). The
+        grid must have dimensions nlon=nlat or nlon=2*nlat, where nlat is
+        even.
+    lwin : int
+        The spherical harmonic bandwidth of the localization windows.
+
+    Description
+    -----------
+    The operator computes the product of the kernel with a vector of
+    coefficients without forming the kernel: the coefficients are expanded
+    on the grid of dh_mask using MakeGridDH, multiplied by the mask, and
+    expanded back into spherical harmonics up to degree lwin using
+    SHExpandDH. This is the same quadrature that is used by ComputeDMap, but
+    the memory requirements are only those of the grid, and the cost of each
+    product is that of two spherical harmonic transforms.
+    """
+    sampling = _mask_sampling(dh_mask)
+    lmax_dh = dh_mask.shape[0] // 2 - 1
+    if lwin < 0 or lwin > lmax_dh:
+        raise ValueError('lwin must be between 0 and the effective ' +
+                         'bandwidth of dh_mask, {:d}. Input value is {:s}.'
+                         .format(lmax_dh, repr(lwin)))
+    mask = _np.asarray(dh_mask, dtype=_np.float64)
+    n = (lwin + 1)**2
+
+    def matvec(vector):
+        cilm = _shtools.SHVectorToCilm(_np.ravel(vector))
+        grid = _shtools.MakeGridDH(cilm, lmax=lmax_dh, sampling=sampling,
+                                   lmax_calc=lwin)
+        grid *= mask
+        cilm = _shtools.SHExpandDH(grid, sampling=sampling, lmax_calc=lwin)
+        return _shtools.SHCilmToVector(cilm, lwin)
+
+    def matmat(matrix):
+        return _np.column_stack([matvec(matrix[:, i])
+                                 for i in range(matrix.shape[1])])
+
+    return _spla.LinearOperator((n, n), matvec=matvec, matmat=matmat,
+                                rmatvec=matvec, dtype=_np.float64)
+
+
+def _dmap_rows(m1, dij, plm, weights, hc, hs, lwin):
+    """
+    Compute the elements of the kernel for the rows of order m1 and the
+    columns of orders 0 to m1, and the symmetric elements.
+    """
+    nh = hc.shape[1]
+
+    def cc(k):
+        # (1/2pi) int cos(k phi) m(phi) dphi
+        k = abs(k)
+        if k >= nh:
+            return 0.
+        return hc[:, k] if k == 0 else 0.5 * hc[:, k]
+
+    def ss(k):
+        # (1/2pi) int sin(k phi) m(phi) dphi
+        if k == 0 or abs(k) >= nh:
+            return 0.
+        return 0.5 * _np.sign(k) * hs[:, abs(k)]
+
+    l1 = _np.arange(m1, lwin + 1)
+    left = plm[m1] * weights[:, _np.newaxis]
+    for m2 in range(m1 + 1):
+        l2 = _np.arange(m2, lwin + 1)
+        d, s = m1 - m2, m1 + m2
+        # Longitudinal integrals for (cos, cos), (cos, sin), (sin, cos) and
+        # (sin, sin) of orders m1 and m2, as functions of latitude.
+        phi = {(0, 0): 0.5 * (cc(d) + cc(s)),
+               (0, 1): 0.5 * (ss(s) - ss(d)),
+               (1, 0): 0.5 * (ss(s) + ss(d)),
+               (1, 1): 0.5 * (cc(d) - cc(s))}
+        for (i1, i2), factor in phi.items():
+            if (i1 == 1 and m1 == 0) or (i2 == 1 and m2 == 0):
+                continue
+            rows = l1**2 + i1 * l1 + m1
+            cols = l2**2 + i2 * l2 + m2
+            if _np.isscalar(factor):
+                block = _np.zeros((len(rows), len(cols)))
+            else:
+                block = _np.dot(left.T * factor, plm[m2])
+            dij[_np.ix_(rows, cols)] = block
+            dij[_np.ix_(cols, rows)] = block.T
+
+
+def _dmap_kernel(nodes, weights, hc, hs, lwin, nthreads=None):
+    """
+    Compute the space-concentration kernel by quadrature over latitude, given
+    the quadrature nodes and weights and the longitudinal cosine and sine
+    harmonics of the mask at each node.
+    """
+    ptable = _np.array([_shtools.PlmBar(lwin, z) for z in nodes])
+    degrees = _np.arange(lwin + 1)
+    plm = []
+    for m in range(lwin + 1):
+        index = degrees[m:] * (degrees[m:] + 1) // 2 + m
+        plm.append(_np.ascontiguousarray(ptable[:, index]))
+
+    dij = _np.empty(((lwin + 1)**2, (lwin + 1)**2))
+
+    def rows(m1):
+        _dmap_rows(m1, dij, plm, weights, hc, hs, lwin)
+
+    if nthreads == 1:
+        for m1 in range(lwin + 1):
+            rows(m1)
+    else:
+        pool = _ThreadPool(nthreads)
+        try:
+            pool.map(rows, range(lwin, -1, -1), chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    return dij
+
+
+def _dmap_from_coeffs(cilm, lwin, nthreads=None):
+    """
+    Compute the space-concentration kernel from the 4pi-normalized spherical
+    harmonic coefficients of a mask.
+    """
+    lmask = min(cilm.shape[1] - 1, 2 * lwin)
+
+    # The integrands are polynomials of degree at most 4*lwin, which are
+    # integrated exactly by Gauss-Legendre quadrature with 2*lwin+1 nodes.
+    nodes, weights = _np.polynomial.legendre.leggauss(2 * lwin + 1)
+    weights = 0.5 * weights
+    ptable = _np.array([_shtools.PlmBar(lmask, z) for z in nodes])
+    degrees = _np.arange(lmask + 1)
+
+    hc = _np.zeros((len(nodes), lmask + 1))
+    hs = _np.zeros((len(nodes), lmask + 1))
+    for m in range(lmask + 1):
+        index = degrees[m:] * (degrees[m:] + 1) // 2 + m
+        hc[:, m] = _np.dot(ptable[:, index], cilm[0, m:lmask+1, m])
+        hs[:, m] = _np.dot(ptable[:, index], cilm[1, m:lmask+1, m])
+
+    return _dmap_kernel(nodes, weights, hc, hs, lwin, nthreads=nthreads)
+
+
+def _dmap_from_grid(dh_mask, lwin, nthreads=None):
+    """
+    Compute the space-concentration kernel with the Driscoll and Healy (1994)
+    quadrature of SHExpandDH on the grid of the mask.
+    """
+    nlat, nlon = dh_mask.shape
+    colat = _np.pi * _np.arange(nlat) / nlat
+    weights = _shtools.DHaj(nlat)
+    weights = weights / weights.sum()
+
+    # The discrete longitudinal sums of the mask multiplied by cos(k phi)
+    # and sin(k phi), which are aliased for k >= nlon/2 as on the grid.
+    k = _np.arange(2 * lwin + 1)
+    phi = 2. * _np.pi * _np.arange(nlon) / nlon
+    mask = _np.asarray(dh_mask, dtype=_np.float64)
+    hc = 2. * _np.dot(mask, _np.cos(_np.outer(phi, k))) / nlon
+    hs = 2. * _np.dot(mask, _np.sin(_np.outer(phi, k))) / nlon
+    hc[:, 0] *= 0.5
+
+    return _dmap_kernel(_np.cos(colat), weights, hc, hs, lwin,
+                        nthreads=nthreads)
+
+
+def compute_dmap(dh_mask, lwin, nthreads=None):
+    """
+    Compute the space-concentration kernel of a mask from the spherical
+    harmonic expansion of the mask.
+
+    Usage
+    -----
+    dij = compute_dmap(dh_mask, lwin, [nthreads])
+
+    Returns
+    -------
+    dij : ndarray, shape ((lwin+1)**2, (lwin+1)**2)
+        The symmetric space-concentration kernel. The indices correspond to
+        4-pi normalized spherical harmonic coefficients that are ordered
+        according to SHCilmToVector.
+
+    Parameters
+    ----------
+    dh_mask : ndarray, shape (nlat, nlon)
+        A Driscoll and Healy (1994) sampled grid describing the concentration
+        region R. All elements should either be 1 (for inside the
+        concentration region) or 0 (for outside the concentration region). The
+        grid must have dimensions nlon=nlat or nlon=2*nlat, where nlat is
+        even.
+    lwin : int
+        The spherical harmonic bandwidth of the localization windows.
+    nthreads : int, optional, default = None
+        The number of threads used to compute the rows of the kernel. The
+        default is the number of processors, and 1 computes the kernel
+        serially.
+
+    Description
+    -----------
+    ComputeDMap computes each row of the kernel by expanding the product of
+    the mask and a spherical harmonic on the grid, which requires
+    (lwin+1)**2 spherical harmonic transforms. Here, the mask is expanded
+    only once, up to degree 2*lwin, and the elements of the kernel
+
+        Dij = 1/(4pi) int_R Y_i Y_j dOmega
+
+    are computed from the mask coefficients and the Gaunt coefficients, the
+    integrals of the products of three spherical harmonics. The integrals
+    over longitude are evaluated analytically, and the integrals over
+    latitude of the products of three Legendre functions are evaluated
+    exactly by Gauss-Legendre quadrature. For each pair of orders, the
+    elements of all degrees are computed with a single matrix product, only
+    the elements with m2 <= m1 are computed and the others are obtained by
+    symmetry, and the rows of different orders are computed in parallel
+    threads.
+
+    Mask coefficients of degree larger than 2*lwin do not contribute to the
+    kernel. When the effective bandwidth of dh_mask, nlat/2-1, is greater or
+    equal to 2*lwin, the quadrature of ComputeDMap is exact, and the output is
+    identical to that of ComputeDMap to within rounding error. Otherwise, the
+    mask can not be expanded up to degree 2*lwin, and the kernel is instead
+    computed with the same Driscoll and Healy (1994) quadrature as
+    ComputeDMap, using the discrete longitudinal sums of the mask at each
+    latitude of the grid.
+    """
+    sampling = _mask_sampling(dh_mask)
+    lmax_dh = dh_mask.shape[0] // 2 - 1
+    if lwin < 0 or lwin > lmax_dh:
+        raise ValueError('lwin must be between 0 and the effective ' +
+                         'bandwidth of dh_mask, {:d}. Input value is {:s}.'
+                         .format(lmax_dh, repr(lwin)))
+    if 2 * lwin > lmax_dh:
+        return _dmap_from_grid(dh_mask, lwin, nthreads=nthreads)
+
+    cilm = _shtools.SHExpandDH(_np.asarray(dh_mask, dtype=_np.float64),
+                               sampling=sampling, lmax_calc=2 * lwin)
+    return _dmap_from_coeffs(cilm, lwin, nthreads=nthreads)
+
+
+def _sort_tapers(eigenvalues, tapers, ntapers):
+    """
+    Return the ntapers best-concentrated eigenvalues and eigenfunctions, the
+    latter with their largest coefficient in absolute value being positive.
+    """
+    order = _np.argsort(eigenvalues)[::-1][:ntapers]
+    eigenvalues = eigenvalues[order]
+    tapers = tapers[:, order]
+    imax = _np.abs(tapers).argmax(axis=0)
+    tapers *= _np.sign(tapers[imax, _np.arange(ntapers)])
+    return tapers, eigenvalues
+
+
+def return_tapers_map(dh_mask, lwin, ntapers, method='lanczos', tol=None,
+                      maxiter=None, x0=None, seed=None):
+    """
+    Calculate the best-concentrated eigenfunctions of the concentration
+    problem for an arbitrary region using an iterative eigensolver or the
+    kernel computed by compute_dmap.
+
+    Usage
+    -----
+    tapers, eigenvalues = return_tapers_map(dh_mask, lwin, ntapers, [method,
+                                            tol, maxiter, x0, seed])
+
+    Returns
+    -------
+    tapers : ndarray, shape ((lwin+1)**2, ntapers)
+        The spherical harmonic coefficients of the ntapers best-concentrated
+        localization windows, arranged in columns, 4-pi normalized, and
+        ordered according to SHCilmToVector. The sign of each window is
+        chosen such that its largest coefficient in absolute value is
+        positive.
+    eigenvalues : ndarray, shape (ntapers)
+        The concentration factors of the localization windows, ordered from
+        largest to smallest.
+
+    Parameters
+    ----------
+    dh_mask : ndarray, shape (nlat, nlon)
+        A Driscoll and Healy (1994) sampled grid describing the concentration
+        region R. All elements should either be 1 (for inside the
+        concentration region) or 0 (for outside the concentration region). The
+        grid must have dimensions nlon=nlat or nlon=2*nlat, where nlat is
+        even.
+    lwin : int
+        The spherical harmonic bandwidth of the localization windows.
+    ntapers : int
+        The number of best-concentrated eigenvalues and eigenfunctions to
+        return.
+    method : str, optional, default = 'lanczos'
+        The iterative eigensolver: 'lanczos' for the implicitly restarted
+        Lanczos method of scipy.sparse.linalg.eigsh (ARPACK), or 'lobpcg' for
+        the block solver scipy.sparse.linalg.lobpcg. If 'gaunt', the kernel
+        is computed with compute_dmap, and its eigenvalues are computed with
+        numpy.linalg.eigh; tol, maxiter, x0 and seed are then ignored.
+    tol : float, optional, default = None
+        The relative accuracy of the eigenvalues. The default is the machine
+        precision for 'lanczos' and the default of lobpcg for 'lobpcg'.
+    maxiter : int, optional, default = None
+        The maximum number of iterations of the eigensolver.
+    x0 : ndarray, shape ((lwin+1)**2) or ((lwin+1)**2, ntapers), optional
+        An initial estimate of the eigenfunctions, such as the tapers of a
+        nearby region. For 'lanczos', a single starting vector is used, and
+        the sum of the columns is used when more than one is given.
+    seed : int, optional, default = None
+        Seed of the random starting vectors when x0 is not specified.
+
+    Description
+    -----------
+    SHReturnTapersMap computes the full space-concentration kernel with
+    ComputeDMap, which requires O(lwin**4) memory, and then performs a full
+    eigendecomposition of this matrix. When only a few of the best
+    concentrated windows are required, this routine instead computes the
+    ntapers largest eigenvalues with an iterative solver. The kernel is never
+    formed: its product with a vector is computed by concentration_operator
+    using two spherical harmonic transforms on the grid of dh_mask. The
+    memory requirements are thus O(lwin**2) in addition to the grid, and the
+    cost is proportional to the number of requested windows.
+
+    With method 'gaunt', the full kernel is formed, but far more rapidly
+    than by ComputeDMap, and all eigenvalues are accurate to machine
+    precision. This is preferable when lwin is moderate or when ntapers is
+    not small.
+
+    The iterative solvers are efficient only when ntapers is much smaller
+    than (lwin+1)**2. The eigenvalues agree with those of SHReturnTapersMap
+    to within the requested tolerance; the eigenfunctions of eigenvalues that
+    are degenerate are determined only up to a rotation within the
+    corresponding subspace.
+    """
+    n = (lwin + 1)**2
+    if method not in ('lanczos', 'lobpcg', 'gaunt'):
+        raise ValueError("method must be 'lanczos', 'lobpcg' or 'gaunt'. " +
+                         'Input value is {:s}.'.format(repr(method)))
+    if ntapers < 1 or ntapers > n or (ntapers == n and method != 'gaunt'):
+        raise ValueError('ntapers must be greater than 0 and less than ' +
+                         '(lwin + 1)**2 = {:d}, or equal to (lwin + 1)**2 '
+                         .format(n) + "when method is 'gaunt'. Input value " +
+                         'is {:s}.'.format(repr(ntapers)))
+
+    if method == 'gaunt':
+        eigenvalues, tapers = _np.linalg.eigh(compute_dmap(dh_mask, lwin))
+        return _sort_tapers(eigenvalues, tapers, ntapers)
+
+    operator = concentration_operator(dh_mask, lwin)
+    if x0 is not None:
+        x0 = _np.asarray(x0, dtype=_np.float64)
+        if x0.shape[0] != n:
+            raise ValueError('x0 must have (lwin + 1)**2 = {:d} rows. '
+                             .format(n) + 'Input shape is {:s}.'
+                             .format(repr(x0.shape)))
+
+    if method == 'lanczos':
+        if x0 is not None and x0.ndim > 1:
+            x0 = x0.sum(axis=1)
+        elif x0 is None and seed is not None:
+            x0 = _np.random.RandomState(seed).standard_normal(n)
+        eigenvalues, tapers = _spla.eigsh(operator, k=ntapers, which='LA',
+                                          v0=x0, maxiter=maxiter,
+                                          tol=0 if tol is None else tol)
+    else:
+        if x0 is None:
+            x0 = _np.random.RandomState(seed).standard_normal((n, ntapers))
+        elif x0.ndim == 1:
+            x0 = x0[:, _np.newaxis]
+        if x0.shape[1] < ntapers:
+            rng = _np.random.RandomState(seed)
+            x0 = _np.column_stack([x0, rng.standard_normal(
+                (n, ntapers - x0.shape[1]))])
+        eigenvalues, tapers = _spla.lobpcg(operator, x0[:, :ntapers],
+                                           tol=tol, maxiter=maxiter or 200,
+                                           largest=True)
+
+    return _sort_tapers(eigenvalues, tapers, ntapers)